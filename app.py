@@ -4,22 +4,33 @@ import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
+import hashlib
 import json
-import base64
+import os
+import threading
+import time
 from pathlib import Path
 import folium
-from folium.plugins import HeatMap, MarkerCluster
-from pyproj import Transformer
+from folium.plugins import FastMarkerCluster, HeatMap
 import numpy as np
-from flask import send_file
-import re
-import hashlib
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import (
-    confusion_matrix, classification_report, 
-    roc_curve, auc, precision_recall_curve, average_precision_score
+from flask import Response, g, jsonify, request, send_from_directory, stream_with_context
+from flask_caching import Cache
+from dados_censo import selecionar_posicoes
+from grade_censo import (
+    RESOLUCAO_MAPA, RESOLUCAO_MINI_MAPA, RESOLUCOES_M, celulas_heatmap, celulas_heatmap_posicoes
+)
+from busca_especies import LIMITE_PADRAO, normalizar
+from classificador_censo import (
+    carregar_classificador, modelo_carregado, preparar_em_segundo_plano, prever, prever_csv
+)
+from fotos_especies import carregar_fotos, escolher_variante, url_foto
+from estaticos_react import BUILD_DIR, construir_manifesto, resolver, responder
+from imagens_notebook import carregar_imagens_notebook
+from instrumentacao import (
+    contagens_cache, limpar_metricas, observar_requisicao, registrar_cache, texto_prometheus
 )
+from recarga_censo import INTERVALO_OBSERVACAO, DadosCenso, carregar_dados, observar_csv
+from tiles_censo import TILE_VAZIO, CAMADAS, diretorio_versao, versao_tiles
 
 # ============================================
 # INICIALIZAR APP
@@ -32,6 +43,16 @@ app = dash.Dash(
 
 server = app.server
 
+# Cache do HTML dos mapas. Por padrão em disco (compartilhado entre os workers
+# do gunicorn) e limitado a CACHE_THRESHOLD entradas; CACHE_TYPE=SimpleCache
+# mantém o cache em memória, por processo.
+cache = Cache(server, config={
+    'CACHE_TYPE': os.environ.get('CACHE_TYPE', 'FileSystemCache'),
+    'CACHE_DIR': os.environ.get('CACHE_DIR', '.cache_censo/mapas'),
+    'CACHE_THRESHOLD': int(os.environ.get('CACHE_THRESHOLD', 300)),
+    'CACHE_DEFAULT_TIMEOUT': 0
+})
+
 app.index_string = '''
 <!DOCTYPE html>
 <html>
@@ -86,189 +107,38 @@ app.index_string = '''
 '''
 
 df_geral_file = Path("censo_arboreo_final_geral.csv")
-metricas = None
-df_geral = None
-
-COLUNAS_ESSENCIAIS = [
-    'x', 'y', 'nome_popular', 'especie', 'fitossanid_grupo', 
-    'estado_fitossanitario', 'condicao_fisica', 'saude', 
-    'altura', 'altura_total', 'data_plantio', 'rpa', 
-    'copa', 'cap',
-    'bairro'
-]
-
-if df_geral_file.exists():
-    print("📊 Carregando dataset completo (apenas colunas essenciais) para otimizar RAM...")
-    
-    try:
-        # Carrega apenas as colunas que existem no CSV e que são essenciais
-        df_completo = pd.read_csv(df_geral_file, low_memory=False)
-        colunas_existentes = [col for col in COLUNAS_ESSENCIAIS if col in df_completo.columns]
-        df_geral = df_completo[colunas_existentes].copy()
-        del df_completo
-        
-    except Exception as e:
-        print(f"❌ Erro ao ler CSV com colunas essenciais: {e}")
-        df_geral = None # Se falhar, define como None
-        
-    if df_geral is not None and len(df_geral) > 0:
-        # --- 1. PRÉ-PROCESSAMENTO DE COORDENADAS ---
-        try:
-            if 'x' in df_geral.columns and 'y' in df_geral.columns:
-                try:
-                    # Tenta CRS 31985 (Sul)
-                    transformer = Transformer.from_crs("EPSG:31985", "EPSG:4326", always_xy=True)
-                except:
-                    # Tenta CRS 32725 (Recife/Zona 25S)
-                    transformer = Transformer.from_crs("EPSG:32725", "EPSG:4326", always_xy=True)
-                
-                # Aplica transformação e lida com NaNs/Infinitos
-                x_validos = df_geral['x'].fillna(0).values
-                y_validos = df_geral['y'].fillna(0).values
 
-                lon, lat = transformer.transform(x_validos, y_validos)
-                
-                df_geral['latitude'] = lat
-                df_geral['longitude'] = lon
-        except Exception as e:
-            print(f"⚠️ Erro coordenadas: {e}")
+# Retrato atual dos dados (DataFrame, métricas, índices, grades, versão, tiles).
+# Quando o CSV muda, o observador (recarga_censo.observar_csv) troca esta
+# referência inteira; por isso cada callback lê ``dados`` uma única vez e
+# passa o retrato adiante, nunca misturando duas versões na mesma resposta.
+# CARREGAR_CENSO=0 importa o app sem dados (ex.: medir_desempenho, que
+# publica os seus próprios censos sintéticos)
+if os.environ.get('CARREGAR_CENSO', '1') != '0':
+    dados = carregar_dados(df_geral_file)
+else:
+    dados = DadosCenso(df_geral_file)
 
-        # --- 2. CÁLCULO DINÂMICO ---
-        print("🔄 Calculando métricas...")
-        try:
-            # Totais Gerais
-            total_arvores = len(df_geral)
-            
-            # ---------------------------------------------------------
-            # CÁLCULO DE ESPÉCIES (Relativo ao total com espécie)
-            # ---------------------------------------------------------
-            top_especies_list = []
-            especie_mais_comum = "N/A"
-            especie_top_count = 0
-            especie_top_pct = 0
-            total_com_especie = 0
-            num_especies = 0
-            
-            col_esp = 'nome_popular' if 'nome_popular' in df_geral.columns else ('especie' if 'especie' in df_geral.columns else None)
-            
-            if col_esp:
-                # Conta apenas valores não nulos
-                counts_esp = df_geral[col_esp].value_counts()
-                num_especies = len(counts_esp)
-                total_com_especie = counts_esp.sum() # Denominador correto: Soma das árvores identificadas
-                
-                if not counts_esp.empty:
-                    especie_mais_comum = counts_esp.index[0]
-                    especie_top_count = int(counts_esp.iloc[0])
-                    
-                    # Cálculo da porcentagem: (Top 1 / Total Identificadas) * 100
-                    if total_com_especie > 0:
-                        especie_top_pct = (especie_top_count / total_com_especie) * 100
-                    
-                    # Monta lista Top 5 com a mesma lógica
-                    for nome, qtd in counts_esp.head(5).items():
-                        pct_item = (qtd / total_com_especie) * 100 if total_com_especie > 0 else 0
-                        top_especies_list.append({"nome": nome, "quantidade": int(qtd), "percentual": pct_item})
-
-            # ---------------------------------------------------------
-            # FITOSSANIDADE (Doentes+Mortas / Total Avaliadas)
-            # ---------------------------------------------------------
-            pct_atencao = 0
-            total_avaliadas = 0
-            total_criticas = 0 # <--- ADICIONADO: Inicializa total de árvores críticas
-            
-            # Ajuste aqui o nome da coluna conforme seu CSV final
-            col_fito = 'fitossanid_grupo' if 'fitossanid_grupo' in df_geral.columns else None
-
-            # Se não achar 'fitossanid_grupo', tenta outras opções comuns
-            if not col_fito:
-                 for c in ['estado_fitossanitario', 'condicao_fisica', 'saude']:
-                     if c in df_geral.columns:
-                         col_fito = c
-                         break
-            
-            if col_fito:
-                # 1. Normaliza para evitar erros de maiúsculas/minúsculas
-                df_geral[col_fito] = df_geral[col_fito].astype(str).str.strip()
-                
-                # 2. Define o universo das AVALIADAS (Denominador)
-                # Ignora nulos, vazios e quem está marcado explicitamente como "Não avaliada"
-                filtro_avaliadas = (
-                    (df_geral[col_fito].notna()) & 
-                    (df_geral[col_fito] != '') & 
-                    (df_geral[col_fito] != 'nan') &
-                    (df_geral[col_fito] != 'Não avaliada')
-                )
-                df_avaliadas = df_geral[filtro_avaliadas]
-                total_avaliadas = len(df_avaliadas)
-                
-                # 3. Define o grupo de ATENÇÃO (Numerador)
-                # Ajuste os termos conforme os dados do seu Colab ('Injuriada', 'Morta')
-                termos_criticos = ['Injuriada', 'Morta', 'Doente', 'Ruim', 'Péssima', 'Critica']
-                
-                # Filtra quem está na lista de termos críticos DENTRO das avaliadas
-                df_criticas = df_avaliadas[df_avaliadas[col_fito].isin(termos_criticos)]
-                total_criticas = len(df_criticas) # <--- Calcula o total de críticas
-                
-                # 4. Cálculo final
-                if total_avaliadas > 0:
-                    pct_atencao = (total_criticas / total_avaliadas) * 100
+def _treinar_classificador():
+    """TREINAR_CLASSIFICADOR=0: os workers só leem o modelo já salvo (ex.: gerado no build)"""
+    return os.environ.get('TREINAR_CLASSIFICADOR', '1') != '0'
 
-            # ---------------------------------------------------------
-            # OUTROS CÁLCULOS (Mantidos)
-            # ---------------------------------------------------------
-            
-            # Altura
-            altura_media = 0
-            altura_max = 0
-            col_altura = 'altura' if 'altura' in df_geral.columns else ('altura_total' if 'altura_total' in df_geral.columns else None)
-            if col_altura:
-                df_geral[col_altura] = pd.to_numeric(df_geral[col_altura].astype(str).str.replace(',', '.'), errors='coerce')
-                df_alt_valida = df_geral[(df_geral[col_altura] > 0) & (df_geral[col_altura] < 60)]
-                if not df_alt_valida.empty:
-                    altura_media = df_alt_valida[col_altura].mean()
-                    altura_max = df_alt_valida[col_altura].max()
-
-            # Plantios Novos
-            plantios_desde_2020 = 0
-            col_data = 'data_plantio' if 'data_plantio' in df_geral.columns else None
-            if col_data:
-                df_geral[col_data] = pd.to_datetime(df_geral[col_data], dayfirst=True, errors='coerce')
-                plantios_desde_2020 = len(df_geral[df_geral[col_data].dt.year >= 2020])
-
-            # RPA Distribution
-            distribuicao_rpa = {}
-            if 'rpa' in df_geral.columns:
-                rpa_counts = df_geral['rpa'].value_counts()
-                for rpa_num, count in rpa_counts.items():
-                    rpa_key = str(int(rpa_num)) if pd.notna(rpa_num) and str(rpa_num).replace('.','').isdigit() else str(rpa_num)
-                    distribuicao_rpa[rpa_key] = {"nome": f"RPA {rpa_key}", "quantidade": int(count)}
-
-            metricas = {
-                "total_arvores": total_arvores,
-                "pct_atencao": pct_atencao,
-                "total_avaliadas": int(total_avaliadas),
-                "total_criticas": int(total_criticas),
-                "especie_mais_comum": especie_mais_comum,
-                "especie_top_count": especie_top_count,
-                "especie_top_pct": especie_top_pct,
-                "altura_media_m": altura_media,
-                "altura_max_m": altura_max,
-                "plantios_desde_2020": plantios_desde_2020,
-                "num_especies": num_especies,
-                "total_com_especie": int(total_com_especie),
-                "distribuicao_rpa": distribuicao_rpa,
-                "top_especies": top_especies_list
-            }
+def _publicar_dados(novos):
+    global dados
+    df_mudou = novos.df is not dados.df
+    metricas_mudaram = novos.metricas is not dados.metricas
+    dados = novos
+    if df_mudou and novos.df is not None:
+        # Modelo da versão nova treinado fora das requisições (a aba de Análise só lê)
+        preparar_em_segundo_plano(lambda: novos.df, _treinar_classificador())
+    if metricas_mudaram and novos.metricas is not None:
+        aquecer_dashboard_em_segundo_plano()
 
-        except Exception as e:
-            print(f"❌ Erro calculo: {e}")
-            metricas = None
-
-        print(f"✅ Dados carregados!")
-    else:
-        df_geral = None
-        print("⚠️ Dataset não encontrado ou vazio!")
+def listar_bairros(d):
+    """Bairros presentes no índice, em ordem alfabética"""
+    if d.indices is None:
+        return []
+    return sorted(d.indices['faixas'].get('bairro', {}).keys())
 
 # ============================================
 # CORES (mantido o original)
@@ -460,7 +330,41 @@ def navegar_pelo_dashboard(btn_mapa, btn_especies):
 # FUNÇÕES DE RENDERIZAÇÃO (DASHBOARD)
 # ============================================
 
+# Layout do dashboard e figuras do gráfico de RPA do último retrato dos dados
+# (por processo). Tudo ali depende só das métricas e das grades, então é
+# montado uma vez por versão e reaproveitado a cada troca de aba.
+_cache_dashboard = {'metricas': None, 'layout': None, 'figuras_rpa': {}}
+_lock_dashboard = threading.RLock()
+
+def _cache_do_retrato(metricas):
+    """Entradas do cache para ``metricas``; zera o cache se os dados mudaram"""
+    if _cache_dashboard['metricas'] is not metricas:
+        _cache_dashboard.update(metricas=metricas, layout=None, figuras_rpa={})
+    return _cache_dashboard
+
 def render_dashboard():
+    d = dados
+    if d.metricas is None:
+        return montar_dashboard(d)
+    with _lock_dashboard:
+        entrada = _cache_do_retrato(d.metricas)
+        registrar_cache('dashboard', entrada['layout'] is not None)
+        if entrada['layout'] is None:
+            entrada['layout'] = montar_dashboard(d)
+        return entrada['layout']
+
+def aquecer_dashboard_em_segundo_plano():
+    """Monta o layout do dashboard (e calcula as métricas que ele usa) numa thread"""
+    def aquecer():
+        try:
+            render_dashboard()
+        except Exception as e:
+            print(f"⚠️ Erro ao montar o dashboard: {e}")
+    threading.Thread(target=aquecer, name="dashboard-censo", daemon=True).start()
+
+def montar_dashboard(d):
+    """Layout completo do dashboard para o retrato ``d`` (sem cache)"""
+    metricas = d.metricas
     if metricas is None:
         return dbc.Alert("❌ Erro ao calcular métricas! Verifique se o arquivo CSV está correto.", color="danger")
     
@@ -557,8 +461,8 @@ def render_dashboard():
         ], width=12, md=True, className="mb-3"),
     ], className="mb-4")
     
-    grafico_rpa = criar_grafico_rpa()
-    mini_mapa_html = gerar_mini_mapa()
+    grafico_rpa = grafico_rpa_em_cache(metricas)
+    mini_mapa_html = gerar_mini_mapa(d)
     
     secao_meio = dbc.Row([
         dbc.Col([
@@ -602,7 +506,7 @@ def render_dashboard():
                         ),
                     ], className="mb-3 d-flex align-items-center"),
                     
-                    dcc.Graph(id='grafico-rpa', figure=criar_grafico_rpa(), config={'displayModeBar': False}, style={'height': '300px'}),
+                    dcc.Graph(id='grafico-rpa', figure=grafico_rpa, config={'displayModeBar': False}, style={'height': '300px'}),
                     
                     dbc.Alert(texto_analise, color="light", style={'fontSize': '0.9rem', 'marginTop': '1rem'})
                 ], style={'padding': '0 1.5rem 1.5rem 1.5rem'})
@@ -610,7 +514,7 @@ def render_dashboard():
         ], width=12, lg=5, className="mb-4")
     ])
 
-    top_especies = criar_top_especies() if metricas and metricas.get('top_especies') else None
+    top_especies = criar_top_especies(metricas) if metricas and metricas.get('top_especies') else None
     
     return html.Div([
         html.H3("Indicadores Principais", className="mb-4"),
@@ -621,23 +525,21 @@ def render_dashboard():
         top_especies if top_especies else None
     ])
 
-def gerar_mini_mapa():
-    """Gera o HTML do mapa de calor para o Dashboard (amostragem leve)"""
-    if df_geral is None: return ""
+def gerar_mini_mapa(d):
+    """Gera o HTML do mapa de calor para o Dashboard (grade de densidade do censo inteiro)"""
+    if d.df is None: return ""
     
-    # Amostragem leve para o mini-mapa
-    df_sample = df_geral.sample(n=min(2000, len(df_geral)), random_state=42)
     m = folium.Map(location=[-8.05, -34.90], zoom_start=11, control_scale=False, zoom_control=False)
     try:
-        if 'latitude' in df_sample.columns and 'longitude' in df_sample.columns:
-            coords = df_sample[['latitude', 'longitude']].dropna().values.tolist()
-            HeatMap(coords, radius=10, blur=15, gradient={0.4: 'blue', 0.65: 'lime', 1: 'red'}).add_to(m)
+        celulas, _ = celulas_heatmap(d.grades, None, RESOLUCAO_MINI_MAPA)
+        if celulas:
+            HeatMap(celulas, radius=10, blur=15, gradient={0.4: 'blue', 0.65: 'lime', 1: 'red'}).add_to(m)
     except Exception as e:
         print(f"Erro no mini mapa: {e}")
     
     return m._repr_html_()
 
-def criar_grafico_rpa(tipo='barras'):
+def criar_grafico_rpa(metricas, tipo='barras'):
     if not metricas or not metricas.get('distribuicao_rpa'):
         return go.Figure()
     
@@ -671,34 +573,29 @@ def criar_grafico_rpa(tipo='barras'):
     
     return fig
 
+def grafico_rpa_em_cache(metricas, tipo='barras'):
+    """Figura do gráfico de RPA, criada uma vez por versão dos dados e tipo"""
+    if metricas is None:
+        return criar_grafico_rpa(metricas, tipo)
+    with _lock_dashboard:
+        figuras = _cache_do_retrato(metricas)['figuras_rpa']
+        registrar_cache('grafico_rpa', tipo in figuras)
+        if tipo not in figuras:
+            figuras[tipo] = criar_grafico_rpa(metricas, tipo)
+        return figuras[tipo]
+
 @app.callback(Output('grafico-rpa', 'figure'), Input('tipo-grafico', 'value'))
 def atualizar_grafico_rpa(tipo):
-    return criar_grafico_rpa(tipo)
-
-def criar_top_especies():
-    arquivos_fotos = {
-        "Ipê-Rosa": "especies/ipe-rosa.png", "Ipê-rosa": "especies/ipe-rosa.png",
-        "Mororó": "especies/mororo.png",
-        "Ipê-Roxo": "especies/ipe-roxo.png", "Ipê-roxo": "especies/ipe-roxo.png",
-        "Sabonete": "especies/sabonete.png",
-        "Sapoti-do-mangue": "especies/sapoti-do-mangue.png"
-    }
+    return grafico_rpa_em_cache(dados.metricas, tipo)
+
+def criar_top_especies(metricas):
     fotos_fallback = {"Ipê-Rosa": "https://images.unsplash.com/photo-1602391833977-358a52198938?w=400"}
     
     cards = []
     for i, esp in enumerate(metricas['top_especies'][:5]):
         nome = esp['nome']
-        foto_url = None
-        arquivo_local = arquivos_fotos.get(nome)
-        if arquivo_local and Path(arquivo_local).exists():
-            try:
-                with open(arquivo_local, 'rb') as f:
-                    img_base64 = base64.b64encode(f.read()).decode()
-                foto_url = f"data:image/png;base64,{img_base64}"
-            except:
-                foto_url = fotos_fallback.get(nome, "https://images.unsplash.com/photo-1502082553048-f009c37129b9?w=400")
-        else:
-            foto_url = fotos_fallback.get(nome, "https://images.unsplash.com/photo-1502082553048-f009c37129b9?w=400")
+        # Foto local reduzida (servida por /fotos-especies); sem ela, a foto externa
+        foto_url = url_foto(nome) or fotos_fallback.get(nome, "https://images.unsplash.com/photo-1502082553048-f009c37129b9?w=400")
         
         card = dbc.Col([
             dbc.Card([
@@ -721,13 +618,14 @@ def criar_top_especies():
     ])
 
 def render_mapa():
+    d = dados
     return dbc.Row([
         dbc.Col([
             html.Div([
                 html.H5("Filtros e camadas", style={'fontWeight': '600', 'marginBottom': '1.5rem'}),
                 html.Div([
                     html.P("Total de árvores", style={'color': COLORS['gray'], 'fontSize': '0.875rem', 'marginBottom': '0.25rem'}),
-                    html.H3(f"{len(df_geral):,}" if df_geral is not None else "---", 
+                    html.H3(f"{len(d.df):,}" if d.df is not None else "---", 
                              style={'color': COLORS['primary'], 'fontWeight': '700', 'marginBottom': '1.5rem'})
                 ]),
                 html.Hr(),
@@ -735,7 +633,11 @@ def render_mapa():
                     html.Label("Tipo de visualização", style={'fontWeight': '600', 'marginBottom': '0.75rem', 'display': 'block'}),
                     dcc.RadioItems(
                         id='tipo-mapa',
-                        options=[{'label': ' Mapa de Calor', 'value': 'heatmap'}, {'label': ' Marcadores', 'value': 'markers'}],
+                        options=[
+                            {'label': ' Mapa de Calor', 'value': 'heatmap'},
+                            {'label': ' Marcadores', 'value': 'markers'},
+                            {'label': ' Todas as árvores', 'value': 'tiles'}
+                        ],
                         value='heatmap',
                         style={'marginBottom': '1.5rem'}
                     )
@@ -758,6 +660,18 @@ def render_mapa():
                     )
                 ]),
                 html.Hr(),
+                html.Div([
+                    html.Label("Bairro", style={'fontWeight': '600', 'marginBottom': '0.75rem', 'display': 'block'}),
+                    dcc.Dropdown(
+                        id='filtro-bairro',
+                        options=[{'label': b, 'value': b} for b in listar_bairros(d)],
+                        value=[],
+                        multi=True,
+                        placeholder="Todos os bairros",
+                        style={'marginBottom': '1.5rem'}
+                    )
+                ]),
+                html.Hr(),
                 dbc.Button("🗺️ Gerar Mapa", id='btn-gerar-mapa', color="success", className="w-100 mb-2", size="lg"),
                 dbc.Button("🔄 Limpar Filtros", id='btn-limpar-filtros', color="secondary", outline=True, className="w-100", size="sm"),
             ], style={
@@ -787,65 +701,163 @@ def render_mapa():
 @app.callback(
     [Output('mapa-iframe', 'srcDoc'), Output('mapa-info', 'children'), Output('badge-tipo-mapa', 'children'), Output('badge-rpas', 'children')],
     [Input('btn-gerar-mapa', 'n_clicks')],
-    [Input('tipo-mapa', 'value'), Input('filtro-rpa', 'value')]
+    [Input('tipo-mapa', 'value'), Input('filtro-rpa', 'value'), Input('filtro-bairro', 'value')]
 )
-def atualizar_mapa_folium(n_clicks, tipo_mapa, rpas_selecionadas):
+def atualizar_mapa_folium(n_clicks, tipo_mapa, rpas_selecionadas, bairros_selecionados=None):
+    """Atualiza o mapa Folium (reaproveita o HTML já gerado para o mesmo tipo + RPAs)"""
+    if not n_clicks: return "", dbc.Alert("👆 Clique no botão 'Gerar Mapa' para visualizar", color="info"), "Mapa de Calor", "Todas RPAs"
+    d = dados
+    if d.df is None or len(d.df) == 0: return "", dbc.Alert("❌ Dataset não encontrado ou vazio!", color="danger"), "Erro", "Erro"
+    
+    return mapa_em_cache(d, tipo_mapa, rpas_selecionadas, bairros_selecionados)
+
+def _chave_cache_mapa(versao, tipo_mapa, rpas_selecionadas, bairros_selecionados=None):
+    rpas = ','.join(sorted(rpas_selecionadas or []))
+    bairros = ','.join(sorted(bairros_selecionados or []))
+    return f"mapa:{versao}:{tipo_mapa}:{rpas}:{bairros}"
+
+def mapa_em_cache(d, tipo_mapa, rpas_selecionadas, bairros_selecionados=None):
+    """Retorna as saídas do mapa a partir do cache; gera e guarda em caso de miss"""
+    versao = d.versao
+    if tipo_mapa == 'tiles' and d.tiles_manifesto is not None:
+        # A pirâmide pode ser regerada sem mudar a versão dos dados (e as URLs dos tiles mudam com ela)
+        versao = f"{versao}:{versao_tiles(d.tiles_dir)}"
+    chave = _chave_cache_mapa(versao, tipo_mapa, rpas_selecionadas, bairros_selecionados)
+    resultado = cache.get(chave)
+    registrar_cache('mapas', resultado is not None)
+    if resultado is not None:
+        return resultado
+    
+    resultado = gerar_mapa_folium(d, tipo_mapa, rpas_selecionadas, bairros_selecionados)
+    # Só guarda mapas gerados com sucesso (srcDoc preenchido)
+    if resultado[0]:
+        cache.set(chave, resultado)
+    return resultado
+
+def aquecer_cache_mapas():
+    """Pré-gera os mapas mais usados: cada tipo com todas as RPAs e com cada RPA isolada"""
+    d = dados
+    todas = ['1', '2', '3', '4', '5', '6']
+    misses_antes = contagens_cache('mapas')['misses']
+    for tipo_mapa in ['heatmap', 'markers']:
+        for rpas in [todas] + [[r] for r in todas]:
+            mapa_em_cache(d, tipo_mapa, rpas)
+    print(f"🔥 Cache de mapas aquecido ({contagens_cache('mapas')['misses'] - misses_antes} mapas gerados)")
+
+# 🌟 LIMITE MÁXIMO DE MARCADORES NO MAPA DETALHADO
+# Os marcadores vão para o navegador como um único array JS (FastMarkerCluster)
+MAX_MARCADORES = 20000
+
+# Cria cada marcador no navegador. Espécie e fitossanidade chegam como índices
+# nas tabelas __ESPECIES__/__FITOSSANIDADE__, para não repetir os textos por árvore.
+JS_MARCADOR = """(function () {
+    var especies = __ESPECIES__, fitossanidade = __FITOSSANIDADE__;
+    function texto(v) {
+        return String(v).replace(/[&<>"]/g, function (c) {
+            return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'}[c];
+        });
+    }
+    return function (row) {
+        var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+            radius: 4, color: 'green', fill: true, fillColor: 'green', fillOpacity: 0.7, weight: 1
+        });
+        var altura = row[3] === null ? 'não informada' : row[3].toFixed(1) + ' m';
+        marker.bindPopup('<b>' + texto(especies[row[2]]) + '</b><br>Altura: ' + altura +
+                         '<br>Fitossanidade: ' + texto(fitossanidade[row[4]]));
+        return marker;
+    };
+})()"""
+
+def _codificar_textos(serie):
+    """Códigos inteiros + tabela de textos de uma coluna (nulos viram 'Não informado')"""
+    codigos, tabela = pd.factorize(serie)
+    tabela = [str(v) for v in tabela] + ["Não informado"]
+    codigos = np.where(codigos < 0, len(tabela) - 1, codigos)
+    return codigos, tabela
+
+def _json_js(valor):
+    # Evita que um texto com '</script>' feche a tag do mapa
+    return json.dumps(valor, ensure_ascii=False).replace('</', '<\\/')
+
+def camada_marcadores(df, posicoes):
     """
-    Atualiza o mapa Folium. 
-    🌟 OTIMIZAÇÃO 3: Implementa limite estrito de 1000 pontos para qualquer visualização de mapa.
+    Monta os marcadores das linhas em ``posicoes`` com operações por coluna:
+    cada árvore vira [lat, lon, espécie, altura, fitossanidade] num único array.
     """
-    if not n_clicks: return "", dbc.Alert("👆 Clique no botão 'Gerar Mapa' para visualizar", color="info"), "Mapa de Calor", "Todas RPAs"
-    if df_geral is None or len(df_geral) == 0: return "", dbc.Alert("❌ Dataset não encontrado ou vazio!", color="danger"), "Erro", "Erro"
+    col_esp = next((c for c in ['nome_popular', 'especie'] if c in df.columns), None)
+    col_altura = next((c for c in ['altura', 'altura_total'] if c in df.columns), None)
+    col_fito = next((c for c in ['fitossanid_grupo', 'estado_fitossanitario', 'condicao_fisica', 'saude'] if c in df.columns), None)
+    n = len(posicoes)
+    
+    latitudes = np.round(df['latitude'].to_numpy()[posicoes], 6).tolist()
+    longitudes = np.round(df['longitude'].to_numpy()[posicoes], 6).tolist()
+    especies, tabela_especies = _codificar_textos(df[col_esp].iloc[posicoes]) if col_esp else (np.zeros(n, dtype=int), ["Não informado"])
+    fitos, tabela_fitos = _codificar_textos(df[col_fito].iloc[posicoes]) if col_fito else (np.zeros(n, dtype=int), ["Não informado"])
+    if col_altura:
+        alturas = np.round(df[col_altura].to_numpy(dtype=np.float64)[posicoes], 1)
+        alturas = np.where(np.isnan(alturas), None, alturas).tolist()
+    else:
+        alturas = [None] * n
+    
+    pontos = [list(linha) for linha in zip(latitudes, longitudes, especies.tolist(), alturas, fitos.tolist())]
+    callback = (JS_MARCADOR
+                .replace('__ESPECIES__', _json_js(tabela_especies))
+                .replace('__FITOSSANIDADE__', _json_js(tabela_fitos)))
+    return FastMarkerCluster(pontos, callback=callback, name="Árvores", overlay=True, control=True, show=True)
+
+def gerar_mapa_folium(d, tipo_mapa, rpas_selecionadas, bairros_selecionados=None):
+    """
+    Gera o mapa Folium para o tipo, as RPAs e os bairros selecionados.
+    O mapa de calor usa a grade de densidade; os marcadores são limitados a MAX_MARCADORES.
+    """
+    if tipo_mapa == 'tiles':
+        return gerar_mapa_tiles(d, rpas_selecionadas, bairros_selecionados)
     
-    # 🌟 LIMITE MÁXIMO DE PONTOS PARA QUALQUER VISUALIZAÇÃO NO MAPA DETALHADO
-    MAX_POINTS = 1000 
     
     try:
-        df_mapa = df_geral.copy()
-        
-        # 1. Aplicar filtro de RPA
-        if rpas_selecionadas and 'rpa' in df_mapa.columns:
-            rpas_int = [int(r) for r in rpas_selecionadas]
-            df_mapa = df_mapa[df_mapa['rpa'].isin(rpas_int)].copy()
-            
-        # 2. Aplicar filtro de coordenadas (limite da cidade)
-        df_mapa = df_mapa[
-            (df_mapa['latitude'].between(-8.2, -7.9)) & 
-            (df_mapa['longitude'].between(-35.1, -34.8))
-        ].copy()
+        # 1. Filtro de RPA/bairro + limite da cidade via faixas pré-calculadas (sem copiar o DataFrame)
+        posicoes = selecionar_posicoes(
+            d.indices,
+            rpas_selecionadas if 'rpa' in d.df.columns else None,
+            bairros_selecionados
+        )
         
-        total_pontos = len(df_mapa)
+        total_pontos = len(posicoes)
         if total_pontos == 0: 
             return "", dbc.Alert("❌ Nenhum ponto encontrado com os filtros aplicados!", color="warning"), tipo_mapa, f"{len(rpas_selecionadas)} RPAs"
         
-        # 3. Aplicar amostragem estrita de 1000 pontos
-        df_amostra = df_mapa
+        # 2. Amostragem acima de MAX_MARCADORES (sorteia posições, não linhas)
+        posicoes_amostra = posicoes
         amostra_info = ""
         info_color = "success"
         
-        if total_pontos > MAX_POINTS:
-            # Reduz para 1000 pontos para evitar estouro de memória/tempo limite
-            df_amostra = df_mapa.sample(n=MAX_POINTS, random_state=42)
-            amostra_info = html.Span(f" (Exibindo amostra de {MAX_POINTS:,} pontos)")
+        if total_pontos > MAX_MARCADORES:
+            # Reduz a quantidade de pontos para manter a resposta em um tamanho razoável
+            rng = np.random.default_rng(42)
+            posicoes_amostra = np.sort(rng.choice(posicoes, size=MAX_MARCADORES, replace=False))
+            amostra_info = html.Span(f" (Exibindo amostra de {MAX_MARCADORES:,} pontos)")
             info_color = "danger" 
         
         # Gerar o mapa usando a amostra
         mapa = folium.Map(location=[-8.05, -34.93], zoom_start=11, tiles='OpenStreetMap', control_scale=True)
         badge_tipo = "Mapa de Calor" if tipo_mapa == 'heatmap' else "Marcadores"
         badge_rpas = "Todas RPAs" if len(rpas_selecionadas) == 6 else f"{len(rpas_selecionadas)} RPA(s)"
+        if bairros_selecionados:
+            badge_rpas += f" · {len(bairros_selecionados)} bairro(s)"
         
         if tipo_mapa == 'heatmap':
-            # Usa a amostra para o HeatMap
-            coordenadas = df_amostra[['latitude', 'longitude']].dropna().values.tolist()
-            HeatMap(coordenadas, radius=10, blur=15, gradient={0.4: 'blue', 0.65: 'lime', 0.8: 'yellow', 1.0: 'red'}).add_to(mapa)
-            info = dbc.Alert([html.Strong(f"✅ {total_pontos:,} árvores "), amostra_info], color=info_color)
+            # Usa a grade de densidade (todas as árvores) em vez da amostra
+            if bairros_selecionados:
+                # Grade montada na hora só com as linhas dos bairros selecionados
+                celulas, _ = celulas_heatmap_posicoes(d.df, posicoes, RESOLUCAO_MAPA)
+            else:
+                rpas_grade = [int(r) for r in rpas_selecionadas] if rpas_selecionadas else None
+                celulas, _ = celulas_heatmap(d.grades, rpas_grade, RESOLUCAO_MAPA)
+            HeatMap(celulas, radius=10, blur=15, gradient={0.4: 'blue', 0.65: 'lime', 0.8: 'yellow', 1.0: 'red'}).add_to(mapa)
+            info = dbc.Alert([html.Strong(f"✅ {total_pontos:,} árvores "), html.Span(f" (grade de {RESOLUCAO_MAPA} m, {len(celulas):,} células)")], color="success")
         else:
-            # Usa a amostra para os Marcadores (cluster)
-            marker_cluster = MarkerCluster(name="Árvores", overlay=True, control=True, show=True).add_to(mapa)
-            
-            for idx, row in df_amostra.iterrows():
-                # Loop por 1000 pontos é aceitável para o browser
-                folium.CircleMarker(location=[row['latitude'], row['longitude']], radius=4, color='green', fill=True, fillColor='green', fillOpacity=0.7, weight=1).add_to(marker_cluster)
+            # Marcadores (cluster) com popup: espécie, altura e fitossanidade
+            camada_marcadores(d.df, posicoes_amostra).add_to(mapa)
                 
             info = dbc.Alert([html.Strong(f"✅ {total_pontos:,} árvores "), amostra_info], color=info_color)
             
@@ -853,77 +865,101 @@ def atualizar_mapa_folium(n_clicks, tipo_mapa, rpas_selecionadas):
     except Exception as e: 
         return "", dbc.Alert(f"❌ Erro ao gerar mapa: {str(e)}", color="danger"), "Erro", "Erro"
 
-@app.callback(Output('filtro-rpa', 'value'), Input('btn-limpar-filtros', 'n_clicks'))
+def gerar_mapa_tiles(d, rpas_selecionadas, bairros_selecionados=None):
+    """Mapa com todas as árvores a partir da pirâmide de tiles (sem amostragem)"""
+    badge_rpas = "Todas RPAs" if rpas_selecionadas and len(rpas_selecionadas) == 6 else f"{len(rpas_selecionadas or [])} RPA(s)"
+    
+    tiles_manifesto = d.tiles_manifesto
+    if tiles_manifesto is None:
+        return "", dbc.Alert("⚠️ Tiles não gerados. Execute: python tiles_censo.py", color="warning"), "Todas as árvores", badge_rpas
+    if not rpas_selecionadas:
+        return "", dbc.Alert("❌ Nenhuma RPA selecionada!", color="warning"), "Todas as árvores", badge_rpas
+    
+    # Com todas as RPAs usa a camada única; senão, uma camada transparente por RPA
+    camadas = ['todas'] if len(rpas_selecionadas) == 6 else [f"rpa{r}" for r in sorted(rpas_selecionadas)]
+    total_pontos = sum(tiles_manifesto['camadas'].get(c, {}).get('arvores', 0) for c in camadas)
+    
+    versao = versao_tiles(d.tiles_dir)
+    mapa = folium.Map(location=[-8.05, -34.93], zoom_start=12, tiles='OpenStreetMap', control_scale=True)
+    for camada in camadas:
+        folium.TileLayer(
+            tiles=f"/tiles/{versao}/{camada}/{{z}}/{{x}}/{{y}}.png",
+            attr="Censo Arbóreo do Recife",
+            name=camada,
+            overlay=True,
+            min_zoom=tiles_manifesto['zoom_min'],
+            max_native_zoom=tiles_manifesto['zoom_max'],
+            max_zoom=19
+        ).add_to(mapa)
+    
+    aviso_bairro = " · filtro de bairro não se aplica a este modo" if bairros_selecionados else ""
+    info = dbc.Alert([html.Strong(f"✅ {total_pontos:,} árvores "), html.Span(f"(todas exibidas{aviso_bairro})")], color="success")
+    return mapa._repr_html_(), info, "Todas as árvores", badge_rpas
+
+@server.route('/tiles/<versao>/<camada>/<int:z>/<int:x>/<int:y>.png')
+def servir_tile(versao, camada, z, x, y):
+    """
+    Serve um tile pré-gerado; tiles sem árvores retornam um PNG transparente.
+    A URL leva a versão da pirâmide, então o tile é imutável. Se essa versão
+    já foi apagada (pirâmide regerada por outro worker), vale a atual, sem cache.
+    """
+    tiles_dir = diretorio_versao(versao)
+    imutavel = tiles_dir is not None and tiles_dir.is_dir()
+    if not imutavel:
+        tiles_dir = dados.tiles_dir
+    cabecalho = 'public, max-age=31536000, immutable' if imutavel else 'no-cache'
+    if camada in CAMADAS and tiles_dir is not None:
+        arquivo = tiles_dir / camada / str(z) / str(x) / f"{y}.png"
+        if arquivo.is_file():
+            resposta = send_from_directory(str(tiles_dir), f"{camada}/{z}/{x}/{y}.png")
+            resposta.headers['Cache-Control'] = cabecalho
+            return resposta
+    return Response(TILE_VAZIO, mimetype='image/png', headers={'Cache-Control': cabecalho})
+
+@server.route('/api/cache/mapas')
+def api_cache_mapas():
+    """Contadores de hit/miss do cache de mapas (somados entre os workers, os mesmos de /metrics)"""
+    contagens = contagens_cache('mapas')
+    total = contagens['hits'] + contagens['misses']
+    taxa = contagens['hits'] / total if total else 0
+    return jsonify({**contagens, 'taxa_acerto': round(taxa, 3)})
+
+@server.route('/api/heatmap')
+def api_heatmap():
+    """
+    Células ponderadas do mapa de calor: /api/heatmap?rpa=1,2&res=250
+    Sem 'rpa' retorna o censo inteiro.
+    """
+    try:
+        resolucao = int(request.args.get('res', RESOLUCAO_MAPA))
+        rpas = [int(r) for r in request.args.get('rpa', '').split(',') if r.strip()] or None
+    except ValueError:
+        return jsonify({'erro': "Parâmetros inválidos"}), 400
+    if resolucao not in RESOLUCOES_M:
+        return jsonify({'erro': f"Resolução deve ser uma de {RESOLUCOES_M}"}), 400
+    
+    celulas, total = celulas_heatmap(dados.grades, rpas, resolucao)
+    resposta = jsonify({'resolucao_m': resolucao, 'total_arvores': total, 'celulas': celulas})
+    resposta.headers['Cache-Control'] = 'public, max-age=3600'
+    return resposta
+
+@app.callback([Output('filtro-rpa', 'value'), Output('filtro-bairro', 'value')], Input('btn-limpar-filtros', 'n_clicks'))
 def limpar_filtros(n_clicks):
-    return ['1', '2', '3', '4', '5', '6']
+    return ['1', '2', '3', '4', '5', '6'], []
 
 # ============================================
-# FUNÇÃO PARA TREINAR CLASSIFICADOR
+# CLASSIFICADOR (MODELO SALVO, VER classificador_censo)
 # ============================================
 
-def treinar_classificador():
-    """Treina um classificador para identificar árvores grandes (copa > 6m) baseado no CAP"""
-    if df_geral is None:
-        return None
-    
-    try:
-        # Prepara dados: filtra apenas registros com copa e cap válidos
-        df_class = df_geral.copy()
-        df_class = df_class[
-            (df_class['copa'].notna()) & 
-            (df_class['copa'] > 0) & 
-            (df_class['copa'] < 30) &  # Remove outliers
-            (df_class['cap'].notna()) & 
-            (df_class['cap'] > 0) & 
-            (df_class['cap'] < 5)  # Remove outliers
-        ].copy()
-        
-        if len(df_class) < 50:
-            return None
-        
-        # Define classe: Copa > 6m é "Grande" (1), senão "Normal" (0)
-        df_class['classe'] = (df_class['copa'] > 6).astype(int)
-        
-        # Feature: CAP em metros
-        X = df_class[['cap']].values
-        y = df_class['classe'].values
-        
-        # Divide em treino e teste
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.3, random_state=42, stratify=y
-        )
-        
-        # Treina classificador (Regressão Logística)
-        clf = LogisticRegression(random_state=42, max_iter=1000)
-        clf.fit(X_train, y_train)
-        
-        # Predições
-        y_pred = clf.predict(X_test)
-        y_prob = clf.predict_proba(X_test)[:, 1]
-        
-        # Calcula métricas
-        cm = confusion_matrix(y_test, y_pred)
-        report = classification_report(y_test, y_pred, target_names=['Normal', 'Grande'], output_dict=True)
-        
-        # Curvas ROC e Precision-Recall
-        fpr, tpr, _ = roc_curve(y_test, y_prob)
-        roc_auc = auc(fpr, tpr)
-        
-        precision, recall, _ = precision_recall_curve(y_test, y_prob)
-        pr_auc = average_precision_score(y_test, y_prob)
-        
-        return {
-            'confusion_matrix': cm,
-            'classification_report': report,
-            'roc_curve': {'fpr': fpr, 'tpr': tpr, 'auc': roc_auc},
-            'pr_curve': {'precision': precision, 'recall': recall, 'auc': pr_auc},
-            'y_test': y_test,
-            'y_pred': y_pred,
-            'y_prob': y_prob
-        }
-    except Exception as e:
-        print(f"⚠️ Erro ao treinar classificador: {e}")
-        return None
+def _resumo_classificador(modelo):
+    """Texto com a matriz de confusão e as áreas das curvas do modelo salvo"""
+    (vn, fp), (fn, vp) = modelo['confusion_matrix']
+    return (
+        f"Treinado com {modelo['n_treino']:,} árvores e avaliado em {modelo['n_teste']:,}.\n\n"
+        f"{vn:,} copas normais e {vp:,} copas grandes classificadas corretamente; "
+        f"{fp:,} falsos positivos e {fn:,} falsos negativos.\n\n"
+        f"AUC ROC = {modelo['roc_curve']['auc']:.2f} | AP (Precision-Recall) = {modelo['pr_curve']['auc']:.2f}"
+    ).replace(',', '.')
 
 # ============================================
 # ANÁLISE ESTATÍSTICA - Gráficos sem descrições, apenas com IDs
@@ -974,7 +1010,8 @@ def _render_secoes_analise(card_body_content, secoes_analise):
 
 def _render_notebook_graficos():
     """Função auxiliar para renderizar os gráficos do notebook"""
-    imagens = extrair_imagens_notebook()
+    # Metadados vindos do cache (memória/disco); as imagens são servidas por URL
+    _, imagens = carregar_imagens_notebook()
     
     if not imagens:
         return dbc.Alert([
@@ -993,7 +1030,7 @@ def _render_notebook_graficos():
     
     cards = []
     for idx, img_info in enumerate(imagens):
-        img_base64 = img_info['imagem']
+        img_url = f"/notebook-img/{img_info['arquivo']}"
         grafico_id = img_info.get('id', f"GRAFICO_{idx + 1}")
         num_axes = img_info.get('num_axes', 1)
         
@@ -1040,7 +1077,7 @@ def _render_notebook_graficos():
         # Imagem
         card_body_content = [
             html.Img(
-                src=f"data:image/png;base64,{img_base64}",
+                src=img_url,
                 style={
                     'width': '100%',
                     'height': 'auto',
@@ -1298,6 +1335,14 @@ def _render_notebook_graficos():
                 }
             ]
             
+            # Desempenho do modelo salvo para os dados atuais (só leitura, sem treino)
+            modelo = carregar_classificador(dados.df)
+            if modelo is not None:
+                secoes_analise.append({
+                    'titulo': 'Modelo com os dados atuais',
+                    'conteudo': _resumo_classificador(modelo)
+                })
+            
             # Usa função padronizada para renderizar análise
             _render_secoes_analise(card_body_content, secoes_analise)
         
@@ -1419,217 +1464,291 @@ def render_tela_react():
             html.P("Execute o comando: cd tela && npm run build", className="mb-0")
         ], color="warning")
 
+# ============================================
+# API DE ESPÉCIES (SELETOR DA TELA REACT)
+# ============================================
+# Critérios de ordenação aceitos em /api/especies?ordem=... (numéricos: maior primeiro)
+ORDENS_ESPECIES = ['quantidade', 'nome', 'altura_media', 'copa_media', 'cap_media', 'pct_atencao']
+MAX_POR_PAGINA = 100
+
+def _resposta_condicional(etag, gerar):
+    """304 se o navegador já tem ``etag``; senão o JSON de gerar(), revalidado a cada uso"""
+    em_dia = request.if_none_match.contains(etag)
+    registrar_cache('etag_api', em_dia)
+    if em_dia:
+        resposta = Response(status=304)
+    else:
+        resposta = jsonify(gerar())
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta
+
+def filtrar_especies(tabela, busca=None, rpas=None, min_arvores=0, ordem='quantidade'):
+    """Filtra e ordena as linhas da tabela por espécie (já agregada, sem tocar no DataFrame)"""
+    if busca:
+        # Sem diferenciar maiúsculas nem acentos ("ipe" encontra "Ipê Roxo")
+        busca = normalizar(busca)
+        tabela = [e for e in tabela if busca in normalizar(e['nome'])]
+    if rpas:
+        tabela = [e for e in tabela if any(r in e['rpas'] for r in rpas)]
+    if min_arvores:
+        tabela = [e for e in tabela if e['quantidade'] >= min_arvores]
+    if ordem == 'nome':
+        return sorted(tabela, key=lambda e: e['nome'].lower())
+    if ordem != 'quantidade':
+        # A tabela já vem por quantidade; espécies sem a medida vão para o fim
+        return sorted(tabela, key=lambda e: (e[ordem] is None, -(e[ordem] or 0)))
+    return tabela
+
+@server.route('/api/especies')
+def api_especies():
+    """
+    Agregados por espécie do censo, paginados:
+    /api/especies?pagina=1&por_pagina=20&busca=ipe&rpa=1,2&min_arvores=10&ordem=quantidade
+    """
+    try:
+        pagina = max(int(request.args.get('pagina', 1)), 1)
+        por_pagina = min(max(int(request.args.get('por_pagina', 20)), 1), MAX_POR_PAGINA)
+        min_arvores = int(request.args.get('min_arvores', 0))
+    except ValueError:
+        return jsonify({'erro': "Parâmetros inválidos"}), 400
+    ordem = request.args.get('ordem', 'quantidade')
+    if ordem not in ORDENS_ESPECIES:
+        return jsonify({'erro': f"Ordem deve ser uma de {ORDENS_ESPECIES}"}), 400
+    rpas = [r.strip() for r in request.args.get('rpa', '').split(',') if r.strip()]
+
+    metricas = dados.metricas
+    if metricas is None:
+        return jsonify({'erro': "Dataset não encontrado ou vazio"}), 503
+    # O etag da tabela muda com os dados; a query entra para cada página/filtro ter o seu
+    consulta = hashlib.md5(request.query_string).hexdigest()[:8]
+    etag = f"{metricas['tabela_especies_etag']}-{consulta}"
+
+    def gerar():
+        selecionadas = filtrar_especies(metricas['tabela_especies'], request.args.get('busca'), rpas, min_arvores, ordem)
+        inicio = (pagina - 1) * por_pagina
+        return {
+            'total': len(selecionadas),
+            'pagina': pagina,
+            'por_pagina': por_pagina,
+            'paginas': (len(selecionadas) + por_pagina - 1) // por_pagina,
+            'especies': selecionadas[inicio:inicio + por_pagina],
+        }
+    return _resposta_condicional(etag, gerar)
+
+@server.route('/api/busca/especies')
+def api_busca_especies():
+    """
+    Autocompletar do seletor: /api/busca/especies?q=ipe&limite=10&campo=popular
+    Busca por prefixo e por trigramas (tolera acentos e erros de digitação)
+    nos nomes populares e científicos, com a quantidade de árvores de cada um.
+    """
+    try:
+        limite = min(max(int(request.args.get('limite', LIMITE_PADRAO)), 1), MAX_POR_PAGINA)
+    except ValueError:
+        return jsonify({'erro': "Parâmetros inválidos"}), 400
+    campo = request.args.get('campo') or None
+    if campo not in (None, 'popular', 'cientifico'):
+        return jsonify({'erro': "Campo deve ser 'popular' ou 'cientifico'"}), 400
+
+    metricas = dados.metricas
+    if metricas is None:
+        return jsonify({'erro': "Dataset não encontrado ou vazio"}), 503
+    consulta = request.args.get('q', '')
+    etag = f"{metricas['tabela_especies_etag']}-{hashlib.md5(request.query_string).hexdigest()[:8]}"
+    return _resposta_condicional(etag, lambda: {
+        'consulta': consulta,
+        'resultados': metricas['indice_busca'].buscar(consulta, limite, campo),
+    })
+
+@server.route('/api/especies/<path:nome>')
+def api_especie(nome):
+    """Agregados de uma espécie pelo nome popular (ex.: /api/especies/Pau-Ferro)"""
+    metricas = dados.metricas
+    if metricas is None:
+        return jsonify({'erro': "Dataset não encontrado ou vazio"}), 503
+    especie = next((e for e in metricas['tabela_especies'] if e['nome'] == nome), None)
+    if especie is None:
+        return jsonify({'erro': f"Espécie não encontrada: {nome}"}), 404
+    return _resposta_condicional(f"{metricas['tabela_especies_etag']}-{hashlib.md5(nome.encode('utf-8')).hexdigest()[:8]}", lambda: especie)
+
+# ============================================
+# API DO CLASSIFICADOR (PREVISÃO EM LOTE)
+# ============================================
+# Limite de CAPs por requisição JSON; lotes maiores vão como CSV (resposta em streaming)
+MAX_CAPS_JSON = 100_000
+
+@server.route('/api/classificador/prever', methods=['GET', 'POST'])
+def api_prever_copa():
+    """
+    Classe ('Grande'/'Normal') e probabilidade de copa grande a partir do CAP (m):
+      GET  /api/classificador/prever?cap=0.8,1.5
+      POST JSON {"cap": [0.8, 1.5, ...]}
+      POST CSV (corpo text/csv ou arquivo no campo 'arquivo', coluna ?coluna=cap):
+           devolve o mesmo CSV com classe_copa e prob_copa_grande, em blocos
+    """
+    # Só o modelo já preparado em segundo plano para este retrato (nada de hash nem disco aqui)
+    modelo = modelo_carregado(dados.df)
+    if modelo is None:
+        return jsonify({'erro': "Modelo ainda não carregado para os dados atuais"}), 503
+
+    arquivo = request.files.get('arquivo')
+    if arquivo is not None or request.mimetype == 'text/csv':
+        blocos = prever_csv(modelo, arquivo.stream if arquivo is not None else request.stream,
+                            coluna=request.args.get('coluna', 'cap'))
+        try:
+            # O primeiro bloco é lido aqui para que um CSV inválido vire 400, não uma resposta cortada
+            primeiro = next(blocos, '')
+        except ValueError as e:
+            return jsonify({'erro': f"CSV inválido: {e}"}), 400
+
+        def gerar():
+            yield primeiro
+            yield from blocos
+        return Response(stream_with_context(gerar()), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=previsoes_copa.csv'})
+
+    if request.method == 'POST':
+        corpo = request.get_json(silent=True) or {}
+        caps = corpo.get('cap') if isinstance(corpo, dict) else corpo
+    else:
+        caps = [c for c in request.args.get('cap', '').split(',') if c.strip()]
+    if not isinstance(caps, list) or not caps:
+        return jsonify({'erro': "Informe uma lista de CAPs (m)"}), 400
+    if len(caps) > MAX_CAPS_JSON:
+        return jsonify({'erro': f"Máximo de {MAX_CAPS_JSON:,} CAPs por requisição JSON; envie um CSV"}), 413
+
+    classe, prob = prever(modelo, caps)
+    return jsonify({
+        'modelo': modelo['impressao'],
+        'classe': classe.tolist(),
+        'probabilidade': [None if np.isnan(p) else round(p, 4) for p in prob.tolist()],
+    })
+
 # ============================================
 # ROTAS PARA SERVIR ARQUIVOS ESTÁTICOS DO REACT (mantidas as originais)
 # ============================================
+# Build lido uma vez no boot (com as versões gzip/brotli); nada de disco por requisição
+manifesto_react = construir_manifesto(BUILD_DIR)
+
 @server.route('/tela-react/')
 @server.route('/tela-react/<path:path>')
 def serve_react_app(path='index.html'):
     """Serve os arquivos estáticos do build do React"""
-    build_dir = Path("tela_build")
-    
-    if not build_dir.exists():
+    if manifesto_react is None:
         return "Build do React não encontrado. Execute: cd tela && npm run build", 404
     
-    if path == '' or path == '/':
-        path = 'index.html'
-    
-    file_path = build_dir / path
-    
-    if file_path.exists() and file_path.is_file():
-        return send_file(str(file_path))
-    elif path == 'index.html':
-        # Se não encontrar index.html, tenta servir o que existe
-        index_file = build_dir / 'index.html'
-        if index_file.exists():
-            return send_file(str(index_file))
+    entrada = resolver(manifesto_react, path)
+    if entrada is None:
         return "index.html não encontrado", 404
-    else:
-        # Para SPA, sempre retorna index.html para rotas não encontradas
-        index_file = build_dir / 'index.html'
-        if index_file.exists():
-            return send_file(str(index_file))
-        return "Arquivo não encontrado", 404
+    return responder(entrada, request)
 
 # ============================================
-# FUNÇÃO PARA EXTRAIR IMAGENS DO NOTEBOOK (SIMPLIFICADA)
+# ROTA DAS IMAGENS DO NOTEBOOK
 # ============================================
-
-def extrair_imagens_notebook():
-    """Extrai todas as imagens PNG dos outputs do notebook"""
-    notebook_path = Path("notebook/Verdefica_Unificado_12nov2025.ipynb")
-    imagens = []
-    imagens_vistas = set()  # Para detectar duplicatas
+@server.route('/notebook-img/<nome>')
+def servir_imagem_notebook(nome):
+    """Serve um gráfico extraído do notebook (nome = hash do conteúdo, então nunca muda)"""
+    diretorio, imagens = carregar_imagens_notebook()
+    img = next((img for img in imagens if img['arquivo'] == nome), None)
+    if img is None:
+        return "Imagem não encontrada", 404
     
-    if not notebook_path.exists():
-        return imagens
+    if diretorio is None:
+        # Cache em disco indisponível: a imagem vem da memória do processo
+        resposta = Response(img['png'], mimetype='image/png')
+        resposta.set_etag(img['hash'])
+        resposta.cache_control.public = True
+        resposta.cache_control.max_age = 31536000
+        resposta = resposta.make_conditional(request)
+    else:
+        resposta = send_from_directory(str(diretorio), nome, max_age=31536000, etag=img['hash'])
+    resposta.cache_control.immutable = True
+    return resposta
+
+# ============================================
+# ROTA DAS FOTOS DAS ESPÉCIES
+# ============================================
+@server.route('/fotos-especies/<nome>/<tamanho>')
+def servir_foto_especie(nome, tamanho):
+    """Foto reduzida de uma espécie, em WebP ou JPEG conforme o Accept do navegador"""
+    diretorio, indice = carregar_fotos()
+    if diretorio is None or nome not in indice:
+        return "Foto não encontrada", 404
+    arquivo, mimetype = escolher_variante(indice[nome], tamanho, {m for m, _ in request.accept_mimetypes})
+    if arquivo is None:
+        return "Foto não encontrada", 404
     
-    try:
-        with open(notebook_path, 'r', encoding='utf-8') as f:
-            nb = json.load(f)
-        
-        cells = nb.get('cells', [])
-        
-        for cell_idx, cell in enumerate(cells):
-            if cell.get('cell_type') == 'code':
-                outputs = cell.get('outputs', [])
-                
-                # Analisa o código da célula
-                source_code = cell.get('source', [])
-                if isinstance(source_code, list):
-                    codigo_completo = ''.join(source_code).lower()
-                else:
-                    codigo_completo = str(source_code).lower()
-                
-                for output_idx, output in enumerate(outputs):
-                    if output.get('output_type') == 'display_data':
-                        data = output.get('data', {})
-                        if 'image/png' in data:
-                            img_data = data['image/png']
-                            
-                            # Verifica se a imagem já foi adicionada (remove duplicatas)
-                            img_hash = hashlib.md5(img_data.encode('utf-8') if isinstance(img_data, str) else img_data).hexdigest()
-                            if img_hash in imagens_vistas:
-                                continue
-                            imagens_vistas.add(img_hash)
-                            
-                            # Detecta número de eixos
-                            titulo = None
-                            num_axes = 1
-                            if 'text/plain' in data:
-                                text_plain = data['text/plain']
-                                if isinstance(text_plain, list) and len(text_plain) > 0:
-                                    titulo = text_plain[0]
-                                    match = re.search(r'with (\d+) Axes?', titulo)
-                                    if match:
-                                        num_axes = int(match.group(1))
-                            
-                            # Gera ID único para o gráfico (baseado no índice sequencial)
-                            grafico_id = f"GRAFICO_{len(imagens) + 1:03d}"
-                            
-                            imagens.append({
-                                'imagem': img_data,
-                                'id': grafico_id,
-                                'codigo': codigo_completo,
-                                'num_axes': num_axes,
-                                'hash': img_hash,
-                                'cell_idx': cell_idx,
-                                'output_idx': output_idx
-                            })
-        
-        # Identifica posições relativas para scatter plots específicos
-        scatter_altura_dap = []
-        scatter_altura_copa = []
-        
-        for i, img in enumerate(imagens):
-            codigo = img['codigo']
-            num_axes = img['num_axes']
-            
-            # Identifica scatter plots altura × DAP
-            if (num_axes == 1 and 
-                ('scatter' in codigo or 'scatterplot' in codigo) and
-                'altura' in codigo and 'dap' in codigo):
-                scatter_altura_dap.append(i)
-            
-            # Identifica scatter plots altura × Copa (sem DAP)
-            if (num_axes == 1 and 
-                ('scatter' in codigo or 'scatterplot' in codigo) and
-                'altura' in codigo and 'copa' in codigo and
-                'dap' not in codigo):
-                scatter_altura_copa.append(i)
-        
-        # Marca posições relativas
-        if len(scatter_altura_dap) > 0:
-            ultimo_idx = scatter_altura_dap[-1]
-            imagens[ultimo_idx]['posicao_relativa'] = 'ultimo'
-        
-        if len(scatter_altura_copa) >= 2:
-            penultimo_idx = scatter_altura_copa[-2]
-            imagens[penultimo_idx]['posicao_relativa'] = 'penultimo'
-            # Remove outros scatter plots altura × copa exceto o penúltimo
-            for i in reversed(scatter_altura_copa):
-                if i != penultimo_idx:
-                    imagens.pop(i)
-        elif len(scatter_altura_copa) == 1:
-            imagens[scatter_altura_copa[0]]['posicao_relativa'] = 'penultimo'
-        
-        # Filtros para remover gráficos específicos
-        imagens_filtradas = []
-        contador_rpa = 0
-        contador_correlacao = 0
-        
-        for img in imagens:
-            deve_remover = False
-            codigo = img['codigo']
-            num_axes = img['num_axes']
-            
-            # Remove gráfico com 3 eixos sobre distribuição do tamanho das copas
-            if num_axes == 3 and 'distribuição do tamanho das copas' in codigo:
-                deve_remover = True
-            
-            # Remove gráfico com 1 eixo sobre "relação entre duas variáveis"
-            if num_axes == 1 and 'relação entre duas variáveis das árvores' in codigo:
-                deve_remover = True
-            
-            # Remove dois gráficos sobre quantidade de árvores por RPA
-            if 'quantidade de árvores por rpa no recife' in codigo:
-                contador_rpa += 1
-                if contador_rpa <= 2:
-                    deve_remover = True
-            
-            # Remove gráfico sobre proporção de árvores por RPA
-            if 'proporção de árvores por rpa no recife' in codigo:
-                deve_remover = True
-            
-            # Remove uma das duplicatas do gráfico de correlação
-            if (num_axes == 2 and 'correlação' in codigo and 'altura' in codigo and 
-                'copa' in codigo and 'dap' in codigo):
-                contador_correlacao += 1
-                if contador_correlacao <= 1:
-                    deve_remover = True
-            
-            if not deve_remover:
-                imagens_filtradas.append(img)
-        
-        # Remove gráficos específicos por ID (mantém IDs estáticos - não renumerar)
-        ids_para_remover = ['GRAFICO_004', 'GRAFICO_009', 'GRAFICO_010', 'GRAFICO_011', 
-                           'GRAFICO_013', 'GRAFICO_016', 'GRAFICO_017', 'GRAFICO_018']
-        imagens_filtradas = [img for img in imagens_filtradas if img['id'] not in ids_para_remover]
-        
-        # Ordena os gráficos com ordem customizada para melhor layout visual
-        # GRAFICO_012 será posicionado logo após GRAFICO_005
-        ordem_customizada = {}
-        ordem_base = sorted([img['id'] for img in imagens_filtradas])
-        
-        # Cria ordem customizada: remove GRAFICO_012 da posição original e insere após GRAFICO_005
-        ordem_final = []
-        for id_grafico in ordem_base:
-            if id_grafico == 'GRAFICO_012':
-                continue  # Será inserido depois
-            ordem_final.append(id_grafico)
-            if id_grafico == 'GRAFICO_005':
-                ordem_final.append('GRAFICO_012')  # Insere logo após GRAFICO_005
-        
-        # Se GRAFICO_012 não estava na lista ou GRAFICO_005 não existe, mantém ordem original
-        if 'GRAFICO_012' in ordem_base and 'GRAFICO_005' in ordem_base:
-            ordem_map = {id_grafico: idx for idx, id_grafico in enumerate(ordem_final)}
-            imagens_filtradas.sort(key=lambda x: ordem_map.get(x['id'], 999))
-        else:
-            imagens_filtradas.sort(key=lambda x: x['id'])
-        
-        # IDs são estáticos - NÃO renumerar após filtragem
-        # Os IDs originais (atribuídos na primeira passada) são mantidos
-        # para preservar a associação correta com os textos de análise
-        
-        return imagens_filtradas
-        
-    except Exception as e:
-        print(f"⚠️ Erro ao ler notebook: {e}")
-        return []
+    resposta = send_from_directory(str(diretorio), arquivo, mimetype=mimetype, max_age=31536000,
+                                   etag=f"{indice[nome]['versao']}-{arquivo}")
+    # A URL leva a versão da foto (?v=), então o navegador nunca precisa revalidar
+    resposta.cache_control.immutable = True
+    resposta.vary.add('Accept')
+    return resposta
 
 # ============================================
-# FUNÇÃO DE RENDERIZAÇÃO DO NOTEBOOK
+# INSTRUMENTAÇÃO (LATÊNCIA, BYTES E CACHE -> /metrics)
 # ============================================
+def _identificar_requisicao():
+    """('callback', nome da função) para os callbacks do Dash; ('rota', regra) para o resto"""
+    if request.path.endswith('/_dash-update-component'):
+        saida = (request.get_json(silent=True) or {}).get('output', '')
+        funcao = app.callback_map.get(saida, {}).get('callback')
+        # Nunca o texto enviado pelo cliente: cada valor novo viraria uma série no Prometheus
+        return 'callback', getattr(funcao, '__name__', '<desconhecido>')
+    return 'rota', request.url_rule.rule if request.url_rule else '<sem rota>'
+
+@server.before_request
+def _iniciar_cronometro():
+    g.inicio_requisicao = time.perf_counter()
+
+@server.after_request
+def _registrar_requisicao(resposta):
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is not None:
+        try:
+            tipo, nome = _identificar_requisicao()
+            # Respostas em streaming não têm tamanho conhecido aqui (content_length None)
+            observar_requisicao(tipo, nome, resposta.status_code, time.perf_counter() - inicio,
+                                resposta.content_length)
+        except Exception as e:
+            print(f"⚠️ Erro na instrumentação: {e}")
+    return resposta
+
+@server.route('/metrics')
+def metricas_prometheus():
+    """Histogramas de latência e bytes por rota/callback e acertos de cache (formato Prometheus)"""
+    return Response(texto_prometheus(), mimetype='text/plain; version=0.0.4')
+
+# ============================================
+# AQUECIMENTO OPCIONAL DO CACHE DE MAPAS
+# ============================================
+# AQUECER_MAPAS=1 gera os mapas mais comuns no boot (com o preload do
+# gunicorn, uma única vez no master)
+if os.environ.get('AQUECER_MAPAS') == '1' and dados.df is not None:
+    aquecer_cache_mapas()
+
+# ============================================
+# TAREFAS EM SEGUNDO PLANO (MÉTRICAS + RECARGA DO CSV)
+# ============================================
+def iniciar_tarefas_em_segundo_plano():
+    """
+    Calcula as métricas, monta o dashboard e carrega (ou treina) o
+    classificador em threads depois do boot (TREINAR_CLASSIFICADOR=0 só lê
+    o modelo já salvo, sem treinar) e inicia o observador que recarrega o censo quando o CSV muda
+    (OBSERVAR_CSV=0 desliga). Com o preload do gunicorn é chamada no
+    post_fork (gunicorn.conf.py), nunca no master: thread criada antes do
+    fork não existe nos workers e pode deixar o lock travado.
+    """
+    if dados.metricas is not None:
+        dados.metricas.calcular_em_segundo_plano()
+        aquecer_dashboard_em_segundo_plano()
+    if dados.df is not None:
+        preparar_em_segundo_plano(lambda: dados.df, _treinar_classificador())
+    if os.environ.get('OBSERVAR_CSV', '1') != '0':
+        intervalo = float(os.environ.get('INTERVALO_OBSERVACAO_CSV', INTERVALO_OBSERVACAO))
+        observar_csv(lambda: dados, _publicar_dados, intervalo)
+
 
 if __name__ == '__main__':
     import os
@@ -1637,10 +1756,9 @@ if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8050))
     # Debug apenas em desenvolvimento local
     debug = os.environ.get('FLASK_ENV') != 'production'
+    limpar_metricas()
+    # Com debug, o reloader do Werkzeug roda este bloco no processo pai e no
+    # filho: as threads só sobem no filho, que é o que atende as requisições
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        iniciar_tarefas_em_segundo_plano()
     app.run(debug=debug, host='0.0.0.0', port=port)
-    import os
-    # Usa variável de ambiente PORT (fornecida pelo Render) ou porta padrão 8050
-    port = int(os.environ.get('PORT', 8050))
-    # Debug apenas em desenvolvimento local
-    debug = os.environ.get('FLASK_ENV') != 'production'
-    app.run(debug=debug, host='0.0.0.0', port=port)
\ No newline at end of file
@@ -11,6 +11,16 @@ echo "🔨 Iniciando build para produção..."
 echo "📦 Instalando dependências Python..."
 pip install -r requirements.txt
 
+# 1.1 Gerar cache colunar do censo (evita reparsear o CSV em cada worker)
+if [ -f "censo_arboreo_final_geral.csv" ]; then
+    echo "📊 Gerando cache colunar do censo..."
+    python dados_censo.py censo_arboreo_final_geral.csv
+    echo "🗺️  Gerando pirâmide de tiles do mapa..."
+    python tiles_censo.py censo_arboreo_final_geral.csv
+    echo "🌳 Treinando classificador de copa grande..."
+    python classificador_censo.py censo_arboreo_final_geral.csv
+fi
+
 # 2. Instalar Node.js se não estiver disponível
 if ! command -v node &> /dev/null; then
     echo "📦 Instalando Node.js..."
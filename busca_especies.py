@@ -0,0 +1,104 @@
+"""
+Índice de busca das espécies do censo (nome popular e nome científico).
+
+Os nomes são normalizados (minúsculas, sem acentos, sem hífens/espaços) e
+indexados por trigramas. Uma consulta é pontuada por prefixo (nome inteiro
+ou de uma palavra) e pela fração de trigramas em comum, o que tolera erros
+de digitação e grafias como "Ipeamarelo" x "Ipê amarelo"; empates ficam
+com a espécie mais frequente. O índice tem um item por nome distinto, não
+por árvore, então cada busca custa microssegundos.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+
+# Fração mínima de trigramas da consulta encontrados no nome
+SIMILARIDADE_MINIMA = 0.3
+LIMITE_PADRAO = 10
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e com separadores (hífen, pontuação) virando espaço"""
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', texto).split())
+
+
+def trigramas(texto):
+    """Trigramas do texto sem espaços e de cada palavra (o início das palavras também conta)"""
+    grams = set()
+    for parte in [texto.replace(' ', '')] + texto.split():
+        parte = f"  {parte} "
+        grams.update(parte[i:i + 3] for i in range(len(parte) - 2))
+    return grams
+
+
+class IndiceEspecies:
+    """Índice em memória dos nomes de espécie com a quantidade de árvores de cada um"""
+
+    def __init__(self, populares, cientificos=None, pares=None):
+        """
+        ``populares`` e ``cientificos``: {nome: quantidade}; ``pares``:
+        {(nome_popular, nome_cientifico): quantidade}, usado para mostrar o
+        nome científico mais comum junto de cada nome popular (e vice-versa).
+        """
+        relacionado = {}
+        for (popular, cientifico), qtd in sorted((pares if pares is not None else {}).items(), key=lambda p: -p[1]):
+            relacionado.setdefault(('popular', popular), cientifico)
+            relacionado.setdefault(('cientifico', cientifico), popular)
+
+        self.itens = []
+        for campo, nomes in (('popular', populares), ('cientifico', cientificos if cientificos is not None else {})):
+            for nome, qtd in sorted(nomes.items(), key=lambda n: (-n[1], n[0])):
+                if qtd <= 0:
+                    continue
+                item = {'nome': nome, 'campo': campo, 'quantidade': int(qtd)}
+                if (campo, nome) in relacionado:
+                    item['nome_cientifico' if campo == 'popular' else 'nome_popular'] = relacionado[(campo, nome)]
+                self.itens.append(item)
+
+        self._normalizados = [normalizar(item['nome']) for item in self.itens]
+        self._trigramas = [trigramas(n) for n in self._normalizados]
+        self._por_trigrama = defaultdict(list)
+        for i, grams in enumerate(self._trigramas):
+            for g in grams:
+                self._por_trigrama[g].append(i)
+
+    def __len__(self):
+        return len(self.itens)
+
+    def _pontuar(self, i, consulta, compacta, grams_consulta, em_comum):
+        nome = self._normalizados[i]
+        if nome.startswith(consulta) or nome.replace(' ', '').startswith(compacta):
+            return 3.0
+        if any(palavra.startswith(consulta) for palavra in nome.split()):
+            return 2.0
+        if consulta in nome:
+            return 1.5
+        return em_comum / len(grams_consulta)
+
+    def buscar(self, consulta, limite=LIMITE_PADRAO, campo=None):
+        """
+        Itens que casam com ``consulta``, do mais relevante para o menos,
+        cada um com 'pontuacao'. ``campo`` restringe a 'popular' ou 'cientifico'.
+        """
+        consulta = normalizar(consulta or '')
+        if not consulta:
+            return []
+        compacta = consulta.replace(' ', '')
+        grams_consulta = trigramas(consulta)
+
+        em_comum = defaultdict(int)
+        for g in grams_consulta:
+            for i in self._por_trigrama.get(g, ()):
+                em_comum[i] += 1
+
+        resultados = []
+        for i, n in em_comum.items():
+            if campo and self.itens[i]['campo'] != campo:
+                continue
+            pontuacao = self._pontuar(i, consulta, compacta, grams_consulta, n)
+            if pontuacao >= SIMILARIDADE_MINIMA:
+                resultados.append((pontuacao, self.itens[i]))
+        resultados.sort(key=lambda r: (-r[0], -r[1]['quantidade'], r[1]['nome']))
+        return [{**item, 'pontuacao': round(pontuacao, 3)} for pontuacao, item in resultados[:limite]]
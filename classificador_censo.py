@@ -0,0 +1,290 @@
+"""
+Classificador de árvores de copa grande (copa > 6m) a partir do CAP.
+
+O treino (regressão logística) e a avaliação (matriz de confusão, relatório,
+curvas ROC e Precision-Recall) rodam uma vez por versão dos dados e vão para
+.cache_censo/classificador_<impressao>.joblib, onde ``impressao`` é o hash
+das colunas usadas no treino (só o modelo da versão atual fica no disco). A
+aba de Análise só lê esse arquivo (ou a cópia em memória); nenhum callback
+treina o modelo.
+
+Uso:
+    python classificador_censo.py [caminho_do_csv]              # treino offline
+    python classificador_censo.py --prever novas.csv [-o saida.csv]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import (
+    auc, average_precision_score, classification_report, confusion_matrix,
+    precision_recall_curve, roc_curve
+)
+from sklearn.model_selection import train_test_split
+
+from dados_censo import CACHE_DIR, CSV_PADRAO, limpar_versoes_antigas, trava_cache
+
+# Incrementar quando o treino ou os artefatos mudarem
+VERSAO_MODELO = 1
+
+# Copa acima disso (m) é a classe "Grande"
+LIMIAR_COPA_GRANDE = 6
+# Faixas aceitas no treino (fora delas são outliers)
+FAIXA_COPA = (0, 30)
+FAIXA_CAP = (0, 5)
+MINIMO_AMOSTRAS = 50
+CLASSES = ['Normal', 'Grande']
+
+# Linhas por bloco na previsão de CSVs (memória constante em arquivos grandes)
+TAMANHO_BLOCO_PREVISAO = 50_000
+LIMIAR_PREVISAO = 0.5
+
+# Artefatos já carregados, por impressão dos dados
+_memoria = {}
+_lock = threading.Lock()
+# (DataFrame, impressão) do último retrato visto: cada retrato publicado é
+# imutável, então a impressão é calculada uma vez e não a cada requisição
+_ultima_impressao = (None, None)
+
+
+def dados_treino(df):
+    """(X, y) do classificador: CAP (m) das árvores válidas e a classe da copa"""
+    # Máscara sobre as colunas copa e cap (sem copiar o DataFrame); NaN falha
+    # em todas as comparações, então também fica de fora
+    copa = df['copa'].to_numpy(dtype=np.float64)
+    cap = df['cap'].to_numpy(dtype=np.float64)
+    validos = (
+        (copa > FAIXA_COPA[0]) & (copa < FAIXA_COPA[1]) &
+        (cap > FAIXA_CAP[0]) & (cap < FAIXA_CAP[1])
+    )
+    X = cap[validos].reshape(-1, 1)
+    y = (copa[validos] > LIMIAR_COPA_GRANDE).astype(int)
+    return X, y
+
+
+def impressao_dados(X, y):
+    """Hash do conjunto de treino (e das regras que o geraram)"""
+    h = hashlib.md5(f"v{VERSAO_MODELO}|{LIMIAR_COPA_GRANDE}|{FAIXA_COPA}|{FAIXA_CAP}".encode('utf-8'))
+    h.update(np.ascontiguousarray(X).tobytes())
+    h.update(np.ascontiguousarray(y, dtype=np.int8).tobytes())
+    return h.hexdigest()[:16]
+
+
+def impressao_df(df):
+    """Impressão dos dados de treino de ``df``, calculada só na primeira vez que ele é visto"""
+    global _ultima_impressao
+    visto, impressao = _ultima_impressao
+    if visto is df:
+        return impressao
+    impressao = impressao_dados(*dados_treino(df))
+    _ultima_impressao = (df, impressao)
+    return impressao
+
+
+def caminho_modelo(impressao, cache_dir=CACHE_DIR):
+    return Path(cache_dir) / f"classificador_{impressao}.joblib"
+
+
+def treinar(X, y):
+    """Treina e avalia o classificador; None se não há amostras suficientes"""
+    if len(y) < MINIMO_AMOSTRAS:
+        return None
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.3, random_state=42, stratify=y
+    )
+    inicio = time.perf_counter()
+    clf = LogisticRegression(random_state=42, max_iter=1000)
+    clf.fit(X_train, y_train)
+
+    y_pred = clf.predict(X_test)
+    y_prob = clf.predict_proba(X_test)[:, 1]
+
+    fpr, tpr, _ = roc_curve(y_test, y_prob)
+    precision, recall, _ = precision_recall_curve(y_test, y_prob)
+    return {
+        'modelo': clf,
+        'confusion_matrix': confusion_matrix(y_test, y_pred),
+        'classification_report': classification_report(y_test, y_pred, target_names=CLASSES, output_dict=True, zero_division=0),
+        'roc_curve': {'fpr': fpr, 'tpr': tpr, 'auc': auc(fpr, tpr)},
+        'pr_curve': {'precision': precision, 'recall': recall, 'auc': average_precision_score(y_test, y_prob)},
+        'y_test': y_test,
+        'y_pred': y_pred,
+        'y_prob': y_prob,
+        'n_treino': len(y_train),
+        'n_teste': len(y_test),
+        'tempo_treino': time.perf_counter() - inicio,
+    }
+
+
+def salvar(artefatos, destino):
+    """
+    Grava os artefatos com joblib (arquivo temporário + rename, seguro entre
+    workers) e apaga os modelos de versões anteriores dos dados.
+    """
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destino.with_name(destino.name + f".tmp{os.getpid()}")
+    joblib.dump(artefatos, tmp)
+    os.replace(tmp, destino)
+    limpar_versoes_antigas(destino)
+
+
+def _ler_modelo(destino):
+    """Artefatos gravados em ``destino``; None se o arquivo não existe ou não pôde ser lido"""
+    if not destino.exists():
+        return None
+    try:
+        return joblib.load(destino)
+    except Exception as e:
+        print(f"⚠️ Erro ao ler modelo salvo ({destino.name}): {e}")
+        return None
+
+
+def carregar_classificador(df, treinar_se_ausente=False):
+    """
+    Artefatos do classificador para os dados de ``df``: da memória, do
+    .joblib gravado ou, com ``treinar_se_ausente``, treinando e gravando.
+    None se ainda não há modelo para esses dados (ou se eles não bastam).
+    Para um ``df`` já visto não percorre os dados (ver impressao_df).
+    """
+    if df is None:
+        return None
+    impressao = impressao_df(df)
+    if impressao in _memoria:
+        return _memoria[impressao]
+
+    with _lock:
+        if impressao in _memoria:
+            return _memoria[impressao]
+        destino = caminho_modelo(impressao)
+        artefatos = _ler_modelo(destino)
+        if artefatos is None:
+            if not treinar_se_ausente:
+                return None
+            # Um processo por vez: os outros workers esperam e leem o modelo que ele gravou
+            with trava_cache("classificador"):
+                artefatos = _ler_modelo(destino)
+                if artefatos is None:
+                    artefatos = treinar(*dados_treino(df))
+                    if artefatos is None:
+                        return None
+                    artefatos['impressao'] = impressao
+                    try:
+                        salvar(artefatos, destino)
+                    except OSError as e:
+                        print(f"⚠️ Erro ao gravar modelo: {e}")
+        # Só a versão atual fica na memória
+        _memoria.clear()
+        _memoria[impressao] = artefatos
+        return artefatos
+
+
+def modelo_carregado(df):
+    """
+    Artefatos já em memória para ``df``, sem ler o disco nem percorrer os
+    dados (caminho das requisições). None enquanto preparar_em_segundo_plano
+    não terminou para esse retrato.
+    """
+    visto, impressao = _ultima_impressao
+    return _memoria.get(impressao) if visto is df and df is not None else None
+
+
+def preparar_em_segundo_plano(obter_df, treinar_se_ausente=True):
+    """
+    Carrega o modelo do .joblib (ou treina, se preciso e ``treinar_se_ausente``)
+    numa thread, fora do caminho das requisições
+    """
+    def preparar():
+        try:
+            carregar_classificador(obter_df(), treinar_se_ausente=treinar_se_ausente)
+        except Exception as e:
+            print(f"⚠️ Erro ao treinar classificador: {e}")
+
+    thread = threading.Thread(target=preparar, name="classificador-censo", daemon=True)
+    thread.start()
+    return thread
+
+
+# ============================================
+# PREVISÃO EM LOTE
+# ============================================
+
+def prever(artefatos, cap):
+    """
+    (classe, probabilidade) de cada CAP (m), vetorizado sobre o array inteiro.
+    CAP ausente ou fora da faixa do treino fica com probabilidade NaN e classe None.
+    """
+    cap = pd.to_numeric(pd.Series(np.asarray(cap).ravel()), errors='coerce').to_numpy(dtype=np.float64)
+    validos = (cap > FAIXA_CAP[0]) & (cap < FAIXA_CAP[1])
+    prob = np.full(len(cap), np.nan)
+    if validos.any():
+        prob[validos] = artefatos['modelo'].predict_proba(cap[validos].reshape(-1, 1))[:, 1]
+    classe = np.where(prob >= LIMIAR_PREVISAO, CLASSES[1], CLASSES[0]).astype(object)
+    classe[~validos] = None
+    return classe, prob
+
+
+def prever_csv(artefatos, entrada, coluna='cap', tamanho_bloco=TAMANHO_BLOCO_PREVISAO):
+    """
+    Lê ``entrada`` (caminho ou arquivo aberto) em blocos e gera, para cada
+    um, o texto CSV com as colunas originais mais 'classe_copa' e
+    'prob_copa_grande'. O cabeçalho sai só no primeiro bloco.
+    """
+    for i, bloco in enumerate(pd.read_csv(entrada, chunksize=tamanho_bloco, low_memory=False)):
+        if coluna not in bloco.columns:
+            raise ValueError(f"coluna '{coluna}' não encontrada no CSV")
+        classe, prob = prever(artefatos, bloco[coluna])
+        bloco['classe_copa'] = classe
+        bloco['prob_copa_grande'] = prob.round(4)
+        yield bloco.to_csv(index=False, header=(i == 0))
+
+
+def main():
+    from dados_censo import carregar_dataset
+
+    parser = argparse.ArgumentParser(description="Treino e previsão do classificador de copa grande")
+    parser.add_argument('csv', nargs='?', default=str(CSV_PADRAO), help="CSV do censo usado no treino")
+    parser.add_argument('--prever', metavar='CSV', help="CSV de árvores (coluna cap) a classificar")
+    parser.add_argument('--coluna', default='cap', help="coluna com o CAP em metros")
+    parser.add_argument('-o', '--saida', help="arquivo de saída da previsão (padrão: stdout)")
+    args = parser.parse_args()
+
+    csv = Path(args.csv)
+    if not csv.exists():
+        print(f"❌ Arquivo não encontrado: {csv}")
+        sys.exit(1)
+
+    df = carregar_dataset(csv)
+    artefatos = carregar_classificador(df, treinar_se_ausente=True)
+    if artefatos is None:
+        print("❌ Dados insuficientes para treinar o classificador")
+        sys.exit(1)
+
+    if args.prever:
+        saida = open(args.saida, 'w', encoding='utf-8', newline='') if args.saida else sys.stdout
+        try:
+            for texto in prever_csv(artefatos, args.prever, coluna=args.coluna):
+                saida.write(texto)
+        finally:
+            if args.saida:
+                saida.close()
+        if args.saida:
+            print(f"✅ Previsões gravadas em {args.saida}")
+        return
+
+    print(f"✅ Modelo {artefatos['impressao']}: {artefatos['n_treino']:,} treino / {artefatos['n_teste']:,} teste")
+    print(f"📊 AUC ROC = {artefatos['roc_curve']['auc']:.3f} | AP = {artefatos['pr_curve']['auc']:.3f}")
+    print(f"   Arquivo: {caminho_modelo(artefatos['impressao'])}")
+
+
+if __name__ == '__main__':
+    main()
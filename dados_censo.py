@@ -0,0 +1,665 @@
+"""
+Carregamento do censo arbóreo com cache colunar em disco.
+
+O CSV completo é lido uma única vez (apenas as colunas essenciais, já
+tipadas) e convertido em um diretório com um arquivo ``.npy`` por coluna e
+um ``colunas.json`` descrevendo o esquema. As próximas cargas abrem esses
+arquivos com ``mmap_mode='r'``, sem parsear texto.
+
+O cache é identificado pelo tamanho e pela data de modificação do CSV: se o
+arquivo mudar, um novo cache é gerado automaticamente.
+
+Uso como etapa de build:
+    python dados_censo.py [caminho_do_csv]
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from pyproj import CRS, Transformer
+
+try:
+    import fcntl
+except ImportError:  # fora do POSIX a trava entre processos fica desligada
+    fcntl = None
+
+CSV_PADRAO = Path("censo_arboreo_final_geral.csv")
+CACHE_DIR = Path(".cache_censo")
+
+# Incrementar sempre que o formato/tratamento das colunas mudar
+VERSAO_CACHE = 7
+
+COLUNAS_ESSENCIAIS = [
+    'objectid', 'x', 'y', 'nome_popular', 'nome_cientifico', 'especie', 'fitossanid_grupo',
+    'estado_fitossanitario', 'condicao_fisica', 'saude',
+    'altura', 'altura_total', 'data_plantio', 'rpa',
+    'copa', 'cap',
+    'bairro'
+]
+
+# Colunas de texto com poucos valores distintos -> dtype 'category' (códigos
+# inteiros + tabela de textos, já sem espaços nas pontas)
+COLUNAS_CATEGORICAS = [
+    'nome_popular', 'nome_cientifico', 'especie', 'fitossanid_grupo',
+    'estado_fitossanitario', 'condicao_fisica', 'saude', 'bairro'
+]
+# Códigos numéricos com poucos valores -> 'category' com categorias inteiras
+COLUNAS_CATEGORICAS_NUMERICAS = ['rpa']
+COLUNAS_DATA = ['data_plantio']
+
+# As linhas ficam ordenadas por estas colunas, então cada RPA/bairro ocupa
+# uma faixa contínua de linhas (ver calcular_faixas)
+COLUNAS_INDICE = ['rpa', 'bairro']
+
+# Identifica cada árvore; usada para não contar duas vezes uma linha reenviada
+COLUNA_ID = 'objectid'
+
+# Bytes do fim da parte já lida do CSV usados para detectar se ela foi reescrita
+TAMANHO_ASSINATURA = 4096
+
+# Limites da cidade (recorte usado pelos mapas)
+LAT_MIN, LAT_MAX = -8.2, -7.9
+LON_MIN, LON_MAX = -35.1, -34.8
+
+# Sistemas de coordenadas testados para x/y, em ordem de preferência:
+# SIRGAS 2000 e WGS84 UTM 25S, SIRGAS 2000 UTM 24S e x/y já em graus
+CRS_CANDIDATOS = ['EPSG:31985', 'EPSG:32725', 'EPSG:31984', 'EPSG:4326']
+# Quando x/y vêm em graus, passam a ficar neste CRS (metros): as grades de
+# densidade (grade_censo) agrupam x/y em células de 100 a 1000 m
+CRS_METRICO = 'EPSG:31985'
+# Pontos usados na detecção e fração mínima deles que precisa cair na cidade
+AMOSTRA_CRS = 5000
+FRACAO_MINIMA_CRS = 0.5
+# Linhas reprojetadas por vez (limita os arrays temporários do pyproj)
+TAMANHO_BLOCO_COORDENADAS = 100_000
+
+
+# ============================================
+# LEITURA E TIPAGEM DO CSV
+# ============================================
+
+def _categoria_texto(serie):
+    """Categoria com os textos normalizados (strip); vazio vira nulo"""
+    categorica = serie.astype('category')
+    nomes = categorica.cat.categories.astype(str).str.strip()
+    # Textos que só diferiam por espaços passam a ser a mesma categoria
+    categorias = pd.Index(sorted(set(nomes) - {''}))
+    novos_codigos = categorias.get_indexer(nomes)
+    antigos = categorica.cat.codes.to_numpy()
+    # Só indexa os códigos válidos: coluna toda nula não tem categorias (novos_codigos vazio)
+    codigos = np.full(len(antigos), -1, dtype=np.int64)
+    codigos[antigos >= 0] = novos_codigos[antigos[antigos >= 0]]
+    return pd.Series(pd.Categorical.from_codes(codigos, categories=categorias), index=serie.index, name=serie.name)
+
+
+def _categoria_numerica(serie):
+    """Categoria com categorias inteiras (ex.: RPA 1..6); valores não inteiros viram nulo"""
+    valores = pd.to_numeric(serie, errors='coerce')
+    valores = valores.where(valores == valores.round())
+    categorias = np.unique(valores.dropna().to_numpy(dtype=np.int64))
+    return pd.Series(pd.Categorical(valores, categories=categorias), index=serie.index, name=serie.name)
+
+
+def _tipar_colunas(df):
+    """Converte as colunas lidas do CSV para os tipos usados pelo app"""
+    for col in df.columns:
+        if col in COLUNAS_CATEGORICAS:
+            df[col] = _categoria_texto(df[col])
+        elif col in COLUNAS_CATEGORICAS_NUMERICAS:
+            df[col] = _categoria_numerica(df[col])
+        elif col in COLUNAS_DATA:
+            df[col] = pd.to_datetime(df[col], dayfirst=True, errors='coerce')
+        elif not pd.api.types.is_numeric_dtype(df[col]):
+            # Ex.: alturas exportadas com vírgula decimal ("3,5")
+            df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '.'), errors='coerce')
+    return df
+
+
+def ler_csv(csv_path=CSV_PADRAO):
+    """Lê apenas as colunas essenciais do CSV, já com os tipos finais e latitude/longitude"""
+    df = pd.read_csv(csv_path, usecols=lambda c: c in COLUNAS_ESSENCIAIS, low_memory=False)
+    # Mantém a ordem de COLUNAS_ESSENCIAIS independente da ordem no arquivo
+    df = df[[c for c in COLUNAS_ESSENCIAIS if c in df.columns]]
+    df = adicionar_coordenadas(_tipar_colunas(df))
+    ordem = [c for c in COLUNAS_INDICE if c in df.columns]
+    if ordem:
+        df = df.sort_values(ordem, kind='stable', na_position='last').reset_index(drop=True)
+    return df
+
+
+def calcular_faixas(df):
+    """
+    Faixas de linhas [início, fim) de cada valor das COLUNAS_INDICE, ex.:
+    {'rpa': {'1': [[0, 858]]}, 'bairro': {'REC': [[0, 154]]}}
+    Com o DataFrame ordenado por essas colunas, cada valor tem poucas faixas.
+    """
+    faixas = {}
+    for col in COLUNAS_INDICE:
+        if col not in df.columns:
+            continue
+        serie = df[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos = serie.cat.codes.to_numpy()
+            nomes = [str(c) for c in serie.cat.categories]
+            rotulo = lambda v: nomes[v] if v >= 0 else None
+        else:
+            valores = serie.to_numpy(dtype=np.float64)
+            codigos = np.where(np.isnan(valores), -1, valores).astype(np.int64)
+            rotulo = lambda v: str(v) if v >= 0 else None
+
+        faixas[col] = {}
+        if len(codigos) == 0:
+            continue
+        inicios = np.flatnonzero(np.r_[True, codigos[1:] != codigos[:-1]])
+        fins = np.r_[inicios[1:], len(codigos)]
+        for ini, fim in zip(inicios, fins):
+            chave = rotulo(int(codigos[ini]))
+            if chave is not None:
+                faixas[col].setdefault(chave, []).append([int(ini), int(fim)])
+    return faixas
+
+
+# ============================================
+# CACHE COLUNAR (.npy por coluna)
+# ============================================
+
+def chave_cache(csv_path, st=None):
+    """Identificador do cache: tamanho + mtime do CSV (``st``, ou o stat atual) + versão do formato"""
+    st = st if st is not None else Path(csv_path).stat()
+    base = f"{Path(csv_path).name}|{st.st_size}|{st.st_mtime_ns}|v{VERSAO_CACHE}"
+    return hashlib.md5(base.encode('utf-8')).hexdigest()[:16]
+
+
+def _diretorio_cache(csv_path, cache_dir=CACHE_DIR):
+    return Path(cache_dir) / f"{Path(csv_path).stem}_{chave_cache(csv_path)}"
+
+
+def salvar_cache(df, destino):
+    """Grava o DataFrame tipado em ``destino`` (um .npy por coluna + colunas.json)"""
+    destino = Path(destino)
+    tmp = destino.with_name(destino.name + f".tmp{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    esquema = {'versao': VERSAO_CACHE, 'n_linhas': int(len(df)), 'crs': df.attrs.get('crs'), 'colunas': []}
+    for i, col in enumerate(df.columns):
+        arquivo = f"{i:02d}.npy"
+        serie = df[col]
+        info = {'nome': col, 'arquivo': arquivo}
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            info['tipo'] = 'categoria'
+            categorias = serie.cat.categories
+            info['categorias'] = ([int(c) for c in categorias] if pd.api.types.is_integer_dtype(categorias)
+                                  else [str(c) for c in categorias])
+            valores = serie.cat.codes.to_numpy()
+        elif pd.api.types.is_datetime64_any_dtype(serie):
+            info['tipo'] = 'data'
+            valores = serie.to_numpy(dtype='datetime64[ns]')
+        else:
+            info['tipo'] = 'numerico'
+            valores = serie.to_numpy()
+        np.save(tmp / arquivo, valores, allow_pickle=False)
+        esquema['colunas'].append(info)
+
+    with open(tmp / "colunas.json", 'w', encoding='utf-8') as f:
+        json.dump(esquema, f, ensure_ascii=False)
+    with open(tmp / "indice.json", 'w', encoding='utf-8') as f:
+        json.dump(calcular_faixas(df), f, ensure_ascii=False)
+
+    # Troca atômica: outro worker pode ter gerado o mesmo cache em paralelo
+    try:
+        os.rename(tmp, destino)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def abrir_cache(origem):
+    """Abre o cache em modo memory-map (sem copiar as colunas numéricas)"""
+    origem = Path(origem)
+    with open(origem / "colunas.json", 'r', encoding='utf-8') as f:
+        esquema = json.load(f)
+
+    colunas = {}
+    for info in esquema['colunas']:
+        valores = np.load(origem / info['arquivo'], mmap_mode='r', allow_pickle=False)
+        if info['tipo'] == 'categoria':
+            colunas[info['nome']] = pd.Categorical.from_codes(valores, categories=info['categorias'])
+        else:
+            colunas[info['nome']] = valores
+    df = pd.DataFrame(colunas, copy=False)
+    df.attrs['crs'] = esquema.get('crs')
+    return df
+
+
+def _ler_faixas(origem):
+    try:
+        with open(Path(origem) / "indice.json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def carregar_faixas(csv_path=CSV_PADRAO, cache_dir=CACHE_DIR):
+    """Faixas por RPA/bairro gravadas junto com o cache (None se não houver)"""
+    return _ler_faixas(_diretorio_cache(csv_path, cache_dir))
+
+
+@contextmanager
+def trava_cache(nome, cache_dir=CACHE_DIR):
+    """
+    Trava exclusiva entre processos (flock em <cache_dir>/<nome>.lock) em
+    volta da geração de um cache: o primeiro worker gera, os outros esperam
+    e depois só abrem o que ele gravou. Sem fcntl, ou sem poder criar o
+    arquivo da trava, segue sem travar.
+    """
+    if fcntl is None:
+        yield
+        return
+    try:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        arquivo = open(Path(cache_dir) / f"{nome}.lock", 'a')
+    except OSError:
+        yield
+        return
+    with arquivo:
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        yield
+
+
+def limpar_versoes_antigas(atual):
+    """
+    Remove as outras versões de ``atual`` (<prefixo>_<chave>, com a chave de
+    16 hex e a mesma extensão, arquivo ou diretório). Só a chave exata casa:
+    caches de outro prefixo que começa igual (censo_arboreo_final_geral_<chave>
+    ao limpar censo_arboreo_final) e gravações em andamento (.tmp<pid>) ficam.
+    """
+    atual = Path(atual)
+    partes = re.fullmatch(r"(.+)_[0-9a-f]{16}(.*)", atual.name)
+    if partes is None:
+        return
+    prefixo, extensao = partes.groups()
+    versao = re.compile(re.escape(prefixo) + r"_[0-9a-f]{16}" + re.escape(extensao))
+    for antigo in atual.parent.iterdir():
+        if antigo == atual or not versao.fullmatch(antigo.name):
+            continue
+        if antigo.is_dir():
+            shutil.rmtree(antigo, ignore_errors=True)
+        else:
+            try:
+                antigo.unlink()
+            except OSError:
+                pass
+
+
+def gravar_cache_versionado(destino, gravar):
+    """
+    Grava um cache em diretório com uma versão por chave (notebook_<chave>,
+    fotos_<chave>, ...): ``gravar(tmp)`` preenche um diretório temporário
+    deste processo, que é renomeado para ``destino`` (se outro worker gravou
+    o mesmo cache primeiro, vale o dele), e as versões anteriores são
+    apagadas. Retorna o que ``gravar`` retornar.
+    """
+    destino = Path(destino)
+    tmp = destino.with_name(destino.name + f".tmp{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    try:
+        resultado = gravar(tmp)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    try:
+        os.rename(tmp, destino)
+    except OSError:
+        # Outro worker gravou o mesmo cache primeiro
+        shutil.rmtree(tmp, ignore_errors=True)
+    limpar_versoes_antigas(destino)
+    return resultado
+
+
+def carregar_cache_versionado(destino, memoria, gravar, ler):
+    """
+    Conteúdo do cache em diretório ``destino``: da ``memoria`` do processo
+    (dict), lido do disco com ``ler(destino)`` ou, se ainda não existe,
+    gerado antes com gravar_cache_versionado(destino, gravar). Só a versão
+    atual fica em ``memoria``.
+    """
+    if destino in memoria:
+        return memoria[destino]
+    if not destino.is_dir():
+        gravar_cache_versionado(destino, gravar)
+    conteudo = ler(destino)
+    memoria.clear()
+    memoria[destino] = conteudo
+    return conteudo
+
+
+def construir_cache(csv_path=CSV_PADRAO, cache_dir=CACHE_DIR):
+    """Gera (se necessário) o cache do CSV e retorna o diretório dele"""
+    destino = _diretorio_cache(csv_path, cache_dir)
+    with trava_cache(Path(csv_path).stem, cache_dir):
+        if not (destino / "colunas.json").exists():
+            salvar_cache(ler_csv(csv_path), destino)
+            limpar_versoes_antigas(destino)
+    return destino
+
+
+def _abrir_cache_valido(destino):
+    """DataFrame do cache em ``destino`` (None se não existe ou está inválido)"""
+    if not (destino / "colunas.json").exists():
+        return None
+    try:
+        return abrir_cache(destino)
+    except Exception as e:
+        print(f"⚠️ Cache do censo inválido, relendo CSV: {e}")
+        shutil.rmtree(destino, ignore_errors=True)
+        return None
+
+
+def carregar_dataset(csv_path=CSV_PADRAO, cache_dir=CACHE_DIR):
+    """
+    Retorna o DataFrame com as colunas essenciais do censo.
+    Usa o cache colunar quando ele está em dia com o CSV; caso contrário lê o
+    CSV, grava o cache e devolve o cache recém-gravado (memory-map). Só um
+    processo por vez gera o cache; os outros (ex.: workers recarregando o
+    mesmo CSV) esperam e abrem o que ele gravou, então todos compartilham as
+    mesmas páginas. Se o cache não puder ser gravado (ex.: disco somente
+    leitura), segue apenas com o CSV.
+    """
+    destino = _diretorio_cache(csv_path, cache_dir)
+    df = _abrir_cache_valido(destino)
+    if df is not None:
+        return df
+
+    with trava_cache(Path(csv_path).stem, cache_dir):
+        df = _abrir_cache_valido(destino)
+        if df is not None:
+            return df
+        df = ler_csv(csv_path)
+        try:
+            salvar_cache(df, destino)
+            limpar_versoes_antigas(destino)
+        except OSError as e:
+            print(f"⚠️ Não foi possível gravar o cache do censo: {e}")
+            return df
+    # As colunas passam a ser páginas mapeadas do cache em vez de uma cópia privada
+    gravado = _abrir_cache_valido(destino)
+    return gravado if gravado is not None else df
+
+
+# ============================================
+# LINHAS ACRESCENTADAS AO CSV
+# ============================================
+
+def _assinatura(f, tamanho):
+    """md5 dos últimos bytes antes de ``tamanho``: muda se o que já foi lido for reescrito"""
+    inicio = max(0, tamanho - TAMANHO_ASSINATURA)
+    f.seek(inicio)
+    return hashlib.md5(f.read(tamanho - inicio)).hexdigest()
+
+
+def _ids_validos(valores):
+    ids = np.asarray(valores, dtype=np.float64)
+    return np.unique(ids[~np.isnan(ids)])
+
+
+def estado_leitura(csv_path, ids):
+    """
+    Marca até onde o CSV já foi lido: tamanho, cabeçalho, assinatura do fim
+    da parte lida e os ids (COLUNA_ID) já vistos. Ponto de partida de
+    ler_linhas_novas.
+    """
+    with open(csv_path, 'rb') as f:
+        cabecalho = f.readline()
+        tamanho = f.seek(0, os.SEEK_END)
+        assinatura = _assinatura(f, tamanho)
+    return {'tamanho': tamanho, 'cabecalho': cabecalho, 'assinatura': assinatura, 'ids': _ids_validos(ids)}
+
+
+def ler_linhas_novas(csv_path, estado):
+    """
+    Lê apenas as linhas acrescentadas ao CSV depois de ``estado``, com os
+    mesmos tipos de ler_csv. Retorna (df_novas, novo_estado); df_novas é
+    None se a parte já lida mudou (arquivo reescrito, não só acrescentado).
+    Linhas cujo id já foi visto são descartadas e uma última linha ainda
+    incompleta fica para a próxima leitura.
+    """
+    with open(csv_path, 'rb') as f:
+        if f.readline() != estado['cabecalho']:
+            return None, estado
+        tamanho = f.seek(0, os.SEEK_END)
+        if tamanho < estado['tamanho'] or _assinatura(f, estado['tamanho']) != estado['assinatura']:
+            return None, estado
+        f.seek(estado['tamanho'])
+        bloco = f.read(tamanho - estado['tamanho'])
+        bloco = bloco[:bloco.rfind(b'\n') + 1]
+        lido = estado['tamanho'] + len(bloco)
+        novo_estado = dict(estado, tamanho=lido, assinatura=_assinatura(f, lido))
+
+    if not bloco.strip():
+        return pd.DataFrame(), novo_estado
+
+    df = pd.read_csv(io.BytesIO(estado['cabecalho'] + bloco),
+                     usecols=lambda c: c in COLUNAS_ESSENCIAIS, low_memory=False)
+    df = df[[c for c in COLUNAS_ESSENCIAIS if c in df.columns]]
+    if COLUNA_ID in df.columns:
+        ids = pd.to_numeric(df[COLUNA_ID], errors='coerce')
+        novas = ~(ids.isin(estado['ids']) | (ids.notna() & ids.duplicated()))
+        df = df[novas]
+        novo_estado['ids'] = np.union1d(estado['ids'], _ids_validos(ids[novas]))
+    return _tipar_colunas(df.reset_index(drop=True)), novo_estado
+
+
+def _coluna_vazia(dtype, n):
+    """``n`` valores nulos compatíveis com ``dtype`` (coluna ausente nas linhas novas)"""
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return np.full(n, np.datetime64('NaT'), dtype='datetime64[ns]')
+    if pd.api.types.is_bool_dtype(dtype):
+        return np.zeros(n, dtype=bool)
+    return np.full(n, np.nan)
+
+
+def acrescentar_linhas(df, df_novas):
+    """
+    Novo DataFrame com as linhas de ``df_novas`` (saída de ler_linhas_novas)
+    depois das de ``df``: coordenadas convertidas com o CRS de ``df`` e
+    categorias unidas (os valores novos entram no fim da tabela de textos).
+    ``df`` não é alterado. As linhas novas ficam fora da ordem por
+    COLUNAS_INDICE, o que só acrescenta faixas em calcular_faixas.
+    """
+    novas = adicionar_coordenadas(df_novas.copy(), crs=df.attrs.get('crs'))
+    colunas = {}
+    for col in df.columns:
+        antiga = df[col]
+        nova = novas[col] if col in novas.columns else None
+        if isinstance(antiga.dtype, pd.CategoricalDtype):
+            if nova is None or len(nova.cat.categories) == 0:
+                # Sem nenhum valor: só códigos nulos, nas categorias atuais
+                nova = pd.Categorical.from_codes(np.full(len(novas), -1), categories=antiga.cat.categories)
+            colunas[col] = union_categoricals([antiga.array, pd.Categorical(nova)], ignore_order=True)
+        else:
+            valores = nova.to_numpy() if nova is not None else _coluna_vazia(antiga.dtype, len(novas))
+            colunas[col] = np.concatenate([antiga.to_numpy(), valores])
+    resultado = pd.DataFrame(colunas, copy=False)
+    resultado.attrs['crs'] = df.attrs.get('crs')
+    return resultado
+
+
+def gravar_linhas_novas(csv_path, df, df_novas, estado, cache_dir=CACHE_DIR):
+    """
+    Grava o cache colunar da versão atual do CSV a partir de ``df`` mais as
+    linhas de ``df_novas`` (lidas até ``estado``) e retorna (df, faixas)
+    desse cache em memory-map, como carregar_dataset. Só um processo grava;
+    os outros esperam a trava e abrem o que ele gravou, então todos voltam a
+    compartilhar as mesmas páginas. Retorna None se o CSV já cresceu além
+    do que foi lido (a próxima leitura incremental grava).
+    """
+    st = Path(csv_path).stat()
+    if st.st_size != estado['tamanho']:
+        return None
+    destino = Path(cache_dir) / f"{Path(csv_path).stem}_{chave_cache(csv_path, st)}"
+    with trava_cache(Path(csv_path).stem, cache_dir):
+        if _abrir_cache_valido(destino) is None:
+            completo = acrescentar_linhas(df, df_novas)
+            ordem = [c for c in COLUNAS_INDICE if c in completo.columns]
+            if ordem:
+                completo = completo.sort_values(ordem, kind='stable', na_position='last').reset_index(drop=True)
+            salvar_cache(completo, destino)
+            limpar_versoes_antigas(destino)
+    gravado = _abrir_cache_valido(destino)
+    return (gravado, _ler_faixas(destino)) if gravado is not None else None
+
+
+# ============================================
+# COORDENADAS
+# ============================================
+
+def na_cidade(lat, lon):
+    """Máscara dos pontos dentro dos limites da cidade (NaN fica de fora)"""
+    return (lat >= LAT_MIN) & (lat <= LAT_MAX) & (lon >= LON_MIN) & (lon <= LON_MAX)
+
+
+def _transformador(crs, destino="EPSG:4326"):
+    return Transformer.from_crs(crs, destino, always_xy=True)
+
+
+def _transformar_em_blocos(transformador, a, b):
+    """transformador.transform sobre os arrays inteiros, TAMANHO_BLOCO_COORDENADAS linhas por vez"""
+    saida_a = np.full(len(a), np.nan)
+    saida_b = np.full(len(b), np.nan)
+    for inicio in range(0, len(a), TAMANHO_BLOCO_COORDENADAS):
+        bloco = slice(inicio, inicio + TAMANHO_BLOCO_COORDENADAS)
+        saida_a[bloco], saida_b[bloco] = transformador.transform(a[bloco], b[bloco])
+    invalidas = ~(np.isfinite(saida_a) & np.isfinite(saida_b))
+    saida_a[invalidas] = np.nan
+    saida_b[invalidas] = np.nan
+    return saida_a, saida_b
+
+
+def detectar_crs(x, y):
+    """
+    Escolhe o CRS de x/y entre CRS_CANDIDATOS: o que põe a maior fração de
+    uma amostra dos pontos dentro dos limites de Recife. Retorna (crs, fração);
+    crs é None se nenhum candidato atinge FRACAO_MINIMA_CRS.
+    """
+    validos = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if len(validos) == 0:
+        return None, 0.0
+    amostra = validos[np.linspace(0, len(validos) - 1, min(AMOSTRA_CRS, len(validos))).astype(np.int64)]
+
+    melhor, melhor_fracao = None, 0.0
+    for crs in CRS_CANDIDATOS:
+        lon, lat = _transformador(crs).transform(x[amostra], y[amostra])
+        fracao = float(np.mean(na_cidade(np.asarray(lat), np.asarray(lon))))
+        if fracao > melhor_fracao:
+            melhor, melhor_fracao = crs, fracao
+    if melhor_fracao < FRACAO_MINIMA_CRS:
+        return None, melhor_fracao
+    return melhor, melhor_fracao
+
+
+def adicionar_coordenadas(df, crs=None):
+    """
+    Converte x/y para as colunas latitude/longitude (WGS84), em blocos de
+    TAMANHO_BLOCO_COORDENADAS linhas. O CRS de origem é detectado pelos
+    limites de Recife (ou informado em ``crs``) e fica em df.attrs['crs'].
+    Se esse CRS é geográfico (x/y em graus), x/y são reescritos em
+    CRS_METRICO, em metros. Linhas sem x/y ficam com latitude/longitude NaN
+    (em vez do ponto 0, 0) e coordenada_valida marca as linhas dentro da
+    cidade. Não faz nada se o DataFrame já tem latitude/longitude (ex.:
+    aberto do cache).
+    """
+    if 'latitude' in df.columns and 'longitude' in df.columns:
+        return df
+    if 'x' not in df.columns or 'y' not in df.columns:
+        return df
+
+    x = df['x'].to_numpy(dtype=np.float64)
+    y = df['y'].to_numpy(dtype=np.float64)
+    if crs is None:
+        crs, fracao = detectar_crs(x, y)
+        if crs is None:
+            print(f"⚠️ Nenhum CRS candidato põe x/y em Recife (melhor: {fracao:.0%}); coordenadas ficam vazias")
+
+    lat = np.full(len(df), np.nan)
+    lon = np.full(len(df), np.nan)
+    if crs is not None:
+        lon, lat = _transformar_em_blocos(_transformador(crs), x, y)
+        if CRS(crs).is_geographic:
+            df['x'], df['y'] = _transformar_em_blocos(_transformador("EPSG:4326", CRS_METRICO), lon, lat)
+
+    df['latitude'] = lat
+    df['longitude'] = lon
+    df['coordenada_valida'] = na_cidade(lat, lon)
+    df.attrs['crs'] = crs
+    return df
+
+
+# ============================================
+# ÍNDICES DE FILTRAGEM
+# ============================================
+
+def construir_indices(df, faixas=None):
+    """
+    Índices usados pelos filtros do mapa: máscara das linhas dentro dos
+    limites da cidade, posições dessas linhas e as faixas de linhas por
+    RPA/bairro (lidas do cache ou recalculadas). Com eles, um filtro custa
+    O(linhas selecionadas), sem varrer nem copiar o DataFrame inteiro.
+    """
+    if 'coordenada_valida' in df.columns:
+        validas = df['coordenada_valida'].to_numpy(dtype=bool)
+    else:
+        validas = na_cidade(df['latitude'].to_numpy(), df['longitude'].to_numpy())
+    return {
+        'na_cidade': validas,
+        'cidade': np.flatnonzero(validas),
+        'faixas': faixas if faixas is not None else calcular_faixas(df),
+    }
+
+
+def _posicoes_das_faixas(faixas_coluna, valores):
+    partes = [np.arange(ini, fim) for v in valores for ini, fim in faixas_coluna.get(str(v), [])]
+    return np.sort(np.concatenate(partes)) if partes else np.empty(0, dtype=np.int64)
+
+
+def selecionar_posicoes(indices, rpas=None, bairros=None):
+    """
+    Posições (ordenadas) das linhas da cidade nas RPAs e bairros pedidos.
+    None/vazio em um filtro = sem restrição por ele.
+    """
+    if not rpas and not bairros:
+        return indices['cidade']
+
+    posicoes = None
+    for col, valores in (('rpa', rpas), ('bairro', bairros)):
+        if not valores:
+            continue
+        selecao = _posicoes_das_faixas(indices['faixas'].get(col, {}), valores)
+        posicoes = selecao if posicoes is None else np.intersect1d(posicoes, selecao, assume_unique=True)
+    return posicoes[indices['na_cidade'][posicoes]]
+
+
+if __name__ == '__main__':
+    csv = Path(sys.argv[1]) if len(sys.argv) > 1 else CSV_PADRAO
+    if not csv.exists():
+        print(f"❌ Arquivo não encontrado: {csv}")
+        sys.exit(1)
+
+    inicio = time.perf_counter()
+    destino = construir_cache(csv)
+    print(f"✅ Cache gerado em {destino} ({time.perf_counter() - inicio:.2f}s)")
+
+    inicio = time.perf_counter()
+    df = abrir_cache(destino)
+    print(f"⚡ Carga via cache: {len(df):,} linhas em {time.perf_counter() - inicio:.3f}s")
+    print(f"🌎 CRS de x/y: {df.attrs.get('crs')} ({int(df['coordenada_valida'].sum()):,} linhas na cidade)")
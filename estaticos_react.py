@@ -0,0 +1,102 @@
+"""
+Arquivos estáticos do build do React (tela_build/) servidos da memória.
+
+No boot cada arquivo é lido uma vez e ganha um etag (md5 do conteúdo) e,
+quando compensa, versões gzip e brotli já comprimidas. As requisições só
+consultam esse manifesto em memória: nenhum stat, open ou compressão por
+requisição. Os arquivos de assets/ têm o hash no nome (gerado pelo Vite),
+então são servidos como imutáveis por um ano; o restante (index.html etc.)
+é revalidado pelo etag a cada uso.
+"""
+import gzip
+import hashlib
+import mimetypes
+from pathlib import Path
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele só há a versão gzip
+    brotli = None
+
+BUILD_DIR = Path("tela_build")
+PASTA_IMUTAVEL = "assets/"
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+CACHE_REVALIDAR = 'no-cache'
+
+# Arquivos menores que isso ou já comprimidos (imagens, fontes woff) ficam sem variantes
+TAMANHO_MINIMO_COMPRESSAO = 1024
+TIPOS_COMPRIMIVEIS = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+def _comprimivel(mimetype, conteudo):
+    return len(conteudo) >= TAMANHO_MINIMO_COMPRESSAO and mimetype.startswith(TIPOS_COMPRIMIVEIS)
+
+
+def _variantes(conteudo, mimetype):
+    """{codificacao: bytes} só com as compressões que reduzem o arquivo"""
+    variantes = {}
+    if not _comprimivel(mimetype, conteudo):
+        return variantes
+    comprimido = gzip.compress(conteudo, compresslevel=9, mtime=0)
+    if len(comprimido) < len(conteudo):
+        variantes['gzip'] = comprimido
+    if brotli is not None:
+        comprimido = brotli.compress(conteudo, quality=11)
+        if len(comprimido) < len(conteudo):
+            variantes['br'] = comprimido
+    return variantes
+
+
+def construir_manifesto(build_dir=BUILD_DIR):
+    """
+    Lê todos os arquivos do build: {caminho_relativo: {'conteudo', 'mimetype',
+    'etag', 'cache', 'variantes'}}. Retorna None se o build não existe.
+    """
+    build_dir = Path(build_dir)
+    if not build_dir.is_dir():
+        return None
+
+    manifesto = {}
+    for arquivo in sorted(build_dir.rglob('*')):
+        if not arquivo.is_file():
+            continue
+        caminho = arquivo.relative_to(build_dir).as_posix()
+        conteudo = arquivo.read_bytes()
+        # Sem charset: o Response do werkzeug acrescenta '; charset=utf-8' aos tipos de texto
+        mimetype = mimetypes.guess_type(caminho)[0] or 'application/octet-stream'
+        manifesto[caminho] = {
+            'conteudo': conteudo,
+            'mimetype': mimetype,
+            'etag': hashlib.md5(conteudo).hexdigest()[:16],
+            'cache': CACHE_IMUTAVEL if caminho.startswith(PASTA_IMUTAVEL) else CACHE_REVALIDAR,
+            'variantes': _variantes(conteudo, mimetype),
+        }
+    return manifesto
+
+
+def resolver(manifesto, path):
+    """Entrada do manifesto para ``path``; rotas desconhecidas da SPA caem no index.html"""
+    path = (path or '').strip('/') or 'index.html'
+    return manifesto.get(path) or manifesto.get('index.html')
+
+
+def responder(entrada, request):
+    """
+    Resposta de um arquivo do manifesto: escolhe br/gzip/original pelo
+    Accept-Encoding, usa um etag por variante e trata If-None-Match e Range.
+    """
+    codificacao = next((c for c in ('br', 'gzip')
+                        if c in entrada['variantes'] and c in request.accept_encodings), None)
+    conteudo = entrada['variantes'][codificacao] if codificacao else entrada['conteudo']
+
+    resposta = Response(conteudo, mimetype=entrada['mimetype'])
+    resposta.set_etag(f"{entrada['etag']}-{codificacao}" if codificacao else entrada['etag'])
+    resposta.headers['Cache-Control'] = entrada['cache']
+    if entrada['variantes']:
+        resposta.headers['Vary'] = 'Accept-Encoding'
+    if codificacao:
+        resposta.headers['Content-Encoding'] = codificacao
+    # 304 para If-None-Match e 206 para Range (só faz sentido sobre a versão original)
+    return resposta.make_conditional(request, accept_ranges=codificacao is None, complete_length=len(conteudo))
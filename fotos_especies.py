@@ -0,0 +1,166 @@
+"""
+Fotos das espécies (especies/*.png) em versões reduzidas para os cards.
+
+Cada foto é redimensionada uma vez por versão da pasta para os tamanhos de
+TAMANHOS_FOTO, em WebP e JPEG, e gravada em .cache_censo/fotos_<chave>/ com
+um fotos.json de índice. O app serve esses arquivos por URL (a rota escolhe
+WebP ou JPEG pelo Accept do navegador) em vez de embutir o PNG original em
+base64 no layout. Sem Pillow as fotos são servidas no PNG original.
+"""
+import hashlib
+import json
+import shutil
+import time
+from pathlib import Path
+
+from busca_especies import normalizar
+from dados_censo import CACHE_DIR, carregar_cache_versionado
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow é opcional: sem ele só o PNG original é servido
+    Image = None
+
+FOTOS_DIR = Path("especies")
+
+# Incrementar quando os tamanhos/formatos mudarem
+VERSAO_CACHE_FOTOS = 1
+
+# Largura máxima (px) de cada versão; 'card' cobre o card do dashboard em telas 2x
+TAMANHOS_FOTO = {'card': 480, 'mini': 160}
+QUALIDADE = {'webp': 80, 'jpeg': 82}
+# Ordem de preferência na negociação com o navegador
+FORMATOS = [('webp', 'image/webp'), ('jpeg', 'image/jpeg'), ('png', 'image/png')]
+
+# Intervalo (s) entre duas varreduras da pasta de fotos (glob + stat de cada PNG)
+INTERVALO_VERIFICACAO = 30
+# Última chave calculada por pasta: (instante, chave)
+_chaves = {}
+
+# Nome popular normalizado (sem acentos/hífens, ver busca_especies.normalizar)
+# -> foto em FOTOS_DIR; assim "Ipê-Roxo", "Ipê-roxo" e "Ipê Roxo" usam a mesma foto
+FOTOS_ESPECIES = {
+    "ipe rosa": "ipe-rosa",
+    "mororo": "mororo",
+    "ipe roxo": "ipe-roxo",
+    "sabonete": "sabonete",
+    "sapoti do mangue": "sapoti-do-mangue",
+}
+
+
+def chave_fotos(fotos_dir=FOTOS_DIR):
+    """
+    Identificador do cache: nome, tamanho e mtime de cada foto + versão (+
+    Pillow ou não). A pasta é varrida no máximo a cada INTERVALO_VERIFICACAO
+    segundos; entre uma varredura e outra vale a última chave.
+    """
+    agora = time.monotonic()
+    memorizada = _chaves.get(str(fotos_dir))
+    if memorizada is not None and agora - memorizada[0] < INTERVALO_VERIFICACAO:
+        return memorizada[1]
+
+    base = [f"v{VERSAO_CACHE_FOTOS}", "pil" if Image is not None else "original"]
+    for arquivo in sorted(Path(fotos_dir).glob("*.png")):
+        st = arquivo.stat()
+        base.append(f"{arquivo.name}|{st.st_size}|{st.st_mtime_ns}")
+    chave = hashlib.md5('|'.join(base).encode('utf-8')).hexdigest()[:16]
+    _chaves[str(fotos_dir)] = (agora, chave)
+    return chave
+
+
+def diretorio_fotos(fotos_dir=FOTOS_DIR, cache_dir=CACHE_DIR):
+    return Path(cache_dir) / f"fotos_{chave_fotos(fotos_dir)}"
+
+
+def _reduzir(imagem, largura):
+    """Cópia com no máximo ``largura`` px de largura (proporção mantida)"""
+    if imagem.width <= largura:
+        return imagem.copy()
+    altura = max(1, round(imagem.height * largura / imagem.width))
+    return imagem.resize((largura, altura), Image.LANCZOS)
+
+
+def _gravar_variantes(origem, nome, destino):
+    """Grava as versões de ``origem`` em ``destino``: {tamanho: {formato: arquivo}}"""
+    if Image is None:
+        arquivo = f"{nome}.png"
+        shutil.copyfile(origem, destino / arquivo)
+        return {tamanho: {'png': arquivo} for tamanho in TAMANHOS_FOTO}
+
+    variantes = {}
+    with Image.open(origem) as imagem:
+        imagem.load()
+        # JPEG não tem transparência: o fundo vira branco
+        rgb = Image.new('RGB', imagem.size, 'white')
+        rgba = imagem.convert('RGBA')
+        rgb.paste(rgba, mask=rgba.getchannel('A'))
+        for tamanho, largura in TAMANHOS_FOTO.items():
+            reduzida = _reduzir(rgb, largura)
+            variantes[tamanho] = {}
+            for formato in ('webp', 'jpeg'):
+                arquivo = f"{nome}-{tamanho}.{'jpg' if formato == 'jpeg' else formato}"
+                reduzida.save(destino / arquivo, formato.upper(), quality=QUALIDADE[formato], optimize=True)
+                variantes[tamanho][formato] = arquivo
+    return variantes
+
+
+def _gravar_fotos(fotos_dir, pasta):
+    """Gera as versões de todas as fotos em ``pasta`` e o fotos.json de índice"""
+    indice = {}
+    for origem in sorted(Path(fotos_dir).glob("*.png")):
+        try:
+            variantes = _gravar_variantes(origem, origem.stem, pasta)
+        except Exception as e:
+            print(f"⚠️ Erro ao processar foto {origem.name}: {e}")
+            continue
+        # Versão do conteúdo, usada na URL (cache imutável no navegador)
+        indice[origem.stem] = {'versao': hashlib.md5(origem.read_bytes()).hexdigest()[:12], 'variantes': variantes}
+
+    with open(pasta / "fotos.json", 'w', encoding='utf-8') as f:
+        json.dump(indice, f, ensure_ascii=False)
+    return len(indice)
+
+
+def _ler_indice(destino):
+    with open(destino / "fotos.json", 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+_memoria = {}
+
+
+def carregar_fotos(fotos_dir=FOTOS_DIR, cache_dir=CACHE_DIR):
+    """
+    Retorna (diretorio, indice): {foto: {'versao', 'variantes': {tamanho:
+    {formato: arquivo}}}}, com os arquivos dentro de ``diretorio``. Gera as
+    versões na primeira chamada para cada versão da pasta de fotos.
+    """
+    if not Path(fotos_dir).is_dir():
+        return None, {}
+
+    destino = diretorio_fotos(fotos_dir, cache_dir)
+    try:
+        indice = carregar_cache_versionado(destino, _memoria, lambda pasta: _gravar_fotos(fotos_dir, pasta), _ler_indice)
+    except Exception as e:
+        print(f"⚠️ Erro ao gerar fotos das espécies: {e}")
+        return None, {}
+    return destino, indice
+
+
+def url_foto(especie, tamanho='card'):
+    """URL da foto de ``especie`` (nome popular) ou None se não há foto para ela"""
+    nome = FOTOS_ESPECIES.get(normalizar(especie))
+    _, indice = carregar_fotos()
+    if nome not in indice or tamanho not in TAMANHOS_FOTO:
+        return None
+    return f"/fotos-especies/{nome}/{tamanho}?v={indice[nome]['versao']}"
+
+
+def escolher_variante(foto, tamanho, aceitos):
+    """(arquivo, mimetype) do melhor formato disponível que o navegador aceita"""
+    variantes = foto['variantes'].get(tamanho, {})
+    for formato, mimetype in FORMATOS:
+        # JPEG e PNG são aceitos por qualquer navegador, mesmo sem estarem no Accept
+        if formato in variantes and (formato != 'webp' or mimetype in aceitos):
+            return variantes[formato], mimetype
+    return None, None
@@ -0,0 +1,341 @@
+"""
+Gerador de censos arbóreos sintéticos, com o mesmo esquema de
+censo_arboreo_final.csv, para testes de carga e de memória em qualquer tamanho.
+
+O que torna os dados parecidos com um censo real:
+    - espécies: frequências concentradas em poucas espécies (ESPECIES, com
+      porte e medidas típicas de cada uma) e uma parte sem espécie cadastrada
+    - espaço: cada árvore cai num bairro (peso pelo tamanho do bairro) e,
+      dentro dele, num dos trechos de rua sorteados em volta do centro, em
+      coordenadas UTM (EPSG:31985) como no CSV original
+    - medidas: altura, copa e CAP log-normais em torno das medianas da
+      espécie, correlacionadas por um fator de porte comum a cada árvore
+    - fitossanidade: mistura de MIX_FITOSSANIDADE; árvores maiores (mais
+      velhas) têm mais chance de estar injuriadas, doentes ou mortas
+    - plantios: uma fração recente (com data_plantio) e de porte menor
+
+As linhas são geradas e gravadas em blocos, então a memória não depende do
+número de árvores. Com a mesma semente e o mesmo tamanho de bloco o arquivo
+sai idêntico.
+
+Uso:
+    python gerador_censo.py 1000000 censo_sintetico.csv [--semente 42]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pyproj import Transformer
+
+# Incrementar quando a distribuição gerada mudar (entra no nome dos arquivos de benchmark)
+VERSAO_GERADOR = 1
+
+TAMANHO_BLOCO = 100_000
+CRS_CENSO = 'EPSG:31985'
+
+# Colunas na ordem do CSV original
+COLUNAS_CSV = [
+    'objectid', 'porte_especie', 'bairro', 'rpa', 'x', 'y', 'nome_popular', 'categoria',
+    'observacao', 'tipologia', 'nome_cientifico', 'copa', 'altura', 'cap', 'dap',
+    'data_plantio', 'data_monitoramento', 'injuria', 'fitossanid', 'x_wgs84', 'y_wgs84',
+    'nome_comum', 'globalid', 'projeto', 'responsavel', 'id', 'longitude', 'latitude',
+    'nome_popular_padrao', 'fitossanid_grupo', 'injuria_grupo', 'injuria_corrigida',
+    'fitossanid_corrigida', 'bairro_nome', 'altura_original', 'dif_long', 'dif_lat'
+]
+
+# (nome popular, nome científico, porte, peso, altura (m), copa (m), CAP (m)): medianas
+ESPECIES = [
+    ("Oiti", "Moquilea tomentosa", 'GP', 14, 8.0, 7.0, 1.1),
+    ("Pau-Ferro", "Libidibia ferrea", 'GP', 12, 10.0, 8.0, 1.2),
+    ("Palmeira-imperial", "Roystonea oleracea", 'GP', 10, 14.0, 4.0, 1.5),
+    ("Castanhola", "Terminalia catappa", 'GP', 9, 10.0, 9.0, 1.4),
+    ("Mangueira", "Mangifera indica", 'GP', 8, 11.0, 10.0, 1.8),
+    ("Ipê-amarelo", "Handroanthus chrysotrichus", 'MP', 7, 6.0, 4.0, 0.6),
+    ("Ipê-roxo", "Handroanthus impetiginosus", 'MP', 6, 7.0, 5.0, 0.7),
+    ("Fícus", "Ficus benjamina", 'GP', 5, 9.0, 9.0, 1.6),
+    ("Sombreiro", "Clitoria fairchildiana", 'MP', 5, 8.0, 8.0, 1.0),
+    ("Ipê-rosa", "Handroanthus heptaphyllus", 'MP', 4, 7.0, 5.0, 0.7),
+    ("Cássia-siamesa", "Senna siamea", 'MP', 4, 8.0, 6.0, 0.9),
+    ("Coqueiro", "Cocos nucifera", 'GP', 4, 12.0, 5.0, 1.0),
+    ("Jambeiro", "Syzygium malaccense", 'MP', 3, 8.0, 6.0, 0.9),
+    ("Flamboyant", "Delonix regia", 'GP', 3, 9.0, 10.0, 1.5),
+    ("Nim", "Azadirachta indica", 'MP', 3, 7.0, 5.0, 0.7),
+    ("Sapoti-do-mangue", None, 'MP', 2, 6.0, 5.0, 0.6),
+    ("Craibeira", "Tabebuia aurea", 'MP', 2, 7.0, 5.0, 0.7),
+    ("Pau-brasil", "Paubrasilia echinata", 'MP', 2, 6.0, 4.0, 0.5),
+    ("Mororó", "Bauhinia forficata", 'PP', 2, 4.0, 3.0, 0.3),
+    ("Palmeira-areca", "Dypsis lutescens", 'PP', 2, 4.0, 3.0, 0.3),
+    ("Sabonete", "Sapindus saponaria", 'MP', 1.5, 6.0, 5.0, 0.6),
+    ("Munguba", "Pachira aquatica", 'MP', 1.5, 8.0, 6.0, 0.9),
+    ("Jenipapo", "Genipa americana", 'MP', 1, 8.0, 5.0, 0.8),
+    ("Aroeira", "Schinus terebinthifolia", 'PP', 1, 5.0, 4.0, 0.4),
+    ("Algodão-da-praia", "Talipariti tiliaceum", 'PP', 1, 5.0, 6.0, 0.6),
+]
+FRACAO_SEM_ESPECIE = 0.10
+FRACAO_SEM_NOME_CIENTIFICO = 0.20
+
+# (sigla, nome, RPA, latitude, longitude, peso, raio (m)): centro aproximado de cada bairro
+BAIRROS = [
+    ("REC", "Recife", 1, -8.063, -34.871, 2, 400),
+    ("SAM", "Santo Amaro", 1, -8.047, -34.883, 3, 600),
+    ("BVS", "Boa Vista", 1, -8.060, -34.888, 3, 500),
+    ("SJO", "São José", 1, -8.072, -34.880, 2, 500),
+    ("SAN", "Santo Antônio", 1, -8.065, -34.877, 1, 300),
+    ("CAB", "Cabanga", 1, -8.080, -34.890, 1, 400),
+    ("ENC", "Encruzilhada", 2, -8.037, -34.893, 2, 500),
+    ("AGF", "Água Fria", 2, -8.018, -34.899, 3, 700),
+    ("BEB", "Beberibe", 2, -8.002, -34.898, 2, 600),
+    ("ARR", "Arruda", 2, -8.027, -34.889, 2, 500),
+    ("CGR", "Campo Grande", 2, -8.035, -34.880, 2, 600),
+    ("CAM", "Casa Amarela", 3, -8.025, -34.915, 3, 700),
+    ("CFO", "Casa Forte", 3, -8.035, -34.920, 3, 500),
+    ("API", "Apipucos", 3, -8.020, -34.935, 2, 600),
+    ("DIR", "Dois Irmãos", 3, -8.012, -34.945, 2, 900),
+    ("VCG", "Vasco da Gama", 3, -8.015, -34.908, 2, 600),
+    ("PAR", "Parnamirim", 3, -8.037, -34.911, 2, 400),
+    ("PPA", "Poço da Panela", 3, -8.040, -34.923, 1, 400),
+    ("GRA", "Graças", 3, -8.047, -34.900, 3, 500),
+    ("CRD", "Cordeiro", 4, -8.050, -34.925, 3, 700),
+    ("IPU", "Iputinga", 4, -8.045, -34.940, 3, 800),
+    ("MAD", "Madalena", 4, -8.055, -34.910, 3, 600),
+    ("TOR", "Torre", 4, -8.045, -34.915, 2, 500),
+    ("VAR", "Várzea", 4, -8.045, -34.960, 4, 1200),
+    ("EME", "Engenho do Meio", 4, -8.055, -34.945, 2, 500),
+    ("CAX", "Caxangá", 4, -8.035, -34.955, 2, 700),
+    ("AFO", "Afogados", 5, -8.075, -34.910, 3, 700),
+    ("SMA", "San Martin", 5, -8.075, -34.930, 2, 600),
+    ("JSP", "Jardim São Paulo", 5, -8.090, -34.940, 3, 700),
+    ("ARE", "Areias", 5, -8.100, -34.930, 2, 600),
+    ("EST", "Estância", 5, -8.085, -34.920, 2, 500),
+    ("MUS", "Mustardinha", 5, -8.075, -34.920, 1, 400),
+    ("TEJ", "Tejipió", 5, -8.090, -34.955, 2, 700),
+    ("BVG", "Boa Viagem", 6, -8.120, -34.900, 8, 1800),
+    ("PIN", "Pina", 6, -8.090, -34.885, 2, 700),
+    ("IMB", "Imbiribeira", 6, -8.110, -34.910, 3, 900),
+    ("IBU", "Ibura", 6, -8.125, -34.940, 3, 1000),
+    ("IPS", "Ipsep", 6, -8.105, -34.925, 2, 600),
+    ("JOR", "Jordão", 6, -8.135, -34.930, 2, 800),
+    ("BTE", "Brasília Teimosa", 6, -8.085, -34.875, 1, 300),
+]
+# Trechos de rua por bairro (cada árvore cai perto de um deles) e espalhamento em volta do trecho
+TRECHOS_POR_BAIRRO = 60
+DESVIO_TRECHO_M = 40
+
+# Desvio (em log) de cada medida e quanto dela vem do fator de porte comum
+DESVIO_LOG = {'altura': 0.35, 'copa': 0.45, 'cap': 0.50}
+CARGA_PORTE = {'altura': 0.85, 'copa': 0.80, 'cap': 0.80}
+LIMITES = {'altura': (1.0, 40.0), 'copa': (0.2, 25.0), 'cap': (0.05, 6.0)}
+
+# Grupo de fitossanidade -> (probabilidade, [(fitossanid, fitossanid_corrigida), ...])
+MIX_FITOSSANIDADE = {
+    'Não avaliada': (0.55, [(None, None)]),
+    'Saudável': (0.33, [('saudavel', 'Saudavel')]),
+    'Injuriada': (0.08, [('folhasamareladas', 'Folhas amareladas'), ('desfolhia', 'Desfolhia'), ('pragas', 'Pragas')]),
+    'Doente': (0.03, [('fungos', 'Fungos'), ('cupim', 'Cupim')]),
+    'Morta': (0.01, [('morta', 'Morta')]),
+}
+# Quanto o porte aumenta a chance dos grupos críticos (log da razão de chances por desvio-padrão)
+EFEITO_PORTE_FITOSSANIDADE = 0.4
+
+# (injuria, injuria_corrigida, injuria_grupo, probabilidade)
+INJURIAS = [
+    ('podainadequada', 'Poda inadequada', 'Antrópica', 0.04),
+    ('ferida', 'Ferida', 'Mecânica', 0.02),
+]
+FRACAO_PLANTIOS = 0.12
+ANOS_PLANTIO = (2015, 2025)
+ANOS_MONITORAMENTO = (2021, 2025)
+OBSERVACOES = [('público', 0.08), ('calçada', 0.05), ('canteiro', 0.03)]
+TIPOLOGIAS = [('PP', 0.02), ('CL', 0.01), ('QU', 0.005), ('CC', 0.005)]
+
+
+def _sortear(rng, opcoes, n):
+    """Valor de cada linha a partir de [(valor, probabilidade), ...]; o que sobra vira None"""
+    valores = [v for v, _ in opcoes] + [None]
+    probs = [p for _, p in opcoes]
+    probs.append(1 - sum(probs))
+    return np.array(valores, dtype=object)[rng.choice(len(valores), n, p=probs)]
+
+
+def _globalids(rng, n):
+    """GUIDs no formato do CSV original ({XXXXXXXX-XXXX-...})"""
+    brutos = rng.bytes(16 * n)
+    return [f"{{{str(uuid.UUID(bytes=brutos[i:i + 16])).upper()}}}" for i in range(0, 16 * n, 16)]
+
+
+def _datas(rng, anos, n):
+    inicio = np.datetime64(f"{anos[0]}-01-01")
+    dias = (np.datetime64(f"{anos[1]}-12-31") - inicio).astype(int)
+    return (inicio + rng.integers(0, dias + 1, n)).astype(str)
+
+
+class GeradorCenso:
+    """Gera blocos de linhas do censo; o sorteio dos trechos de rua é feito uma vez, na criação"""
+
+    def __init__(self, semente=42):
+        self.rng = np.random.default_rng(semente)
+        self._para_utm = Transformer.from_crs('EPSG:4326', CRS_CENSO, always_xy=True)
+        self._para_wgs84 = Transformer.from_crs(CRS_CENSO, 'EPSG:4326', always_xy=True)
+
+        pesos = np.array([e[3] for e in ESPECIES], dtype=float)
+        self.prob_especies = pesos / pesos.sum()
+        self.medianas = {medida: np.log([e[4 + i] for e in ESPECIES]) for i, medida in enumerate(['altura', 'copa', 'cap'])}
+
+        pesos = np.array([b[5] for b in BAIRROS], dtype=float)
+        self.prob_bairros = pesos / pesos.sum()
+        cx, cy = self._para_utm.transform([b[4] for b in BAIRROS], [b[3] for b in BAIRROS])
+        raios = np.array([b[6] for b in BAIRROS], dtype=float)
+        # Trechos de rua: (bairro, trecho) -> centro em UTM
+        forma = (len(BAIRROS), TRECHOS_POR_BAIRRO)
+        self.trechos_x = np.asarray(cx)[:, None] + self.rng.normal(0, 1, forma) * raios[:, None]
+        self.trechos_y = np.asarray(cy)[:, None] + self.rng.normal(0, 1, forma) * raios[:, None]
+
+        self.grupos = list(MIX_FITOSSANIDADE)
+        self.prob_grupos = np.array([MIX_FITOSSANIDADE[g][0] for g in self.grupos])
+        self.proximo_id = 1
+
+    def _coordenadas(self, n):
+        bairro = self.rng.choice(len(BAIRROS), n, p=self.prob_bairros)
+        trecho = self.rng.integers(0, TRECHOS_POR_BAIRRO, n)
+        x = self.trechos_x[bairro, trecho] + self.rng.normal(0, DESVIO_TRECHO_M, n)
+        y = self.trechos_y[bairro, trecho] + self.rng.normal(0, DESVIO_TRECHO_M, n)
+        return bairro, x, y
+
+    def _medidas(self, especie, porte):
+        medidas = {}
+        for medida, desvio in DESVIO_LOG.items():
+            carga = CARGA_PORTE[medida]
+            ruido = carga * porte + np.sqrt(1 - carga ** 2) * self.rng.normal(0, 1, len(porte))
+            valores = np.exp(self.medianas[medida][especie] + desvio * ruido)
+            medidas[medida] = np.clip(valores, *LIMITES[medida])
+        return medidas
+
+    def _fitossanidade(self, porte):
+        """Grupo de cada árvore: os grupos críticos ficam mais prováveis com o porte"""
+        pesos = np.tile(self.prob_grupos, (len(porte), 1))
+        criticos = [i for i, g in enumerate(self.grupos) if g not in ('Não avaliada', 'Saudável')]
+        pesos[:, criticos] *= np.exp(EFEITO_PORTE_FITOSSANIDADE * porte)[:, None]
+        acumulado = np.cumsum(pesos, axis=1)
+        sorteio = self.rng.random(len(porte)) * acumulado[:, -1]
+        return (acumulado < sorteio[:, None]).sum(axis=1)
+
+    def bloco(self, n):
+        """DataFrame com as próximas ``n`` árvores (colunas de COLUNAS_CSV)"""
+        rng = self.rng
+        ids = np.arange(self.proximo_id, self.proximo_id + n)
+        self.proximo_id += n
+
+        especie = rng.choice(len(ESPECIES), n, p=self.prob_especies)
+        plantio = rng.random(n) < FRACAO_PLANTIOS
+        # Fator de porte comum às medidas; mudas recentes são menores
+        porte = rng.normal(0, 1, n) - 1.5 * plantio
+        medidas = self._medidas(especie, porte)
+
+        bairro, x, y = self._coordenadas(n)
+        lon, lat = self._para_wgs84.transform(x, y)
+
+        nomes = np.array([e[0] for e in ESPECIES], dtype=object)[especie]
+        cientificos = np.array([e[1] for e in ESPECIES], dtype=object)[especie]
+        sem_especie = rng.random(n) < FRACAO_SEM_ESPECIE
+        nomes[sem_especie] = None
+        cientificos[sem_especie | (rng.random(n) < FRACAO_SEM_NOME_CIENTIFICO)] = None
+
+        grupo = self._fitossanidade(porte)
+        fitossanid = np.empty(n, dtype=object)
+        fitossanid_corrigida = np.empty(n, dtype=object)
+        for i, nome_grupo in enumerate(self.grupos):
+            linhas = np.flatnonzero(grupo == i)
+            detalhes = MIX_FITOSSANIDADE[nome_grupo][1]
+            escolha = rng.integers(0, len(detalhes), len(linhas))
+            fitossanid[linhas] = np.array([d[0] for d in detalhes], dtype=object)[escolha]
+            fitossanid_corrigida[linhas] = np.array([d[1] for d in detalhes], dtype=object)[escolha]
+        avaliada = grupo != self.grupos.index('Não avaliada')
+
+        injuria = rng.choice(len(INJURIAS) + 1, n, p=[i[3] for i in INJURIAS] + [1 - sum(i[3] for i in INJURIAS)])
+        tabela_injurias = INJURIAS + [(None, None, 'Não informada', 0)]
+
+        altura = medidas['altura'].round(1)
+        cap = medidas['cap'].round(2)
+        return pd.DataFrame({
+            'objectid': ids,
+            'porte_especie': np.array([e[2] for e in ESPECIES], dtype=object)[especie],
+            'bairro': np.array([b[0] for b in BAIRROS], dtype=object)[bairro],
+            'rpa': np.array([b[2] for b in BAIRROS], dtype=float)[bairro],
+            'x': x.round(4),
+            'y': y.round(4),
+            'nome_popular': nomes,
+            'categoria': None,
+            'observacao': _sortear(rng, OBSERVACOES, n),
+            'tipologia': _sortear(rng, TIPOLOGIAS, n),
+            'nome_cientifico': cientificos,
+            'copa': medidas['copa'].round(1),
+            'altura': altura,
+            'cap': cap,
+            'dap': (cap / np.pi).round(8),
+            'data_plantio': np.where(plantio, _datas(rng, ANOS_PLANTIO, n), None),
+            'data_monitoramento': np.where(avaliada, _datas(rng, ANOS_MONITORAMENTO, n), None),
+            'injuria': np.array([i[0] for i in tabela_injurias], dtype=object)[injuria],
+            'fitossanid': fitossanid,
+            'x_wgs84': np.round(lon, 8),
+            'y_wgs84': np.round(lat, 8),
+            'nome_comum': especie + 1,
+            'globalid': _globalids(rng, n),
+            'projeto': None,
+            'responsavel': None,
+            'id': ids,
+            'longitude': x,
+            'latitude': y,
+            'nome_popular_padrao': nomes,
+            'fitossanid_grupo': np.array(self.grupos, dtype=object)[grupo],
+            'injuria_grupo': np.array([i[2] for i in tabela_injurias], dtype=object)[injuria],
+            'injuria_corrigida': np.array([i[1] for i in tabela_injurias], dtype=object)[injuria],
+            'fitossanid_corrigida': fitossanid_corrigida,
+            'bairro_nome': np.array([b[1] for b in BAIRROS], dtype=object)[bairro],
+            'altura_original': altura,
+            'dif_long': x - lon,
+            'dif_lat': y - lat,
+        }, columns=COLUNAS_CSV)
+
+
+def gerar_blocos(n_linhas, semente=42, tamanho_bloco=TAMANHO_BLOCO):
+    """Gera DataFrames de até ``tamanho_bloco`` linhas que somam ``n_linhas`` árvores"""
+    gerador = GeradorCenso(semente)
+    for inicio in range(0, n_linhas, tamanho_bloco):
+        yield gerador.bloco(min(tamanho_bloco, n_linhas - inicio))
+
+
+def gravar_csv(destino, n_linhas, semente=42, tamanho_bloco=TAMANHO_BLOCO):
+    """Grava o censo sintético em ``destino`` bloco a bloco (arquivo temporário + rename)"""
+    destino = Path(destino)
+    tmp = destino.with_name(destino.name + f".tmp{os.getpid()}")
+    with open(tmp, 'w', encoding='utf-8', newline='') as f:
+        for i, bloco in enumerate(gerar_blocos(n_linhas, semente, tamanho_bloco)):
+            bloco.to_csv(f, index=False, header=(i == 0))
+    os.replace(tmp, destino)
+    return destino
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um censo arbóreo sintético")
+    parser.add_argument('linhas', type=int)
+    parser.add_argument('destino')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO)
+    args = parser.parse_args()
+
+    if args.linhas <= 0:
+        print("❌ Número de linhas deve ser positivo")
+        sys.exit(1)
+
+    inicio = time.perf_counter()
+    gravar_csv(args.destino, args.linhas, args.semente, args.tamanho_bloco)
+    print(f"✅ {args.linhas:,} árvores gravadas em {args.destino} ({time.perf_counter() - inicio:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Grades de densidade (contagem de árvores por célula) para os mapas de calor.
+
+As árvores são agrupadas em células quadradas sobre as coordenadas UTM
+(colunas x/y, em metros) em algumas resoluções fixas. Cada célula guarda a
+contagem, a RPA e o centróide (lat/lon médio das árvores da célula), então o
+mapa de calor representa o censo inteiro enviando só algumas centenas de
+pontos ponderados em vez de uma amostra de coordenadas brutas.
+"""
+import numpy as np
+
+from dados_censo import LAT_MAX, LAT_MIN, LON_MAX, LON_MIN
+
+# Tamanho do lado da célula, em metros
+RESOLUCOES_M = [100, 250, 500, 1000]
+RESOLUCAO_MAPA = 250
+RESOLUCAO_MINI_MAPA = 500
+
+
+def _agrupar(ix, iy, rpa, lat, lon):
+    """Soma contagem e coordenadas por (rpa, célula) com bincount"""
+    nx, ny = int(ix.max()) + 1, int(iy.max()) + 1
+    chave = (rpa.astype(np.int64) * ny + iy) * nx + ix
+    chaves, inverso = np.unique(chave, return_inverse=True)
+
+    contagem = np.bincount(inverso)
+    soma_lat = np.bincount(inverso, weights=lat)
+    soma_lon = np.bincount(inverso, weights=lon)
+    return {
+        'lat': soma_lat / contagem,
+        'lon': soma_lon / contagem,
+        'contagem': contagem.astype(np.int64),
+        'rpa': (chaves // (nx * ny)).astype(np.int8),
+    }
+
+
+def construir_grades(df, resolucoes=RESOLUCOES_M):
+    """
+    Pré-calcula as grades de densidade de ``df`` (precisa de x, y, latitude e
+    longitude). Retorna {resolucao: {'lat', 'lon', 'contagem', 'rpa'}}, com um
+    item por célula não vazia; rpa == 0 indica árvores sem RPA cadastrada.
+    """
+    x = df['x'].to_numpy(dtype=np.float64)
+    y = df['y'].to_numpy(dtype=np.float64)
+    lat = df['latitude'].to_numpy(dtype=np.float64)
+    lon = df['longitude'].to_numpy(dtype=np.float64)
+    rpa = df['rpa'].to_numpy(dtype=np.float64) if 'rpa' in df.columns else np.zeros(len(df))
+
+    validos = (
+        np.isfinite(x) & np.isfinite(y) &
+        (lat >= LAT_MIN) & (lat <= LAT_MAX) & (lon >= LON_MIN) & (lon <= LON_MAX)
+    )
+    x, y, lat, lon = x[validos], y[validos], lat[validos], lon[validos]
+    rpa = np.nan_to_num(rpa[validos], nan=0).astype(np.int64)
+
+    grades = {}
+    if len(x) == 0:
+        return grades
+
+    x0, y0 = x.min(), y.min()
+    for resolucao in resolucoes:
+        ix = ((x - x0) // resolucao).astype(np.int64)
+        iy = ((y - y0) // resolucao).astype(np.int64)
+        grades[resolucao] = _agrupar(ix, iy, rpa, lat, lon)
+    return grades
+
+
+def celulas_heatmap(grades, rpas=None, resolucao=RESOLUCAO_MAPA, casas=5):
+    """
+    Lista [[lat, lon, peso], ...] para o HeatMap. ``rpas`` é uma lista de
+    inteiros (None = todas as árvores). O peso é a contagem normalizada pela
+    maior célula da seleção (0 a 1). Retorna (celulas, total_de_arvores).
+    """
+    grade = grades.get(resolucao)
+    if grade is None:
+        return [], 0
+
+    selecao = np.ones(len(grade['contagem']), dtype=bool) if rpas is None else np.isin(grade['rpa'], rpas)
+    contagem = grade['contagem'][selecao]
+    if len(contagem) == 0:
+        return [], 0
+
+    peso = contagem / contagem.max()
+    celulas = np.column_stack([
+        np.round(grade['lat'][selecao], casas),
+        np.round(grade['lon'][selecao], casas),
+        np.round(peso, 3)
+    ])
+    return celulas.tolist(), int(contagem.sum())
+
+
+def celulas_heatmap_posicoes(df, posicoes, resolucao=RESOLUCAO_MAPA):
+    """Células do mapa de calor só das linhas em ``posicoes`` (ex.: filtro por bairro)"""
+    subconjunto = df.iloc[posicoes][['x', 'y', 'latitude', 'longitude']]
+    grades = construir_grades(subconjunto, [resolucao])
+    return celulas_heatmap(grades, None, resolucao)
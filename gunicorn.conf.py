@@ -0,0 +1,35 @@
+# ============================================
+# CONFIGURAÇÃO DO GUNICORN
+# ============================================
+# O processo master importa o app (e carrega o censo) uma única vez; os
+# workers são criados via fork e compartilham as páginas de memória do
+# dataset em vez de cada um montar a sua própria cópia.
+#
+# Para medir o RSS/PSS por worker com e sem preload:
+#   python medir_memoria_workers.py
+import gc
+import os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+bind = f"0.0.0.0:{os.environ.get('PORT', 8050)}"
+
+
+def on_starting(server):
+    # Métricas de /metrics gravadas por workers de uma execução anterior
+    from instrumentacao import limpar_metricas
+    limpar_metricas()
+
+
+def pre_fork(server, worker):
+    # Move os objetos já criados para uma geração "congelada": o coletor de
+    # lixo dos workers deixa de escrever neles, evitando cópias das páginas
+    # herdadas (copy-on-write)
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Métricas do dashboard e observador do CSV rodam em threads de cada
+    # worker, fora do caminho das requisições
+    import app
+    app.iniciar_tarefas_em_segundo_plano()
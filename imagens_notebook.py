@@ -0,0 +1,375 @@
+"""
+Imagens (gráficos PNG) extraídas dos outputs do notebook de análise.
+
+A extração (parse incremental do .ipynb, remoção de duplicatas e
+filtros/ordenação dos gráficos) roda uma vez por versão do notebook: o resultado vai para
+.cache_censo/notebook_<chave>/, com cada imagem gravada como um arquivo .png
+nomeado pelo hash do conteúdo e um imagens.json com os metadados. O app serve
+esses arquivos por URL em vez de embutir base64 no layout.
+"""
+import base64
+import hashlib
+import json
+import re
+from pathlib import Path
+
+from dados_censo import CACHE_DIR, carregar_cache_versionado
+
+try:
+    import ijson
+except ImportError:  # Sem ijson o notebook é lido inteiro com json.load
+    ijson = None
+
+NOTEBOOK_PADRAO = Path("notebook/Verdefica_Unificado_12nov2025.ipynb")
+
+# Incrementar quando as regras de filtragem/ordenação mudarem
+VERSAO_CACHE_NOTEBOOK = 1
+
+# Campos que vão para o imagens.json (a imagem em si vira arquivo)
+CAMPOS_METADADOS = ['id', 'num_axes', 'hash', 'cell_idx', 'output_idx', 'posicao_relativa']
+
+# ============================================
+# FUNÇÃO PARA EXTRAIR IMAGENS DO NOTEBOOK (SIMPLIFICADA)
+# ============================================
+
+def _eventos_notebook(notebook_path):
+    """
+    Percorre o notebook gerando eventos, sem montar o JSON inteiro na memória:
+        ('output', cell_idx, output_idx, output_type, imagem_png, titulo)
+        ('celula', cell_idx, cell_type, codigo)
+    O evento 'celula' vem depois dos outputs da célula, porque no formato
+    .ipynb a chave 'source' fica depois de 'outputs'. Com ijson a leitura é
+    incremental e só uma imagem por vez fica na memória; sem ijson o notebook
+    é lido inteiro com json.load.
+    """
+    if ijson is None:
+        with open(notebook_path, 'r', encoding='utf-8') as f:
+            nb = json.load(f)
+        for cell_idx, cell in enumerate(nb.get('cells', [])):
+            for output_idx, output in enumerate(cell.get('outputs', [])):
+                data = output.get('data', {})
+                text_plain = data.get('text/plain')
+                titulo = text_plain[0] if isinstance(text_plain, list) and len(text_plain) > 0 else None
+                yield ('output', cell_idx, output_idx, output.get('output_type'), data.get('image/png'), titulo)
+            source_code = cell.get('source', [])
+            codigo = ''.join(source_code) if isinstance(source_code, list) else str(source_code)
+            yield ('celula', cell_idx, cell.get('cell_type'), codigo)
+        return
+
+    cell_idx = output_idx = -1
+    cell_type = None
+    partes_codigo = []
+    output = {}
+    with open(notebook_path, 'rb') as f:
+        for prefixo, evento, valor in ijson.parse(f):
+            if prefixo == 'cells.item':
+                if evento == 'start_map':
+                    cell_idx += 1
+                    output_idx = -1
+                    cell_type = None
+                    partes_codigo = []
+                elif evento == 'end_map':
+                    yield ('celula', cell_idx, cell_type, ''.join(partes_codigo))
+            elif prefixo == 'cells.item.cell_type':
+                cell_type = valor
+            elif prefixo in ('cells.item.source', 'cells.item.source.item') and evento == 'string':
+                partes_codigo.append(valor)
+            elif prefixo == 'cells.item.outputs.item':
+                if evento == 'start_map':
+                    output_idx += 1
+                    output = {'imagem': None, 'titulo': None, 'tipo': None}
+                elif evento == 'end_map':
+                    yield ('output', cell_idx, output_idx, output['tipo'], output['imagem'], output['titulo'])
+                    output = {}
+            elif prefixo == 'cells.item.outputs.item.output_type':
+                output['tipo'] = valor
+            elif prefixo == 'cells.item.outputs.item.data.image/png' and evento == 'string':
+                output['imagem'] = valor
+            elif prefixo == 'cells.item.outputs.item.data.text/plain.item' and output.get('titulo') is None:
+                output['titulo'] = valor
+
+
+def _hash_imagem(img_data):
+    return hashlib.md5(img_data.encode('utf-8') if isinstance(img_data, str) else img_data).hexdigest()
+
+
+def _listar_graficos(notebook_path):
+    """
+    1ª passada: metadados de todas as imagens únicas das células de código
+    (ID sequencial, hash, nº de eixos, código da célula), sem guardar as imagens.
+    """
+    imagens = []
+    imagens_vistas = set()  # Para detectar duplicatas
+    pendentes = []  # Outputs da célula atual, aguardando o código/tipo da célula
+
+    for evento in _eventos_notebook(notebook_path):
+        if evento[0] == 'output':
+            _, cell_idx, output_idx, output_type, img_data, titulo = evento
+            if output_type == 'display_data' and img_data is not None:
+                # Detecta número de eixos
+                num_axes = 1
+                if titulo:
+                    match = re.search(r'with (\d+) Axes?', titulo)
+                    if match:
+                        num_axes = int(match.group(1))
+                pendentes.append((output_idx, _hash_imagem(img_data), num_axes))
+            continue
+
+        _, cell_idx, cell_type, codigo = evento
+        if cell_type == 'code':
+            codigo_completo = codigo.lower()
+            for output_idx, img_hash, num_axes in pendentes:
+                # Verifica se a imagem já foi adicionada (remove duplicatas)
+                if img_hash in imagens_vistas:
+                    continue
+                imagens_vistas.add(img_hash)
+                
+                # Gera ID único para o gráfico (baseado no índice sequencial)
+                imagens.append({
+                    'id': f"GRAFICO_{len(imagens) + 1:03d}",
+                    'codigo': codigo_completo,
+                    'num_axes': num_axes,
+                    'hash': img_hash,
+                    'cell_idx': cell_idx,
+                    'output_idx': output_idx
+                })
+        pendentes = []
+    return imagens
+
+
+def _filtrar_e_ordenar(imagens):
+    """Aplica as regras de remoção e a ordem customizada dos gráficos"""
+    # Identifica posições relativas para scatter plots específicos
+    scatter_altura_dap = []
+    scatter_altura_copa = []
+
+    for i, img in enumerate(imagens):
+        codigo = img['codigo']
+        num_axes = img['num_axes']
+
+        # Identifica scatter plots altura × DAP
+        if (num_axes == 1 and 
+            ('scatter' in codigo or 'scatterplot' in codigo) and
+            'altura' in codigo and 'dap' in codigo):
+            scatter_altura_dap.append(i)
+
+        # Identifica scatter plots altura × Copa (sem DAP)
+        if (num_axes == 1 and 
+            ('scatter' in codigo or 'scatterplot' in codigo) and
+            'altura' in codigo and 'copa' in codigo and
+            'dap' not in codigo):
+            scatter_altura_copa.append(i)
+
+    # Marca posições relativas
+    if len(scatter_altura_dap) > 0:
+        ultimo_idx = scatter_altura_dap[-1]
+        imagens[ultimo_idx]['posicao_relativa'] = 'ultimo'
+
+    if len(scatter_altura_copa) >= 2:
+        penultimo_idx = scatter_altura_copa[-2]
+        imagens[penultimo_idx]['posicao_relativa'] = 'penultimo'
+        # Remove outros scatter plots altura × copa exceto o penúltimo
+        for i in reversed(scatter_altura_copa):
+            if i != penultimo_idx:
+                imagens.pop(i)
+    elif len(scatter_altura_copa) == 1:
+        imagens[scatter_altura_copa[0]]['posicao_relativa'] = 'penultimo'
+
+    # Filtros para remover gráficos específicos
+    imagens_filtradas = []
+    contador_rpa = 0
+    contador_correlacao = 0
+
+    for img in imagens:
+        deve_remover = False
+        codigo = img['codigo']
+        num_axes = img['num_axes']
+
+        # Remove gráfico com 3 eixos sobre distribuição do tamanho das copas
+        if num_axes == 3 and 'distribuição do tamanho das copas' in codigo:
+            deve_remover = True
+
+        # Remove gráfico com 1 eixo sobre "relação entre duas variáveis"
+        if num_axes == 1 and 'relação entre duas variáveis das árvores' in codigo:
+            deve_remover = True
+
+        # Remove dois gráficos sobre quantidade de árvores por RPA
+        if 'quantidade de árvores por rpa no recife' in codigo:
+            contador_rpa += 1
+            if contador_rpa <= 2:
+                deve_remover = True
+
+        # Remove gráfico sobre proporção de árvores por RPA
+        if 'proporção de árvores por rpa no recife' in codigo:
+            deve_remover = True
+
+        # Remove uma das duplicatas do gráfico de correlação
+        if (num_axes == 2 and 'correlação' in codigo and 'altura' in codigo and 
+            'copa' in codigo and 'dap' in codigo):
+            contador_correlacao += 1
+            if contador_correlacao <= 1:
+                deve_remover = True
+
+        if not deve_remover:
+            imagens_filtradas.append(img)
+
+    # Remove gráficos específicos por ID (mantém IDs estáticos - não renumerar)
+    ids_para_remover = ['GRAFICO_004', 'GRAFICO_009', 'GRAFICO_010', 'GRAFICO_011', 
+                       'GRAFICO_013', 'GRAFICO_016', 'GRAFICO_017', 'GRAFICO_018']
+    imagens_filtradas = [img for img in imagens_filtradas if img['id'] not in ids_para_remover]
+
+    # Ordena os gráficos com ordem customizada para melhor layout visual
+    # GRAFICO_012 será posicionado logo após GRAFICO_005
+    ordem_customizada = {}
+    ordem_base = sorted([img['id'] for img in imagens_filtradas])
+
+    # Cria ordem customizada: remove GRAFICO_012 da posição original e insere após GRAFICO_005
+    ordem_final = []
+    for id_grafico in ordem_base:
+        if id_grafico == 'GRAFICO_012':
+            continue  # Será inserido depois
+        ordem_final.append(id_grafico)
+        if id_grafico == 'GRAFICO_005':
+            ordem_final.append('GRAFICO_012')  # Insere logo após GRAFICO_005
+
+    # Se GRAFICO_012 não estava na lista ou GRAFICO_005 não existe, mantém ordem original
+    if 'GRAFICO_012' in ordem_base and 'GRAFICO_005' in ordem_base:
+        ordem_map = {id_grafico: idx for idx, id_grafico in enumerate(ordem_final)}
+        imagens_filtradas.sort(key=lambda x: ordem_map.get(x['id'], 999))
+    else:
+        imagens_filtradas.sort(key=lambda x: x['id'])
+
+    # IDs são estáticos - NÃO renumerar após filtragem
+    # Os IDs originais (atribuídos na primeira passada) são mantidos
+    # para preservar a associação correta com os textos de análise
+    return imagens_filtradas
+
+
+def iterar_imagens_notebook(notebook_path=NOTEBOOK_PADRAO):
+    """
+    Gera (metadados, imagem_base64) de cada gráfico que passa pelos filtros,
+    na ordem final. Faz duas passadas no arquivo: a primeira decide quais
+    gráficos ficam (só com metadados) e a segunda lê apenas essas imagens,
+    então imagens descartadas nunca são guardadas.
+    """
+    notebook_path = Path(notebook_path)
+    if not notebook_path.exists():
+        return
+
+    graficos = _filtrar_e_ordenar(_listar_graficos(notebook_path))
+    por_posicao = {(img['cell_idx'], img['output_idx']): img for img in graficos}
+    ordem = {img['id']: i for i, img in enumerate(graficos)}
+
+    # As imagens chegam na ordem do arquivo; só as fora de ordem esperam aqui
+    aguardando = {}
+    proxima = 0
+    for evento in _eventos_notebook(notebook_path):
+        if evento[0] != 'output':
+            continue
+        _, cell_idx, output_idx, _, img_data, _ = evento
+        meta = por_posicao.pop((cell_idx, output_idx), None)
+        if meta is None:
+            continue
+        aguardando[ordem[meta['id']]] = (meta, img_data)
+        while proxima in aguardando:
+            yield aguardando.pop(proxima)
+            proxima += 1
+
+
+def extrair_imagens_notebook(notebook_path=NOTEBOOK_PADRAO):
+    """Extrai as imagens PNG (base64) dos outputs do notebook já filtradas e ordenadas"""
+    try:
+        return [dict(meta, imagem=img_data) for meta, img_data in iterar_imagens_notebook(notebook_path)]
+    except Exception as e:
+        print(f"⚠️ Erro ao ler notebook: {e}")
+        return []
+
+
+# ============================================
+# CACHE EM DISCO DA EXTRAÇÃO
+# ============================================
+
+def chave_notebook(notebook_path=NOTEBOOK_PADRAO):
+    """Identificador do cache: tamanho + mtime do notebook + versão das regras"""
+    st = Path(notebook_path).stat()
+    base = f"{st.st_size}|{st.st_mtime_ns}|v{VERSAO_CACHE_NOTEBOOK}"
+    return hashlib.md5(base.encode('utf-8')).hexdigest()[:16]
+
+
+def diretorio_imagens(notebook_path=NOTEBOOK_PADRAO, cache_dir=CACHE_DIR):
+    return Path(cache_dir) / f"notebook_{chave_notebook(notebook_path)}"
+
+
+def _gravar_imagens(graficos, pasta):
+    """Grava cada (metadados, imagem_base64) de ``graficos`` em ``pasta`` assim que ele chega"""
+    metadados = []
+    for meta, dados in graficos:
+        (pasta / f"{meta['hash']}.png").write_bytes(base64.b64decode(dados))
+        metadados.append({campo: meta[campo] for campo in CAMPOS_METADADOS if campo in meta})
+
+    with open(pasta / "imagens.json", 'w', encoding='utf-8') as f:
+        json.dump(metadados, f, ensure_ascii=False)
+    return len(metadados)
+
+
+def _ler_imagens(destino):
+    """Metadados gravados por _gravar_imagens, com o nome do arquivo de cada gráfico"""
+    with open(destino / "imagens.json", 'r', encoding='utf-8') as f:
+        imagens = json.load(f)
+    for img in imagens:
+        img['arquivo'] = f"{img['hash']}.png"
+    return imagens
+
+
+_memoria = {}
+# Gráficos com os bytes do PNG, quando o cache em disco não pôde ser gravado
+_sem_disco = {}
+
+
+def _imagens_em_memoria(notebook_path, destino):
+    """Metadados + 'png' (bytes) de cada gráfico, extraídos uma vez por versão do notebook"""
+    if destino not in _sem_disco:
+        imagens = []
+        for meta, dados in iterar_imagens_notebook(notebook_path):
+            img = {campo: meta[campo] for campo in CAMPOS_METADADOS if campo in meta}
+            img['arquivo'] = f"{meta['hash']}.png"
+            img['png'] = base64.b64decode(dados)
+            imagens.append(img)
+        _sem_disco.clear()
+        _sem_disco[destino] = imagens
+    return _sem_disco[destino]
+
+
+def carregar_imagens_notebook(notebook_path=NOTEBOOK_PADRAO, cache_dir=CACHE_DIR):
+    """
+    Retorna (diretorio, imagens): a lista de metadados dos gráficos (sem o
+    base64; cada item tem 'arquivo' = <hash>.png dentro de ``diretorio``).
+    Usa, nesta ordem: memória do processo, cache em disco e, por último, a
+    extração completa do notebook. Se o cache não puder ser gravado (ex.:
+    disco somente leitura ou cheio), diretorio é None e cada item traz os
+    bytes do PNG em 'png'.
+    """
+    notebook_path = Path(notebook_path)
+    if not notebook_path.exists():
+        return None, []
+
+    destino = diretorio_imagens(notebook_path, cache_dir)
+    if destino in _sem_disco:
+        return None, _sem_disco[destino]
+
+    try:
+        # As imagens vão do parser direto para o disco, uma de cada vez
+        imagens = carregar_cache_versionado(
+            destino, _memoria, lambda pasta: _gravar_imagens(iterar_imagens_notebook(notebook_path), pasta), _ler_imagens
+        )
+    except OSError as e:
+        print(f"⚠️ Cache das imagens do notebook não pôde ser gravado ({e}); servindo da memória")
+        try:
+            return None, _imagens_em_memoria(notebook_path, destino)
+        except Exception as e:
+            print(f"⚠️ Erro ao ler notebook: {e}")
+            return None, []
+    except Exception as e:
+        print(f"⚠️ Erro ao ler notebook: {e}")
+        return None, []
+    return destino, imagens
@@ -0,0 +1,276 @@
+"""
+Latência, tamanho das respostas e acertos de cache, no formato de texto do
+Prometheus (servido em /metrics pelo app).
+
+Cada requisição é registrada com um tipo ('rota' para as rotas Flask,
+'callback' para os callbacks do Dash, identificados pelo nome da função) e
+entra em dois histogramas (segundos e bytes) e num contador por status. Os
+caches do app chamam registrar_cache a cada consulta.
+
+Com vários workers do gunicorn cada processo grava os seus valores em
+DIRETORIO_METRICAS/metricas_<pid>_<início>.json (numa thread, a cada
+INTERVALO_GRAVACAO segundos) e o scrape soma os arquivos de todos eles,
+então qualquer worker que atenda /metrics devolve as mesmas séries. O
+arquivo de um processo que já terminou (ou cujo pid foi reaproveitado por
+outro processo) é apagado no scrape seguinte; limpar_metricas apaga todos
+no boot do master. Scripts que importam o app fora do servidor (ex.:
+medir_desempenho) apontam METRICAS_DIR para outro diretório, para não somar
+nas séries de produção.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from dados_censo import CACHE_DIR
+
+PREFIXO = 'verdefica'
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_BYTES = (1_000, 10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000)
+
+DIRETORIO_METRICAS = Path(os.environ.get('METRICAS_DIR', CACHE_DIR / "metricas"))
+# Intervalo (s) entre duas gravações dos valores do processo
+INTERVALO_GRAVACAO = 2
+
+
+class Histograma:
+    """Contagens acumuladas por bucket, soma e total (como o histogram do Prometheus)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[i] += 1
+        self.soma += valor
+        self.total += 1
+
+    def somar(self, contagens, soma, total):
+        """Acrescenta os valores de outro histograma com os mesmos buckets"""
+        self.contagens = [a + b for a, b in zip(self.contagens, contagens)]
+        self.soma += soma
+        self.total += total
+
+    def linhas(self, nome, rotulos):
+        for limite, contagem in zip(self.buckets, self.contagens):
+            yield f"{nome}_bucket{_rotulos(rotulos, le=_numero(limite))} {contagem}"
+        yield f"{nome}_bucket{_rotulos(rotulos, le='+Inf')} {self.total}"
+        yield f"{nome}_sum{_rotulos(rotulos)} {_numero(self.soma)}"
+        yield f"{nome}_count{_rotulos(rotulos)} {self.total}"
+
+
+class _Valores:
+    """Histogramas e contadores de um processo (ou a soma de vários)"""
+
+    def __init__(self):
+        self.segundos = defaultdict(lambda: Histograma(BUCKETS_SEGUNDOS))
+        self.bytes = defaultdict(lambda: Histograma(BUCKETS_BYTES))
+        self.requisicoes = defaultdict(int)
+        self.cache = defaultdict(int)
+
+    def para_json(self):
+        return {
+            'segundos': [[chave, h.contagens, h.soma, h.total] for chave, h in self.segundos.items()],
+            'bytes': [[chave, h.contagens, h.soma, h.total] for chave, h in self.bytes.items()],
+            'requisicoes': [[chave, n] for chave, n in self.requisicoes.items()],
+            'cache': [[chave, n] for chave, n in self.cache.items()],
+        }
+
+    def somar_json(self, valores):
+        chave = lambda pares: tuple(tuple(par) for par in pares)
+        for nome in ('segundos', 'bytes'):
+            for pares, contagens, soma, total in valores.get(nome, []):
+                getattr(self, nome)[chave(pares)].somar(contagens, soma, total)
+        for nome in ('requisicoes', 'cache'):
+            for pares, n in valores.get(nome, []):
+                getattr(self, nome)[chave(pares)] += n
+
+
+_lock = threading.Lock()
+_valores = _Valores()
+# Processo dono da thread de gravação (um fork herda a variável, não a thread)
+# e arquivo dele; o instante de início no nome evita que um pid reaproveitado
+# sobrescreva o arquivo de um worker que já morreu
+_gravador = {'pid': None, 'arquivo': None}
+
+
+def _zerar_no_filho():
+    # O worker recém-criado não herda o que o master contou (o master grava o seu próprio arquivo)
+    global _lock, _valores
+    _lock = threading.Lock()
+    _valores = _Valores()
+    _gravador.update(pid=None, arquivo=None)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_zerar_no_filho)
+
+
+def _arquivo_do_processo():
+    if _gravador['arquivo'] is None:
+        _gravador['arquivo'] = DIRETORIO_METRICAS / f"metricas_{os.getpid()}_{time.time_ns()}.json"
+    return _gravador['arquivo']
+
+
+def gravar_metricas():
+    """Grava os valores deste processo (arquivo temporário + rename); False se não der"""
+    with _lock:
+        conteudo = json.dumps(_valores.para_json())
+    destino = _arquivo_do_processo()
+    # Temporário por thread: a thread de gravação e um scrape podem gravar ao mesmo tempo
+    tmp = destino.with_name(destino.name + f".tmp{threading.get_ident()}")
+    try:
+        DIRETORIO_METRICAS.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(conteudo, encoding='utf-8')
+        os.replace(tmp, destino)
+        return True
+    except OSError:
+        return False
+
+
+def _iniciar_gravador():
+    if _gravador['pid'] == os.getpid():
+        return
+    _gravador['pid'] = os.getpid()
+
+    def gravar_periodicamente():
+        while True:
+            time.sleep(INTERVALO_GRAVACAO)
+            gravar_metricas()
+
+    threading.Thread(target=gravar_periodicamente, name="metricas-prometheus", daemon=True).start()
+
+
+def limpar_metricas():
+    """Apaga os arquivos de todos os processos (boot do master, antes dos workers)"""
+    for arquivo in DIRETORIO_METRICAS.glob("metricas_*"):
+        try:
+            arquivo.unlink()
+        except OSError:
+            pass
+
+
+def _inicio_processo(pid):
+    """Instante (ns desde a época) em que o processo ``pid`` começou; None se não der para saber (fora do Linux)"""
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            campos = f.read().rsplit(')', 1)[1].split()
+        with open("/proc/stat", 'r') as f:
+            boot = next(int(linha.split()[1]) for linha in f if linha.startswith('btime'))
+        return int((boot + int(campos[19]) / os.sysconf('SC_CLK_TCK')) * 1e9)
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+
+def _processo_ativo(arquivo):
+    """
+    False se o processo que grava ``arquivo`` (metricas_<pid>_<início>.json)
+    já terminou ou se o pid agora é de um processo que começou depois do
+    arquivo (pid reaproveitado)
+    """
+    try:
+        _, pid, inicio = arquivo.stem.split('_')
+        pid, inicio = int(pid), int(inicio)
+    except ValueError:
+        return True
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # existe, mas é de outro usuário
+    partida = _inicio_processo(pid)
+    # btime tem resolução de 1 s
+    return partida is None or partida <= inicio + 1_000_000_000
+
+
+def _todos_os_processos():
+    """Soma dos valores de todos os processos; só os deste se o diretório não puder ser gravado"""
+    if not gravar_metricas():
+        with _lock:
+            soma = _Valores()
+            soma.somar_json(_valores.para_json())
+        return soma
+    soma = _Valores()
+    for arquivo in DIRETORIO_METRICAS.glob("metricas_*.json"):
+        if not _processo_ativo(arquivo):
+            try:
+                arquivo.unlink()
+            except OSError:
+                pass
+            continue
+        try:
+            soma.somar_json(json.loads(arquivo.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            continue
+    return soma
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(rotulos, **extras):
+    pares = list(rotulos) + list(extras.items())
+    return '{' + ','.join(f'{chave}="{_escapar(valor)}"' for chave, valor in pares) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def observar_requisicao(tipo, nome, status, segundos, n_bytes=None):
+    """Registra uma requisição; ``n_bytes`` None (resposta em streaming) fica fora do histograma de bytes"""
+    _iniciar_gravador()
+    chave = (('tipo', tipo), ('nome', nome))
+    with _lock:
+        _valores.segundos[chave].observar(segundos)
+        if n_bytes is not None:
+            _valores.bytes[chave].observar(n_bytes)
+        _valores.requisicoes[chave + (('status', str(status)),)] += 1
+
+
+def registrar_cache(cache, acerto):
+    """Conta uma consulta ao cache ``cache`` (acerto=True para hit)"""
+    _iniciar_gravador()
+    with _lock:
+        _valores.cache[(('cache', cache), ('resultado', 'hit' if acerto else 'miss'))] += 1
+
+
+def contagens_cache(cache):
+    """{'hits', 'misses'} do cache ``cache``, somados entre os processos"""
+    valores = _todos_os_processos().cache
+    return {'hits': valores[(('cache', cache), ('resultado', 'hit'))],
+            'misses': valores[(('cache', cache), ('resultado', 'miss'))]}
+
+
+def texto_prometheus():
+    """Todas as métricas, somadas entre os processos, no formato de exposição de texto do Prometheus"""
+    valores = _todos_os_processos()
+    linhas = [f"# HELP {PREFIXO}_requisicao_segundos Latência das rotas e callbacks",
+              f"# TYPE {PREFIXO}_requisicao_segundos histogram"]
+    for chave, histograma in sorted(valores.segundos.items()):
+        linhas += histograma.linhas(f"{PREFIXO}_requisicao_segundos", chave)
+
+    linhas += [f"# HELP {PREFIXO}_resposta_bytes Tamanho do corpo das respostas",
+               f"# TYPE {PREFIXO}_resposta_bytes histogram"]
+    for chave, histograma in sorted(valores.bytes.items()):
+        linhas += histograma.linhas(f"{PREFIXO}_resposta_bytes", chave)
+
+    linhas += [f"# HELP {PREFIXO}_requisicoes_total Requisições por status",
+               f"# TYPE {PREFIXO}_requisicoes_total counter"]
+    linhas += [f"{PREFIXO}_requisicoes_total{_rotulos(chave)} {n}" for chave, n in sorted(valores.requisicoes.items())]
+
+    linhas += [f"# HELP {PREFIXO}_cache_total Consultas aos caches do app",
+               f"# TYPE {PREFIXO}_cache_total counter"]
+    linhas += [f"{PREFIXO}_cache_total{_rotulos(chave)} {n}" for chave, n in sorted(valores.cache.items())]
+    return '\n'.join(linhas) + '\n'
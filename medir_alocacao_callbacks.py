@@ -0,0 +1,63 @@
+"""
+Mede o pico de alocação (tracemalloc) e o tempo dos callbacks mais pesados.
+
+O mapa é gerado direto por gerar_mapa_folium, sem passar pelo cache, para
+medir o custo real de cada combinação.
+
+Uso:
+    python medir_alocacao_callbacks.py [--repeticoes 3]
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+# Métricas de /metrics fora do diretório lido pelo servidor
+os.environ.setdefault('METRICAS_DIR', '.desempenho/metricas')
+
+import app
+from classificador_censo import dados_treino, treinar
+
+TODAS = ['1', '2', '3', '4', '5', '6']
+
+CENARIOS = [
+    ("mapa calor (todas RPAs)", lambda: app.gerar_mapa_folium(app.dados, 'heatmap', TODAS)),
+    ("mapa calor (RPA 1)", lambda: app.gerar_mapa_folium(app.dados, 'heatmap', ['1'])),
+    ("marcadores (todas RPAs)", lambda: app.gerar_mapa_folium(app.dados, 'markers', TODAS)),
+    ("marcadores (RPA 1)", lambda: app.gerar_mapa_folium(app.dados, 'markers', ['1'])),
+    ("treinar_classificador", lambda: treinar(*dados_treino(app.dados.df))),
+]
+
+
+def medir(funcao, repeticoes):
+    """Retorna (pico_mb, tempo_medio_s) de ``repeticoes`` chamadas"""
+    pico = 0
+    tempos = []
+    for _ in range(repeticoes):
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+        pico = max(pico, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return pico / 1024 / 1024, sum(tempos) / len(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pico de alocação por callback")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    if app.dados.df is None:
+        print("❌ Dataset não encontrado ou vazio!")
+        return
+
+    print(f"📊 Dataset: {len(app.dados.df):,} linhas")
+    print(f"{'callback':<28} {'pico (MB)':>10} {'tempo (s)':>10}")
+    for nome, funcao in CENARIOS:
+        pico_mb, tempo = medir(funcao, args.repeticoes)
+        print(f"{nome:<28} {pico_mb:>10.2f} {tempo:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
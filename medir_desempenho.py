@@ -0,0 +1,233 @@
+"""
+Benchmark das etapas pesadas do app sobre censos sintéticos de 10 mil, 100
+mil e 1 milhão de linhas, gerados por gerador_censo (mesmo esquema de
+censo_arboreo_final.csv).
+
+Para cada tamanho mede o tempo (média e mínimo de N repetições), o pico de
+alocação em Python (tracemalloc, numa repetição à parte) e o pico de RSS do
+processo durante as repetições cronometradas (VmHWM, que conta também as
+páginas dos .npy mapeados e as alocações nativas) de:
+    - carregar_dados a partir do CSV (o bloco de carga feito no import do app)
+      e a partir do cache colunar
+    - cálculo de todas as métricas
+    - gerar_mini_mapa
+    - atualizar_mapa_folium (calor e marcadores, sempre com o cache vazio)
+    - treino do classificador (o que preparar_em_segundo_plano faz sem modelo salvo)
+e, uma vez, extrair_imagens_notebook (não depende do tamanho do censo).
+
+Os resultados vão para .desempenho/resultados/<data>_<commit>.json e são
+comparados com a execução anterior sobre os mesmos dados; etapas
+LIMIAR_REGRESSAO vezes mais lentas (e ao menos DIFERENCA_MINIMA_S mais
+lentas) são marcadas. Os CSVs sintéticos ficam em .desempenho/dados/ e só
+são gerados na primeira vez.
+
+Uso:
+    python medir_desempenho.py [--tamanhos 10000 100000 1000000] [--repeticoes 3]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+# O cache de mapas fica em memória para não misturar os mapas dos censos sintéticos com os do app
+os.environ.setdefault('CACHE_TYPE', 'SimpleCache')
+# ... e as métricas de /metrics fora do diretório lido pelo servidor
+os.environ.setdefault('METRICAS_DIR', '.desempenho/metricas')
+# O import do app não carrega o censo real: a linha de base de memória é só
+# a do código, e cada etapa publica o censo sintético em app.dados
+os.environ['CARREGAR_CENSO'] = '0'
+
+import app
+from classificador_censo import dados_treino, treinar
+from dados_censo import CACHE_DIR
+from gerador_censo import VERSAO_GERADOR, gravar_csv
+from imagens_notebook import extrair_imagens_notebook
+from metricas_censo import MetricasCenso
+from recarga_censo import carregar_dados
+
+DIRETORIO = Path(".desempenho")
+TAMANHOS_PADRAO = [10_000, 100_000, 1_000_000]
+# Etapa mais lenta que isso (razão de tempos) em relação à execução anterior é regressão
+LIMIAR_REGRESSAO = 1.2
+# ... desde que a diferença passe disso (s); abaixo é ruído de medição
+DIFERENCA_MINIMA_S = 0.01
+
+TODAS = ['1', '2', '3', '4', '5', '6']
+
+
+# ============================================
+# CENSOS SINTÉTICOS
+# ============================================
+
+def csv_sintetico(n_linhas):
+    destino = DIRETORIO / "dados" / f"censo_sintetico_{n_linhas}_v{VERSAO_GERADOR}.csv"
+    if not destino.exists():
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        print(f"🔄 Gerando {destino} ...")
+        inicio = time.perf_counter()
+        gravar_csv(destino, n_linhas)
+        print(f"   {time.perf_counter() - inicio:.1f}s")
+    return destino
+
+
+# ============================================
+# ETAPAS
+# ============================================
+
+def _limpar_cache_colunar(csv):
+    for antigo in CACHE_DIR.glob(f"{csv.stem}_*"):
+        shutil.rmtree(antigo, ignore_errors=True)
+
+
+def _carregar_do_csv(csv, d):
+    _limpar_cache_colunar(csv)
+    carregar_dados(csv)
+
+
+def _mapa(tipo):
+    def etapa(csv, d):
+        app.dados = d
+        app.cache.delete(app._chave_cache_mapa(d.versao, tipo, TODAS))
+        app.atualizar_mapa_folium(1, tipo, TODAS)
+    return etapa
+
+
+ETAPAS = [
+    ("carregar_dados (csv)", _carregar_do_csv),
+    ("carregar_dados (cache)", lambda csv, d: carregar_dados(csv)),
+    ("metricas", lambda csv, d: MetricasCenso(d.df).calcular_todas()),
+    ("gerar_mini_mapa", lambda csv, d: app.gerar_mini_mapa(d)),
+    ("atualizar_mapa_folium (calor)", _mapa('heatmap')),
+    ("atualizar_mapa_folium (marcadores)", _mapa('markers')),
+    ("treinar_classificador", lambda csv, d: treinar(*dados_treino(d.df))),
+]
+
+
+def _zerar_pico_rss():
+    """Faz o pico de RSS (VmHWM) voltar ao RSS atual; só no Linux (>= 4.0)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _pico_rss_mb(zerado):
+    """
+    VmHWM do processo em MB. Sem /proc (ou sem poder zerá-lo) vale o
+    ru_maxrss, que é o pico desde o início do processo, não só da etapa.
+    """
+    if zerado:
+        with open('/proc/self/status', 'r') as f:
+            for linha in f:
+                if linha.startswith('VmHWM:'):
+                    return int(linha.split()[1]) / 1024
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return maximo / 1024 / 1024 if platform.system() == 'Darwin' else maximo / 1024
+
+
+def medir(funcao, repeticoes):
+    """
+    (tempo_medio_s, tempo_min_s, pico_mb, pico_rss_mb). O pico de alocação
+    vem de uma chamada extra com tracemalloc, feita antes das cronometradas
+    (serve também de aquecimento); o de RSS, das chamadas cronometradas.
+    """
+    tracemalloc.start()
+    funcao()
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    zerado = _zerar_pico_rss()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return sum(tempos) / len(tempos), min(tempos), pico / 1024 / 1024, _pico_rss_mb(zerado)
+
+
+# ============================================
+# RESULTADOS
+# ============================================
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "sem-git"
+
+
+def _resultado_anterior(pasta):
+    """Resultados da última execução feita sobre os mesmos dados sintéticos (mesma VERSAO_GERADOR)"""
+    for arquivo in sorted(pasta.glob("*.json"), reverse=True):
+        with open(arquivo, 'r', encoding='utf-8') as f:
+            anterior = json.load(f)
+        if anterior.get('versao_gerador') == VERSAO_GERADOR:
+            print(f"📊 Comparando com {arquivo.name}")
+            return {(r['tamanho'], r['etapa']): r for r in anterior['resultados']}
+    return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do app em censos sintéticos")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    pasta = DIRETORIO / "resultados"
+    pasta.mkdir(parents=True, exist_ok=True)
+    anterior = _resultado_anterior(pasta)
+
+    resultados = []
+
+    def registrar(tamanho, etapa, funcao):
+        medio, minimo, pico, pico_rss = medir(funcao, args.repeticoes)
+        linha = {'tamanho': tamanho, 'etapa': etapa, 'tempo_medio_s': round(medio, 4),
+                 'tempo_min_s': round(minimo, 4), 'pico_mb': round(pico, 2), 'pico_rss_mb': round(pico_rss, 1)}
+        resultados.append(linha)
+        comparacao = ""
+        if (tamanho, etapa) in anterior:
+            antes = anterior[(tamanho, etapa)]['tempo_min_s']
+            razao = minimo / max(antes, 1e-6)
+            regressao = razao > LIMIAR_REGRESSAO and minimo - antes > DIFERENCA_MINIMA_S
+            comparacao = f"{razao:>6.2f}x" + (" ⚠️ regressão" if regressao else "")
+        print(f"{tamanho:>9,} {etapa:<36} {medio:>9.3f} {minimo:>9.3f} {pico:>10.1f} {pico_rss:>9.1f} {comparacao}")
+
+    print(f"{'linhas':>9} {'etapa':<36} {'média (s)':>9} {'mín (s)':>9} {'pico (MB)':>10} {'RSS (MB)':>9}")
+    for tamanho in args.tamanhos:
+        csv = csv_sintetico(tamanho)
+        d = carregar_dados(csv)
+        if d.df is None:
+            print(f"❌ Não foi possível carregar {csv}")
+            continue
+        for etapa, funcao in ETAPAS:
+            registrar(tamanho, etapa, lambda: funcao(csv, d))
+
+    registrar(0, "extrair_imagens_notebook", extrair_imagens_notebook)
+
+    destino = pasta / f"{datetime.now():%Y%m%d_%H%M%S}_{_commit()}.json"
+    with open(destino, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': _commit(),
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'maquina': {'python': platform.python_version(), 'sistema': platform.platform(),
+                        'processador': platform.processor(), 'cpus': os.cpu_count()},
+            'repeticoes': args.repeticoes,
+            'versao_gerador': VERSAO_GERADOR,
+            'resultados': resultados,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"✅ Resultados gravados em {destino}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Relatório de memória por coluna: bytes por linha do censo lido "cru" pelo
+pandas (textos como object, RPA como float) e com o esquema compacto de
+dados_censo.ler_csv (categorias com códigos inteiros + tabela de textos).
+
+Uso:
+    python medir_memoria_colunas.py [caminho_do_csv]
+"""
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from dados_censo import COLUNAS_ESSENCIAIS, CSV_PADRAO, ler_csv
+
+
+def bytes_por_coluna(df):
+    return df.memory_usage(deep=True, index=False)
+
+
+def main():
+    csv = Path(sys.argv[1]) if len(sys.argv) > 1 else CSV_PADRAO
+    if not csv.exists():
+        print(f"❌ Arquivo não encontrado: {csv}")
+        sys.exit(1)
+
+    antes = pd.read_csv(csv, usecols=lambda c: c in COLUNAS_ESSENCIAIS, low_memory=False)
+    depois = ler_csv(csv)
+    n = len(depois)
+    mem_antes, mem_depois = bytes_por_coluna(antes), bytes_por_coluna(depois)
+
+    print(f"📊 {n:,} linhas")
+    print(f"{'coluna':<20} {'tipo antes':>14} {'B/linha':>8} {'tipo depois':>14} {'B/linha':>8}")
+    for col in depois.columns:
+        tipo_antes = str(antes[col].dtype) if col in antes.columns else "-"
+        b_antes = f"{mem_antes[col] / n:.1f}" if col in antes.columns else "-"
+        print(f"{col:<20} {tipo_antes:>14} {b_antes:>8} {str(depois[col].dtype):>14} {mem_depois[col] / n:>8.1f}")
+
+    comuns = [c for c in depois.columns if c in antes.columns]
+    total_antes = mem_antes[comuns].sum()
+    total_depois = mem_depois[comuns].sum()
+    print(f"\nColunas do CSV: {total_antes / n:.1f} -> {total_depois / n:.1f} B/linha "
+          f"({total_antes / 1024 / 1024:.1f} -> {total_depois / 1024 / 1024:.1f} MB)")
+    print(f"Com latitude/longitude/coordenada_valida: {mem_depois.sum() / n:.1f} B/linha "
+          f"({mem_depois.sum() / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
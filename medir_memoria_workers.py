@@ -0,0 +1,105 @@
+"""
+Mede a memória de cada worker do gunicorn com e sem preload do dataset.
+
+Sobe o app duas vezes (GUNICORN_PRELOAD=0 e GUNICORN_PRELOAD=1), espera os
+workers responderem e lê /proc/<pid>/smaps_rollup de cada um:
+    - RSS: memória residente do processo (conta páginas compartilhadas)
+    - PSS: RSS com as páginas compartilhadas divididas entre os processos
+A soma dos PSS é o custo real de RAM do conjunto de workers.
+
+Uso (Linux):
+    python medir_memoria_workers.py [--workers 4] [--porta 8060]
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+
+def _ler_memoria(pid):
+    """Retorna (rss_kb, pss_kb) lendo /proc/<pid>/smaps_rollup"""
+    valores = {}
+    with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+        for linha in f:
+            partes = linha.split()
+            if len(partes) >= 2 and partes[0] in ('Rss:', 'Pss:'):
+                valores[partes[0]] = int(partes[1])
+    return valores.get('Rss:', 0), valores.get('Pss:', 0)
+
+
+def _filhos(pid_pai):
+    filhos = []
+    for entrada in Path('/proc').iterdir():
+        if not entrada.name.isdigit():
+            continue
+        try:
+            stat = (entrada / 'stat').read_text()
+        except OSError:
+            continue
+        # O nome do processo pode conter espaços; o ppid vem após o ')'
+        ppid = int(stat.rsplit(')', 1)[1].split()[1])
+        if ppid == pid_pai:
+            filhos.append(int(entrada.name))
+    return filhos
+
+
+def _esperar_app(porta, timeout=300):
+    inicio = time.time()
+    while time.time() - inicio < timeout:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{porta}/", timeout=5).read()
+            return True
+        except Exception:
+            time.sleep(1)
+    return False
+
+
+def medir(preload, workers, porta):
+    env = dict(os.environ, GUNICORN_PRELOAD='1' if preload else '0',
+               WEB_CONCURRENCY=str(workers), PORT=str(porta),
+               # O on_starting apaga as métricas do diretório: não mexe no do servidor real
+               METRICAS_DIR='.desempenho/metricas')
+    master = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:server', '--config', 'gunicorn.conf.py'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not _esperar_app(porta):
+            raise RuntimeError("gunicorn não respondeu a tempo")
+        # Garante que todos os workers passaram pelo import/carga do app
+        for _ in range(workers * 2):
+            urllib.request.urlopen(f"http://127.0.0.1:{porta}/", timeout=30).read()
+        time.sleep(2)
+        return [(pid,) + _ler_memoria(pid) for pid in sorted(_filhos(master.pid))]
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--porta', type=int, default=8060)
+    args = parser.parse_args()
+
+    if not Path('/proc/self/smaps_rollup').exists():
+        print("❌ Este script depende de /proc/<pid>/smaps_rollup (Linux 4.14+)")
+        sys.exit(1)
+
+    for preload in (False, True):
+        medicoes = medir(preload, args.workers, args.porta)
+        titulo = "COM preload" if preload else "SEM preload"
+        print(f"\n📊 {titulo} ({len(medicoes)} workers)")
+        print(f"{'pid':>8} {'RSS (MB)':>10} {'PSS (MB)':>10}")
+        for pid, rss, pss in medicoes:
+            print(f"{pid:>8} {rss / 1024:>10.1f} {pss / 1024:>10.1f}")
+        total_pss = sum(m[2] for m in medicoes) / 1024
+        print(f"{'total':>8} {'':>10} {total_pss:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
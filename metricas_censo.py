@@ -0,0 +1,395 @@
+"""
+Métricas do dashboard calculadas sob demanda.
+
+Cada métrica é registrada com @metrica em duas etapas: ``contar`` resume o
+DataFrame em contadores somáveis (value_counts, totais, máximos) e a função
+decorada transforma esses contadores nas chaves usadas pelo dashboard.
+MetricasCenso funciona como um dicionário somente leitura: a primeira
+leitura de uma chave calcula a métrica correspondente e o resultado fica
+memorizado. Se uma métrica falhar, só as chaves dela assumem os valores
+padrão; as outras seguem normais.
+
+Como os contadores são somáveis, linhas novas do CSV entram nas métricas
+contando só essas linhas (MetricasCenso.com_linhas_novas).
+"""
+import hashlib
+import json
+import threading
+import time
+from collections.abc import Mapping
+
+import pandas as pd
+
+from busca_especies import IndiceEspecies
+
+# nome -> (contar, finalizar, {chave: valor padrão em caso de erro})
+METRICAS = {}
+
+TERMOS_CRITICOS = ['Injuriada', 'Morta', 'Doente', 'Ruim', 'Péssima', 'Critica']
+
+
+def metrica(nome, padroes, contar):
+    """Registra uma métrica; ``padroes`` lista as chaves que ela produz"""
+    def registrar(finalizar):
+        METRICAS[nome] = (contar, finalizar, padroes)
+        return finalizar
+    return registrar
+
+
+def somar_contadores(a, b):
+    """Soma dois dicionários de contadores (chaves 'max_*' ficam com o maior valor)"""
+    soma = dict(a)
+    for chave, valor in b.items():
+        if chave not in soma:
+            soma[chave] = valor
+        elif isinstance(valor, pd.Series):
+            soma[chave] = soma[chave].add(valor, fill_value=0).astype('int64')
+        elif isinstance(valor, pd.DataFrame):
+            soma[chave] = soma[chave].add(valor, fill_value=0).fillna(0)
+        elif chave.startswith('max_'):
+            soma[chave] = max(soma[chave], valor)
+        else:
+            soma[chave] = soma[chave] + valor
+    return soma
+
+
+def contagem_decrescente(contagem):
+    """Ordena uma contagem como value_counts (maior primeiro, empates na ordem atual)"""
+    return contagem.sort_values(ascending=False, kind='stable')
+
+
+def coluna_especie(df):
+    return 'nome_popular' if 'nome_popular' in df.columns else ('especie' if 'especie' in df.columns else None)
+
+
+def coluna_fitossanidade(df):
+    # Ajuste aqui o nome da coluna conforme seu CSV final
+    if 'fitossanid_grupo' in df.columns:
+        return 'fitossanid_grupo'
+    # Se não achar 'fitossanid_grupo', tenta outras opções comuns
+    for c in ['estado_fitossanitario', 'condicao_fisica', 'saude']:
+        if c in df.columns:
+            return c
+    return None
+
+
+def coluna_altura(df):
+    return 'altura' if 'altura' in df.columns else ('altura_total' if 'altura_total' in df.columns else None)
+
+
+def contar_textos(serie):
+    """value_counts por texto, sem nulos (os textos já chegam normalizados, ver dados_censo._categoria_texto)"""
+    contagem = serie.value_counts(dropna=True)
+    contagem.index = contagem.index.astype(str)
+    return contagem[contagem > 0]
+
+
+# ============================================
+# MÉTRICAS
+# ============================================
+
+@metrica('total', {'total_arvores': 0}, contar=lambda df: {'total': len(df)})
+def _total(c):
+    return {'total_arvores': c['total']}
+
+
+def _contar_especies(df):
+    col_esp = coluna_especie(df)
+    if not col_esp:
+        return {}
+    # Conta apenas valores não nulos
+    counts_esp = df[col_esp].value_counts()
+    counts_esp = counts_esp[counts_esp > 0]
+    counts_esp.index = counts_esp.index.astype(str)
+    return {'especies': counts_esp}
+
+
+@metrica('especies', {
+    'especie_mais_comum': "N/A", 'especie_top_count': 0, 'especie_top_pct': 0,
+    'num_especies': 0, 'total_com_especie': 0, 'top_especies': []
+}, contar=_contar_especies)
+def _especies(c):
+    """Espécies relativas ao total de árvores com espécie cadastrada"""
+    if 'especies' not in c:
+        return {}
+    counts_esp = contagem_decrescente(c['especies'])
+    total_com_especie = int(counts_esp.sum())  # Denominador correto: Soma das árvores identificadas
+    resultado = {'num_especies': len(counts_esp), 'total_com_especie': total_com_especie}
+    if counts_esp.empty:
+        return resultado
+
+    especie_top_count = int(counts_esp.iloc[0])
+    resultado.update({
+        'especie_mais_comum': counts_esp.index[0],
+        'especie_top_count': especie_top_count,
+        # Cálculo da porcentagem: (Top 1 / Total Identificadas) * 100
+        'especie_top_pct': (especie_top_count / total_com_especie) * 100 if total_com_especie > 0 else 0,
+        # Monta lista Top 5 com a mesma lógica
+        'top_especies': [
+            {"nome": nome, "quantidade": int(qtd), "percentual": (qtd / total_com_especie) * 100 if total_com_especie > 0 else 0}
+            for nome, qtd in counts_esp.head(5).items()
+        ],
+    })
+    return resultado
+
+
+def _contar_fitossanidade(df):
+    col_fito = coluna_fitossanidade(df)
+    return {'fitossanidade': contar_textos(df[col_fito])} if col_fito else {}
+
+
+@metrica('fitossanidade', {'pct_atencao': 0, 'total_avaliadas': 0, 'total_criticas': 0},
+         contar=_contar_fitossanidade)
+def _fitossanidade(c):
+    """Doentes + mortas sobre o total de árvores avaliadas"""
+    if 'fitossanidade' not in c:
+        return {}
+    # Universo das AVALIADAS: ignora nulos, vazios e "Não avaliada"
+    contagem = c['fitossanidade']
+    contagem = contagem[contagem.index != 'Não avaliada']
+    total_avaliadas = int(contagem.sum())
+    # Grupo de ATENÇÃO, dentro das avaliadas
+    total_criticas = int(contagem[contagem.index.isin(TERMOS_CRITICOS)].sum())
+    return {
+        'pct_atencao': (total_criticas / total_avaliadas) * 100 if total_avaliadas > 0 else 0,
+        'total_avaliadas': total_avaliadas,
+        'total_criticas': total_criticas,
+    }
+
+
+def _contar_altura(df):
+    col_altura = coluna_altura(df)
+    if not col_altura:
+        return {}
+    altura = df[col_altura]
+    if not pd.api.types.is_numeric_dtype(altura):
+        altura = pd.to_numeric(altura.astype(str).str.replace(',', '.'), errors='coerce')
+    validas = altura[(altura > 0) & (altura < 60)]
+    if validas.empty:
+        return {'soma_altura': 0.0, 'n_altura': 0}
+    return {'soma_altura': float(validas.sum()), 'n_altura': len(validas), 'max_altura': float(validas.max())}
+
+
+@metrica('altura', {'altura_media_m': 0, 'altura_max_m': 0}, contar=_contar_altura)
+def _altura(c):
+    if not c.get('n_altura'):
+        return {}
+    return {'altura_media_m': c['soma_altura'] / c['n_altura'], 'altura_max_m': c['max_altura']}
+
+
+def _contar_plantios(df):
+    if 'data_plantio' not in df.columns:
+        return {}
+    datas = df['data_plantio']
+    if not pd.api.types.is_datetime64_any_dtype(datas):
+        datas = pd.to_datetime(datas, dayfirst=True, errors='coerce')
+    return {'plantios_desde_2020': int((datas.dt.year >= 2020).sum())}
+
+
+@metrica('plantios', {'plantios_desde_2020': 0}, contar=_contar_plantios)
+def _plantios(c):
+    return {'plantios_desde_2020': c['plantios_desde_2020']} if 'plantios_desde_2020' in c else {}
+
+
+def formatar_rpa(rpa_num):
+    return str(int(rpa_num)) if pd.notna(rpa_num) and str(rpa_num).replace('.', '').isdigit() else str(rpa_num)
+
+
+def _contar_rpa(df):
+    if 'rpa' not in df.columns:
+        return {}
+    contagem = df['rpa'].value_counts()
+    contagem = contagem[contagem > 0]
+    contagem.index = [formatar_rpa(r) for r in contagem.index]
+    return {'rpa': contagem.groupby(level=0, sort=False).sum()}
+
+
+@metrica('rpa', {'distribuicao_rpa': {}}, contar=_contar_rpa)
+def _distribuicao_rpa(c):
+    if 'rpa' not in c:
+        return {}
+    return {'distribuicao_rpa': {
+        rpa_key: {"nome": f"RPA {rpa_key}", "quantidade": int(count)}
+        for rpa_key, count in contagem_decrescente(c['rpa']).items()
+    }}
+
+
+# Faixas válidas das medidas usadas nas médias por espécie (as mesmas do
+# dashboard e do classificador)
+FAIXAS_MEDIDAS = {'altura': (0, 60), 'copa': (0, 30), 'cap': (0, 5)}
+
+
+def _contar_por_especie(df):
+    """Tabelas agrupadas por espécie: somas das medidas, fitossanidade e RPAs"""
+    col_esp = coluna_especie(df)
+    if not col_esp:
+        return {}
+    especie = df[col_esp].astype(str).where(df[col_esp].notna()) if not isinstance(
+        df[col_esp].dtype, pd.CategoricalDtype) else df[col_esp].cat.rename_categories(str)
+
+    # Somas e quantidades das medidas válidas (médias calculadas no final)
+    medidas = {}
+    for col, (minimo, maximo) in FAIXAS_MEDIDAS.items():
+        if col not in df.columns:
+            continue
+        valores = pd.to_numeric(df[col], errors='coerce')
+        valores = valores.where((valores > minimo) & (valores < maximo))
+        medidas[f"soma_{col}"] = valores
+        medidas[f"n_{col}"] = valores.notna()
+    contadores = {'especies_somas': pd.DataFrame(medidas).groupby(especie, observed=True).sum().astype('float64')}
+    contadores['especies_somas']['quantidade'] = especie.value_counts().reindex(contadores['especies_somas'].index)
+
+    col_fito = coluna_fitossanidade(df)
+    if col_fito:
+        contadores['especies_saude'] = (
+            df.groupby([especie, df[col_fito].astype(str).where(df[col_fito].notna())], observed=True)
+            .size().unstack(fill_value=0).astype('float64')
+        )
+    if 'rpa' in df.columns:
+        rpa = df['rpa'].map(formatar_rpa).where(df['rpa'].notna())
+        contadores['especies_rpa'] = (
+            df.groupby([especie, rpa], observed=True).size().unstack(fill_value=0).astype('float64')
+        )
+    return contadores
+
+
+def _media(somas, col):
+    if f"soma_{col}" not in somas:
+        return pd.Series(None, index=somas.index, dtype='float64')
+    return (somas[f"soma_{col}"] / somas[f"n_{col}"].where(somas[f"n_{col}"] > 0)).round(2)
+
+
+@metrica('tabela_especies', {'tabela_especies': [], 'tabela_especies_etag': ""}, contar=_contar_por_especie)
+def _tabela_especies(c):
+    """
+    Uma linha por espécie (mais comum primeiro): quantidade, médias de altura,
+    copa e CAP, participação de cada grupo de fitossanidade entre as avaliadas,
+    % em atenção e RPAs onde a espécie aparece. O etag muda junto com o conteúdo.
+    """
+    if 'especies_somas' not in c:
+        return {}
+    somas = c['especies_somas']
+    somas = somas[somas['quantidade'] > 0].sort_values('quantidade', ascending=False, kind='stable')
+    medias = {col: _media(somas, col) for col in FAIXAS_MEDIDAS}
+
+    saude = c.get('especies_saude', pd.DataFrame(index=somas.index)).reindex(somas.index, fill_value=0)
+    saude = saude.drop(columns=[g for g in saude.columns if g == 'Não avaliada'])
+    avaliadas = saude.sum(axis=1)
+    criticas = saude[[g for g in saude.columns if g in TERMOS_CRITICOS]].sum(axis=1)
+    fracoes = saude.div(avaliadas.where(avaliadas > 0), axis=0)
+    rpas = c.get('especies_rpa', pd.DataFrame(index=somas.index)).reindex(somas.index, fill_value=0)
+
+    tabela = []
+    for nome in somas.index:
+        linha_saude = fracoes.loc[nome]
+        tabela.append({
+            'nome': nome,
+            'quantidade': int(somas.at[nome, 'quantidade']),
+            'altura_media': None if pd.isna(medias['altura'][nome]) else float(medias['altura'][nome]),
+            'copa_media': None if pd.isna(medias['copa'][nome]) else float(medias['copa'][nome]),
+            'cap_media': None if pd.isna(medias['cap'][nome]) else float(medias['cap'][nome]),
+            'avaliadas': int(avaliadas[nome]),
+            'saude': {g: round(float(f), 4) for g, f in linha_saude.items() if pd.notna(f) and f > 0},
+            'pct_atencao': round(float(criticas[nome] / avaliadas[nome] * 100), 2) if avaliadas[nome] > 0 else 0,
+            'rpas': [r for r in rpas.columns if rpas.at[nome, r] > 0],
+        })
+    etag = hashlib.md5(json.dumps(tabela, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return {'tabela_especies': tabela, 'tabela_especies_etag': etag}
+
+
+def _contar_nomes(df):
+    """Quantidade de árvores por nome popular, por nome científico e por par (popular, científico)"""
+    col_esp = coluna_especie(df)
+    contadores = {}
+    if col_esp:
+        contadores['nomes_populares'] = contar_textos(df[col_esp])
+    if 'nome_cientifico' in df.columns:
+        contadores['nomes_cientificos'] = contar_textos(df['nome_cientifico'])
+        if col_esp:
+            pares = df.groupby([df[col_esp], df['nome_cientifico']], observed=True).size()
+            contadores['pares_nomes'] = pares[pares > 0]
+    return contadores
+
+
+@metrica('indice_busca', {'indice_busca': IndiceEspecies({})}, contar=_contar_nomes)
+def _indice_busca(c):
+    """Índice de busca (autocompletar) dos nomes de espécie, com a quantidade de cada um"""
+    return {'indice_busca': IndiceEspecies(
+        c.get('nomes_populares', {}), c.get('nomes_cientificos', {}), c.get('pares_nomes', {})
+    )}
+
+
+# ============================================
+# ACESSO PREGUIÇOSO E MEMORIZADO
+# ============================================
+
+class MetricasCenso(Mapping):
+    """Dicionário somente leitura das métricas de um DataFrame, calculadas no primeiro acesso"""
+
+    def __init__(self, df):
+        self._df = df
+        self._contadores = {}
+        self._valores = {}
+        self.erros = {}
+        self._lock = threading.RLock()
+        self._metrica_da_chave = {chave: nome for nome, (_, _, padroes) in METRICAS.items() for chave in padroes}
+
+    def _definir(self, nome, obter_contadores):
+        _, finalizar, padroes = METRICAS[nome]
+        valores = dict(padroes)
+        try:
+            contadores = obter_contadores()
+            valores.update(finalizar(contadores))
+            self._contadores[nome] = contadores
+        except Exception as e:
+            print(f"❌ Erro na métrica '{nome}': {e}")
+            self.erros[nome] = str(e)
+        self._valores[nome] = valores
+
+    def calcular(self, nome):
+        """Calcula (uma única vez) a métrica ``nome`` e devolve o dicionário dela"""
+        if nome in self._valores:
+            return self._valores[nome]
+        with self._lock:
+            if nome not in self._valores:
+                contar = METRICAS[nome][0]
+                self._definir(nome, lambda: contar(self._df))
+        return self._valores[nome]
+
+    def calcular_todas(self):
+        inicio = time.perf_counter()
+        for nome in METRICAS:
+            self.calcular(nome)
+        print(f"✅ Métricas calculadas ({time.perf_counter() - inicio:.2f}s)")
+
+    def calcular_em_segundo_plano(self):
+        """Dispara o cálculo de todas as métricas numa thread (não bloqueia o boot)"""
+        thread = threading.Thread(target=self.calcular_todas, name="metricas-censo", daemon=True)
+        thread.start()
+        return thread
+
+    def com_linhas_novas(self, df_novas):
+        """
+        Novo MetricasCenso com as linhas de ``df_novas`` somadas aos contadores
+        atuais; só as linhas novas são percorridas e este objeto não muda, então
+        quem ainda lê as métricas antigas continua vendo valores consistentes.
+        Uma métrica que falhou antes continua com os valores padrão.
+        """
+        self.calcular_todas()
+        novas = MetricasCenso(None)
+        for nome, (contar, _, _) in METRICAS.items():
+            if nome in self._contadores:
+                novas._definir(nome, lambda: somar_contadores(self._contadores[nome], contar(df_novas)))
+            else:
+                novas._valores[nome] = self._valores[nome]
+                novas.erros[nome] = self.erros.get(nome, "")
+        return novas
+
+    def __getitem__(self, chave):
+        return self.calcular(self._metrica_da_chave[chave])[chave]
+
+    def __iter__(self):
+        return iter(self._metrica_da_chave)
+
+    def __len__(self):
+        return len(self._metrica_da_chave)
@@ -0,0 +1,234 @@
+"""
+Carga e recarga a quente do censo.
+
+Tudo o que o app deriva do CSV (DataFrame com coordenadas, métricas,
+índices dos filtros, grades de densidade, versão usada nas chaves de cache
+e pirâmide de tiles) fica num único DadosCenso. Quando o arquivo muda, uma
+thread monta um DadosCenso novo fora do caminho das requisições e troca a
+referência de uma vez; cada callback lê a referência uma única vez, então
+trabalha sempre sobre um retrato consistente dos dados.
+"""
+import copy
+import threading
+import time
+from pathlib import Path
+
+from dados_censo import (
+    COLUNA_ID, acrescentar_linhas, carregar_dataset, carregar_faixas, chave_cache,
+    construir_indices, estado_leitura, gravar_linhas_novas, ler_linhas_novas
+)
+from grade_censo import construir_grades
+from metricas_censo import MetricasCenso
+from tiles_censo import carregar_manifesto, diretorio_tiles, gerar_piramide
+
+# Intervalo (s) entre duas verificações do CSV; a recarga só começa quando o
+# arquivo fica igual em duas verificações seguidas (escrita já terminou)
+INTERVALO_OBSERVACAO = 10
+
+
+class DadosCenso:
+    """Retrato dos dados de uma versão do CSV (não é alterado depois de publicado)"""
+
+    def __init__(self, csv_path, marca=None, df=None, metricas=None, estado_csv=None,
+                 indices=None, grades=None, versao="sem-dados", tiles_dir=None, tiles_manifesto=None):
+        self.csv_path = Path(csv_path)
+        self.marca = marca
+        self.df = df
+        self.metricas = metricas
+        self.estado_csv = estado_csv
+        self.indices = indices
+        self.grades = grades if grades is not None else {}
+        self.versao = versao
+        self.tiles_dir = tiles_dir
+        self.tiles_manifesto = tiles_manifesto
+
+    def com(self, **campos):
+        """Cópia rasa com ``campos`` substituídos (o original continua valendo para quem o lê)"""
+        novo = copy.copy(self)
+        for nome, valor in campos.items():
+            setattr(novo, nome, valor)
+        return novo
+
+
+def marca_arquivo(csv_path):
+    """(tamanho, mtime) do CSV, ou None se ele não existe"""
+    try:
+        st = Path(csv_path).stat()
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def carregar_dados(csv_path):
+    """Monta o DadosCenso de ``csv_path``; sem arquivo (ou com erro de leitura) df fica None"""
+    marca = marca_arquivo(csv_path)
+    if marca is None:
+        return DadosCenso(csv_path)
+
+    print("📊 Carregando dataset completo (apenas colunas essenciais) para otimizar RAM...")
+    versao = chave_cache(csv_path)
+    try:
+        # Usa o cache colunar (.cache_censo/) quando ele está em dia com o CSV
+        df = carregar_dataset(csv_path)
+    except Exception as e:
+        print(f"❌ Erro ao ler CSV com colunas essenciais: {e}")
+        df = None
+
+    if df is None or len(df) == 0:
+        print("⚠️ Dataset não encontrado ou vazio!")
+        return DadosCenso(csv_path, marca=marca, versao=versao)
+
+    # --- 1. COORDENADAS ---
+    # latitude/longitude são calculadas uma vez ao gerar o cache (ver
+    # dados_censo.adicionar_coordenadas) e chegam aqui já prontas
+    if df.attrs.get('crs') is None:
+        print("⚠️ Coordenadas x/y sem CRS reconhecido: mapas ficarão vazios")
+
+    # --- 2. MÉTRICAS SOB DEMANDA ---
+    # Cada métrica é calculada no primeiro acesso (ou em segundo plano) e
+    # memorizada; uma métrica com erro não derruba as demais
+    metricas = MetricasCenso(df)
+
+    # --- 3. PONTO DE LEITURA DO CSV (para incorporar linhas acrescentadas depois) ---
+    estado_csv = None
+    try:
+        estado_csv = estado_leitura(csv_path, df[COLUNA_ID] if COLUNA_ID in df.columns else [])
+    except Exception as e:
+        print(f"⚠️ Erro ao marcar leitura do CSV: {e}")
+
+    # Índices (faixas de linhas por RPA/bairro, gravadas com o cache) usados pelos filtros do mapa
+    indices = None
+    grades = {}
+    if 'latitude' in df.columns:
+        try:
+            indices = construir_indices(df, carregar_faixas(csv_path))
+        except Exception as e:
+            print(f"⚠️ Erro índices: {e}")
+        # Grades de densidade para os mapas de calor (censo inteiro, sem amostragem)
+        try:
+            grades = construir_grades(df)
+        except Exception as e:
+            print(f"⚠️ Erro grades de densidade: {e}")
+
+    print("✅ Dados carregados!")
+    return DadosCenso(
+        csv_path, marca=marca, df=df, metricas=metricas, estado_csv=estado_csv,
+        indices=indices, grades=grades, versao=versao,
+        # Pirâmide de tiles gerada offline (python tiles_censo.py); None se ainda não existe
+        tiles_dir=diretorio_tiles(csv_path), tiles_manifesto=carregar_manifesto(csv_path)
+    )
+
+
+# ============================================
+# OBSERVADOR DO ARQUIVO
+# ============================================
+
+def acrescentar(atual, df_novas, marca, estado):
+    """
+    Retrato de ``atual`` com as linhas de ``df_novas``: DataFrame, índices e
+    grades passam a incluí-las, as métricas só somam as linhas novas e a
+    versão muda (os mapas em cache da versão anterior deixam de ser usados).
+    O DataFrame vem do cache colunar regravado com as linhas novas
+    (dados_censo.gravar_linhas_novas), compartilhado entre os workers e
+    reaproveitado no próximo boot; só se ele não puder ser gravado o worker
+    monta uma cópia própria. ``atual`` continua valendo para quem ainda o lê.
+    """
+    gravado = None
+    try:
+        gravado = gravar_linhas_novas(atual.csv_path, atual.df, df_novas, estado)
+    except OSError as e:
+        print(f"⚠️ Não foi possível gravar o cache do censo com as linhas novas: {e}")
+    df, faixas = gravado if gravado is not None else (acrescentar_linhas(atual.df, df_novas), None)
+    indices = construir_indices(df, faixas) if atual.indices is not None else None
+    grades = construir_grades(df) if atual.grades else {}
+    return atual.com(
+        marca=marca, df=df, metricas=atual.metricas.com_linhas_novas(df_novas), estado_csv=estado,
+        indices=indices, grades=grades, versao=chave_cache(atual.csv_path),
+        tiles_dir=diretorio_tiles(atual.csv_path), tiles_manifesto=carregar_manifesto(atual.csv_path)
+    )
+
+
+def _publicar_com_tiles(novo, atual, publicar):
+    """
+    Publica ``novo``; se a pirâmide de tiles da versão nova ainda não existe,
+    o mapa continua com a anterior até ela ser regerada (aqui, depois de publicar)
+    """
+    reconstruir_tiles = novo.tiles_manifesto is None and atual.tiles_manifesto is not None
+    if reconstruir_tiles:
+        novo = novo.com(tiles_dir=atual.tiles_dir, tiles_manifesto=atual.tiles_manifesto)
+    publicar(novo)
+    if not reconstruir_tiles:
+        return
+    try:
+        inicio = time.perf_counter()
+        tiles_dir, manifesto = gerar_piramide(novo.df, novo.csv_path, atual.tiles_manifesto['zoom_min'],
+                                              atual.tiles_manifesto['zoom_max'])
+        publicar(novo.com(tiles_dir=tiles_dir, tiles_manifesto=manifesto))
+        print(f"🗺️ Pirâmide de tiles regerada ({time.perf_counter() - inicio:.1f}s)")
+    except Exception as e:
+        print(f"⚠️ Erro ao regerar a pirâmide de tiles: {e}")
+
+
+def recarregar(atual, publicar):
+    """
+    Publica os dados da versão atual do CSV. Se o arquivo só cresceu, só as
+    linhas novas são lidas e acrescentadas ao retrato (ver acrescentar).
+    Quando o arquivo foi reescrito (ou a leitura incremental falhou) o
+    retrato completo é remontado. Se a nova versão não puder ser lida, os
+    dados anteriores continuam valendo.
+    """
+    marca = marca_arquivo(atual.csv_path)
+    if atual.df is not None and atual.metricas is not None and atual.estado_csv is not None:
+        try:
+            df_novas, estado = ler_linhas_novas(atual.csv_path, atual.estado_csv)
+            if df_novas is not None:
+                if len(df_novas) == 0:
+                    publicar(atual.com(marca=marca, estado_csv=estado))
+                    return
+                novo = acrescentar(atual, df_novas, marca, estado)
+                print(f"✅ {len(df_novas):,} linhas novas incorporadas ao censo")
+                _publicar_com_tiles(novo, atual, publicar)
+                return
+        except Exception as e:
+            print(f"⚠️ Erro ao ler as linhas novas, recarregando o CSV inteiro: {e}")
+
+    inicio = time.perf_counter()
+    # Só um worker regrava o cache colunar; os outros abrem o mesmo cache (dados_censo.trava_cache)
+    novo = carregar_dados(atual.csv_path)
+    if novo.df is None:
+        print("⚠️ Nova versão do CSV não pôde ser carregada; mantendo os dados anteriores")
+        publicar(atual.com(marca=novo.marca))
+        return
+    novo.metricas.calcular_todas()
+    print(f"🔄 Censo recarregado: {len(novo.df):,} linhas ({time.perf_counter() - inicio:.1f}s)")
+    _publicar_com_tiles(novo, atual, publicar)
+
+
+def observar_csv(obter_dados, publicar, intervalo=INTERVALO_OBSERVACAO):
+    """
+    Inicia a thread que recarrega os dados quando o CSV muda.
+    ``obter_dados()`` devolve o DadosCenso atual e ``publicar(novo)`` troca a
+    referência usada pelo app.
+    """
+    def ciclo():
+        pendente = None
+        while True:
+            time.sleep(intervalo)
+            try:
+                atual = obter_dados()
+                marca = marca_arquivo(atual.csv_path)
+                if marca is None or marca == atual.marca:
+                    pendente = None
+                    continue
+                if marca != pendente:
+                    # Arquivo ainda pode estar sendo gravado: espera a próxima verificação
+                    pendente = marca
+                    continue
+                pendente = None
+                recarregar(atual, publicar)
+            except Exception as e:
+                print(f"⚠️ Erro ao recarregar o censo: {e}")
+
+    thread = threading.Thread(target=ciclo, name="observador-censo", daemon=True)
+    thread.start()
+    return thread
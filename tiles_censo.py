@@ -0,0 +1,233 @@
+"""
+Pirâmide de tiles (PNG 256x256, Web Mercator) com todas as árvores do censo.
+
+Os tiles são gerados offline, uma camada para a cidade inteira ('todas') e
+uma por RPA ('rpa1' ... 'rpa6'), e gravados em disco. O app só precisa
+devolver o arquivo pedido pelo Leaflet, então o custo por requisição não
+depende do número de árvores nem do zoom.
+
+Uso como etapa de build:
+    python tiles_censo.py [caminho_do_csv] [--zoom-max 16]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import struct
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from dados_censo import (
+    CACHE_DIR, CSV_PADRAO, LAT_MAX, LAT_MIN, LON_MAX, LON_MIN,
+    carregar_dataset, chave_cache, trava_cache
+)
+
+TAMANHO_TILE = 256
+ZOOM_MIN = 10
+ZOOM_MAX = 16
+
+RPAS = ['1', '2', '3', '4', '5', '6']
+CAMADAS = ['todas'] + [f"rpa{r}" for r in RPAS]
+
+# Verde do marcador (claro -> escuro conforme a densidade de árvores no pixel)
+COR_CLARA = np.array([129, 199, 132], dtype=np.float32)
+COR_ESCURA = np.array([27, 94, 32], dtype=np.float32)
+
+
+# ============================================
+# PNG SEM DEPENDÊNCIAS EXTRAS
+# ============================================
+
+def _chunk_png(tipo, dados):
+    return (struct.pack('>I', len(dados)) + tipo + dados +
+            struct.pack('>I', zlib.crc32(tipo + dados) & 0xffffffff))
+
+
+def codificar_png(rgba):
+    """Codifica um array (altura, largura, 4) uint8 como PNG RGBA"""
+    altura, largura, _ = rgba.shape
+    linhas = np.zeros((altura, largura * 4 + 1), dtype=np.uint8)  # 1º byte = filtro 0
+    linhas[:, 1:] = rgba.reshape(altura, -1)
+    return (b'\x89PNG\r\n\x1a\n' +
+            _chunk_png(b'IHDR', struct.pack('>IIBBBBB', largura, altura, 8, 6, 0, 0, 0)) +
+            _chunk_png(b'IDAT', zlib.compress(linhas.tobytes(), 6)) +
+            _chunk_png(b'IEND', b''))
+
+
+TILE_VAZIO = codificar_png(np.zeros((TAMANHO_TILE, TAMANHO_TILE, 4), dtype=np.uint8))
+
+
+# ============================================
+# PROJEÇÃO WEB MERCATOR
+# ============================================
+
+def projetar_mercator(lat, lon):
+    """Retorna (u, v) normalizados em [0, 1) no plano Web Mercator"""
+    lat_rad = np.radians(lat)
+    u = (lon + 180.0) / 360.0
+    v = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0
+    return u, v
+
+
+def _raio_ponto(zoom):
+    # Pontos maiores quando o zoom aproxima (raio em pixels)
+    if zoom >= 16:
+        return 2
+    if zoom >= 14:
+        return 1
+    return 0
+
+
+def _renderizar_tile(px, py, zoom):
+    """Rasteriza os pixels (px, py) de um tile em um PNG RGBA"""
+    contagem = np.bincount(py * TAMANHO_TILE + px, minlength=TAMANHO_TILE * TAMANHO_TILE)
+    contagem = contagem.reshape(TAMANHO_TILE, TAMANHO_TILE).astype(np.float32)
+
+    raio = _raio_ponto(zoom)
+    if raio:
+        # Dilatação simples: cada árvore ocupa um quadrado de (2r+1)² pixels
+        pad = np.pad(contagem, raio)
+        dilatado = np.zeros_like(contagem)
+        for dy in range(2 * raio + 1):
+            for dx in range(2 * raio + 1):
+                dilatado = np.maximum(dilatado, pad[dy:dy + TAMANHO_TILE, dx:dx + TAMANHO_TILE])
+        contagem = dilatado
+
+    ocupado = contagem > 0
+    intensidade = np.clip(np.log1p(contagem) / np.log1p(20), 0, 1)[..., None]
+    rgba = np.zeros((TAMANHO_TILE, TAMANHO_TILE, 4), dtype=np.uint8)
+    rgba[..., :3] = (COR_CLARA + (COR_ESCURA - COR_CLARA) * intensidade).astype(np.uint8)
+    rgba[..., 3] = np.where(ocupado, 160 + 95 * intensidade[..., 0], 0).astype(np.uint8)
+    return codificar_png(rgba)
+
+
+def _gerar_camada(u, v, destino, zoom_min, zoom_max):
+    """Gera todos os tiles não vazios de uma camada; retorna o total gravado"""
+    total = 0
+    if len(u) == 0:
+        return total
+    for zoom in range(zoom_min, zoom_max + 1):
+        escala = TAMANHO_TILE * (2 ** zoom)
+        gx = np.floor(u * escala).astype(np.int64)
+        gy = np.floor(v * escala).astype(np.int64)
+        tx, ty = gx // TAMANHO_TILE, gy // TAMANHO_TILE
+
+        # Agrupa os pontos por tile ordenando pela chave (tx, ty)
+        chave = tx * (2 ** zoom) + ty
+        ordem = np.argsort(chave, kind='stable')
+        chave_ord = chave[ordem]
+        inicios = np.flatnonzero(np.r_[True, chave_ord[1:] != chave_ord[:-1]])
+        fins = np.r_[inicios[1:], len(chave_ord)]
+
+        for ini, fim in zip(inicios, fins):
+            idx = ordem[ini:fim]
+            x_tile, y_tile = int(tx[idx[0]]), int(ty[idx[0]])
+            png = _renderizar_tile(gx[idx] % TAMANHO_TILE, gy[idx] % TAMANHO_TILE, zoom)
+            arquivo = destino / str(zoom) / str(x_tile) / f"{y_tile}.png"
+            arquivo.parent.mkdir(parents=True, exist_ok=True)
+            arquivo.write_bytes(png)
+            total += 1
+    return total
+
+
+# ============================================
+# CONSTRUÇÃO / LOCALIZAÇÃO DA PIRÂMIDE
+# ============================================
+
+def diretorio_tiles(csv_path=CSV_PADRAO, cache_dir=CACHE_DIR):
+    """Diretório da pirâmide correspondente à versão atual do CSV"""
+    return Path(cache_dir) / f"tiles_{chave_cache(csv_path)}"
+
+
+def versao_tiles(tiles_dir):
+    """Versão da pirâmide (a chave em tiles_<chave>), usada nas URLs dos tiles"""
+    return Path(tiles_dir).name.split('_', 1)[1]
+
+
+def diretorio_versao(versao, cache_dir=CACHE_DIR):
+    """Diretório da pirâmide ``versao``; None se ``versao`` não é uma chave válida"""
+    if not re.fullmatch(r"[0-9a-f]{16}", versao):
+        return None
+    return Path(cache_dir) / f"tiles_{versao}"
+
+
+def carregar_manifesto(csv_path=CSV_PADRAO, cache_dir=CACHE_DIR):
+    """Retorna o manifesto da pirâmide (ou None se ela ainda não foi gerada)"""
+    try:
+        arquivo = diretorio_tiles(csv_path, cache_dir) / "manifesto.json"
+        with open(arquivo, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def construir_tiles(df, destino, zoom_min=ZOOM_MIN, zoom_max=ZOOM_MAX):
+    """Gera a pirâmide completa em ``destino`` a partir de um DataFrame com latitude/longitude"""
+    destino = Path(destino)
+    tmp = destino.with_name(destino.name + f".tmp{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    lat = df['latitude'].to_numpy(dtype=np.float64)
+    lon = df['longitude'].to_numpy(dtype=np.float64)
+    na_cidade = (lat >= LAT_MIN) & (lat <= LAT_MAX) & (lon >= LON_MIN) & (lon <= LON_MAX)
+    rpa = df['rpa'].to_numpy(dtype=np.float64) if 'rpa' in df.columns else np.full(len(df), np.nan)
+
+    u, v = projetar_mercator(lat[na_cidade], lon[na_cidade])
+    rpa = rpa[na_cidade]
+
+    manifesto = {'zoom_min': zoom_min, 'zoom_max': zoom_max, 'camadas': {}}
+    for camada in CAMADAS:
+        selecao = np.ones(len(u), dtype=bool) if camada == 'todas' else (rpa == int(camada[3:]))
+        n_tiles = _gerar_camada(u[selecao], v[selecao], tmp / camada, zoom_min, zoom_max)
+        manifesto['camadas'][camada] = {'arvores': int(selecao.sum()), 'tiles': n_tiles}
+
+    with open(tmp / "manifesto.json", 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f)
+
+    shutil.rmtree(destino, ignore_errors=True)
+    os.rename(tmp, destino)
+    return manifesto
+
+
+def _limpar_piramides_antigas(atual, cache_dir=CACHE_DIR):
+    for antiga in Path(cache_dir).glob("tiles_*"):
+        if antiga != atual and antiga.is_dir():
+            shutil.rmtree(antiga, ignore_errors=True)
+
+
+def gerar_piramide(df, csv_path=CSV_PADRAO, zoom_min=ZOOM_MIN, zoom_max=ZOOM_MAX, cache_dir=CACHE_DIR):
+    """
+    Gera a pirâmide da versão atual do CSV (se ainda não existe) e remove as
+    antigas; retorna (diretorio, manifesto). Um processo por vez: os outros
+    esperam e leem o manifesto que ele gravou.
+    """
+    destino = diretorio_tiles(csv_path, cache_dir)
+    with trava_cache("tiles", cache_dir):
+        manifesto = carregar_manifesto(csv_path, cache_dir)
+        if manifesto is None:
+            manifesto = construir_tiles(df, destino, zoom_min, zoom_max)
+            _limpar_piramides_antigas(destino, cache_dir)
+    return destino, manifesto
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gera a pirâmide de tiles do censo arbóreo")
+    parser.add_argument('csv', nargs='?', default=str(CSV_PADRAO))
+    parser.add_argument('--zoom-min', type=int, default=ZOOM_MIN)
+    parser.add_argument('--zoom-max', type=int, default=ZOOM_MAX)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    df = carregar_dataset(args.csv)
+    destino = diretorio_tiles(args.csv)
+    with trava_cache("tiles"):
+        manifesto = construir_tiles(df, destino, args.zoom_min, args.zoom_max)
+        _limpar_piramides_antigas(destino)
+
+    total = sum(c['tiles'] for c in manifesto['camadas'].values())
+    print(f"✅ {total:,} tiles gerados em {destino} ({time.perf_counter() - inicio:.1f}s)")